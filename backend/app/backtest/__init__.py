@@ -0,0 +1,2 @@
+from .models import BacktestRequest, BacktestResult, BacktestRun, BacktestStats
+from .engine import BacktestEngine
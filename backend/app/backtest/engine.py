@@ -0,0 +1,239 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from ..core.covariance import ESTIMATORS
+from ..core.execution import SolveExecutor
+from ..core.optimization import PortfolioOptimizer
+from ..core.solvers import SOLVER_BACKENDS
+from ..data.adapter import MarketDataProvider
+from ..data.defaults import get_default_provider, get_offline_provider
+from ..data.panel import ReturnsPanel
+from ..instrumentation import stage
+from ..tracking.downsample import downsample
+from .models import BacktestRequest, BacktestResult, BacktestRun, BacktestStats
+
+BENCHMARK_TICKER = "SPY"
+
+# Below this many (window x asset) solves the process pool costs more than it saves
+PARALLEL_THRESHOLD = 2000
+
+# Window blocks per worker (contiguous, so each worker's covariance cache updates incrementally)
+BLOCKS_PER_WORKER = 2
+
+
+class BacktestEngine:
+    """
+    Replays PortfolioOptimizer over rolling estimation windows.
+
+    At every rebalance date the optimizer sees only the `lookback_days`
+    bars up to that date. Windows are independent, so they are solved in
+    contiguous blocks on a process pool; inside a block consecutive windows
+    overlap, so the covariance cache advances incrementally and each solve
+    is warm-started from the previous window's weights. The equity curves
+    are then replayed over the whole price panel at once.
+    """
+
+    def __init__(self, provider: MarketDataProvider = None, solver: str = "qp", covariance: str = "ledoit_wolf", max_workers: Optional[int] = None):
+        # Ledoit-Wolf by default: with more assets than lookback days the sample
+        # covariance is singular and every window's solve runs to the iteration cap.
+        if solver not in SOLVER_BACKENDS:
+            raise ValueError(f"Unknown solver backend: {solver}")
+        if covariance not in ESTIMATORS:
+            raise ValueError(f"Unknown covariance estimator: {covariance}")
+        self.provider = provider
+        self.solver = solver
+        self.covariance = covariance
+        self.max_workers = max_workers or int(os.environ.get("BACKTEST_WORKERS", 0)) or os.cpu_count() or 1
+
+    def run(self, request: BacktestRequest, prices: Optional[pd.DataFrame] = None) -> BacktestResult:
+        tickers = list(dict.fromkeys(request.tickers))
+        if not tickers:
+            raise ValueError("No tickers provided for backtest")
+        if not request.risk_appetites:
+            raise ValueError("No risk_appetites provided for backtest")
+        if request.lookback_days < 2 or request.rebalance_days < 1:
+            raise ValueError("lookback_days must be at least 2 and rebalance_days at least 1")
+
+        # 1. Price panel (assets + benchmark), forward-filled
+        if prices is None:
+            provider = self.provider or (get_offline_provider() if request.offline else get_default_provider())
+            with stage("backtest", "fetch"):
+                prices = provider.get_historical_prices(tickers + [BENCHMARK_TICKER], period=request.period)
+        panel = ReturnsPanel.coerce(prices).reindex(tickers).observed_rows().ffill()
+        if panel.empty:
+            raise ValueError(f"No historical data found for tickers: {tickers}")
+        bench = prices[BENCHMARK_TICKER].reindex(panel.index).ffill() if BENCHMARK_TICKER in prices else None
+
+        # 2. Rebalance dates: every rebalance_days bars once a full window is available
+        rebalance_at = np.arange(request.lookback_days, len(panel), request.rebalance_days)
+        if len(rebalance_at) == 0:
+            raise ValueError(f"Not enough history: need more than {request.lookback_days} bars, got {len(panel)}")
+
+        # 3. Target weights per (objective, rebalance date)
+        objectives = list(dict.fromkeys(PortfolioOptimizer.objective(a) for a in request.risk_appetites))
+        with stage("backtest", "solve"):
+            weights = self._solve_windows(panel, rebalance_at, request.lookback_days, objectives)
+
+        # 4. Vectorized replay
+        P = panel.prices
+        start = rebalance_at[0]
+        dates = panel.index[start:]
+        with stage("backtest", "replay"):
+            curves: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+                objective: _replay(P, rebalance_at, weights[objective], request.initial_capital, request.cost_rate)
+                for objective in objectives
+            }
+
+        years = max(len(dates) - 1, 1) / 252
+        positions = np.arange(len(dates))
+        if request.max_points:
+            positions = downsample(next(iter(curves.values()))[0], request.max_points, "lttb")
+
+        runs = []
+        for appetite in request.risk_appetites:
+            objective = PortfolioOptimizer.objective(appetite)
+            equity, turnover = curves[objective]
+            later = turnover[1:]
+            avg_turnover = float(later.mean()) if len(later) else 0.0
+            final = weights[objective][-1]
+            runs.append(BacktestRun(
+                risk_appetite=appetite,
+                objective=objective,
+                stats=_stats(equity),
+                turnover=round(avg_turnover, 4),
+                annual_turnover=round(float(later.sum()) / years, 4),
+                equity=np.round(equity[positions], 2).tolist(),
+                final_weights={t: round(float(w), 4) for t, w in zip(panel.tickers, final) if w > 1e-4}
+            ))
+
+        benchmark = benchmark_stats = None
+        if bench is not None and np.isfinite(bench.iloc[start]) and bench.iloc[start] > 0:
+            b = bench.to_numpy(dtype=float)[start:]
+            b = request.initial_capital * b / b[0]
+            benchmark = np.round(b[positions], 2).tolist()
+            benchmark_stats = _stats(b)
+
+        return BacktestResult(
+            dates=dates[positions].strftime("%Y-%m-%d").tolist(),
+            rebalances=len(rebalance_at),
+            runs=runs,
+            benchmark=benchmark,
+            benchmark_stats=benchmark_stats
+        )
+
+    def _solve_windows(self, panel: ReturnsPanel, rebalance_at: np.ndarray, lookback: int, objectives: List[str]) -> Dict[str, np.ndarray]:
+        context = (panel, lookback, objectives, self.solver, self.covariance)
+        workers = min(self.max_workers, len(rebalance_at))
+        if workers <= 1 or len(rebalance_at) * panel.shape[1] < PARALLEL_THRESHOLD:
+            blocks = [_solve_block(rebalance_at, context)]
+        else:
+            chunks = [c for c in np.array_split(rebalance_at, workers * BLOCKS_PER_WORKER) if len(c)]
+            # The panel is shipped once per worker, not once per block
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(_start_method()),
+                                     initializer=_init_worker, initargs=(context,)) as pool:
+                blocks = list(pool.map(_solve_pooled_block, chunks))
+        return {objective: np.concatenate([block[objective] for block in blocks]) for objective in objectives}
+
+
+def _start_method() -> str:
+    # Never fork a process running server threads; forkserver (cheaper starts) is POSIX-only
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+# Worker side. Module-level so the process pool can pickle it.
+
+_worker_context = None
+
+
+def _init_worker(context):
+    global _worker_context
+    _worker_context = context
+
+
+def _solve_pooled_block(rebalance_at: np.ndarray) -> Dict[str, np.ndarray]:
+    return _solve_block(rebalance_at, _worker_context)
+
+
+def _solve_block(rebalance_at: np.ndarray, context) -> Dict[str, np.ndarray]:
+    """
+    Optimizer weights for consecutive rebalance dates, one row per date.
+    Assets without a full window of data at a date get weight 0 there.
+    Windows are views of the panel, so its returns are computed only once.
+    """
+    panel, lookback, objectives, solver, covariance = context
+    # Solves stay inline: the backtest pool is the parallelism, and a solver pool
+    # nested in a backtest worker would never be shut down (its exit would hang)
+    optimizer = PortfolioOptimizer(provider=get_offline_provider(), solver=solver, covariance=covariance,
+                                   executor=SolveExecutor(workers=0))
+    values = panel.prices
+    out = {objective: np.zeros((len(rebalance_at), panel.shape[1])) for objective in objectives}
+    previous: Dict[str, tuple] = {}
+
+    for row, t in enumerate(rebalance_at):
+        window = values[t - lookback:t + 1]
+        usable = np.flatnonzero(np.isfinite(window).all(axis=0) & (window[-1] > 0))
+        if len(usable) == 0:
+            continue
+        view = panel.rows(t - lookback, t + 1).take(usable)
+        mu, S = optimizer.estimate(view)
+        for objective in objectives:
+            # Warm start from the previous window when the universe is unchanged
+            prev_usable, prev_w = previous.get(objective, (None, None))
+            x0 = prev_w if prev_usable is not None and np.array_equal(prev_usable, usable) else None
+            appetite = 0.0 if objective == "min_volatility" else 1.0
+            w = optimizer.solve(mu, S, appetite, x0=x0).to_numpy()
+            out[objective][row, usable] = w
+            previous[objective] = (usable, w)
+    return out
+
+
+# Replay and statistics
+
+def _replay(P: np.ndarray, rebalance_at: np.ndarray, W: np.ndarray, capital: float, cost_rate: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Daily equity from the first rebalance on, holding each target between
+    rebalances (weights drift with prices), plus one-way turnover per
+    rebalance. Weight not allocated to any asset is held as cash.
+    """
+    start = rebalance_at[0]
+    P = P[start:]
+    reb = rebalance_at - start
+    cash = 1.0 - W.sum(axis=1)
+    # Segment of every day = last rebalance at or before it
+    seg = np.searchsorted(reb, np.arange(len(P)), side="right") - 1
+    base = P[reb]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.nan_to_num(P / base[seg])              # price relative to segment start
+        end_growth = np.nan_to_num(P[reb[1:]] / base[:-1])  # ... at the end of each segment
+    # Value relative to the start of the segment, every day and at each segment end
+    value_rel = np.einsum("ij,ij->i", growth, W[seg]) + cash[seg]
+    seg_end = np.einsum("ij,ij->i", end_growth, W[:-1]) + cash[:-1]
+
+    # Drifted weights right before each rebalance vs the new targets
+    drifted = W[:-1] * end_growth / seg_end[:, None]
+    turnover = np.concatenate([[W[0].sum()], 0.5 * np.abs(W[1:] - drifted).sum(axis=1)])
+
+    # Value carried into each segment, after costs on the traded value
+    costs = 1.0 - cost_rate * np.concatenate([[turnover[0]], 2.0 * turnover[1:]])
+    carried = capital * np.cumprod(np.concatenate([[1.0], seg_end]) * costs)
+    return carried[seg] * value_rel, turnover
+
+
+def _stats(equity: np.ndarray, risk_free_rate: float = 0.02) -> BacktestStats:
+    returns = equity[1:] / equity[:-1] - 1 if len(equity) > 1 else np.zeros(1)
+    years = max(len(equity) - 1, 1) / 252
+    total = equity[-1] / equity[0] - 1
+    annual = (1 + total) ** (1 / years) - 1 if total > -1 else -1.0
+    vol = float(returns.std(ddof=1) * np.sqrt(252)) if len(returns) > 1 else 0.0
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    return BacktestStats(
+        total_return=round(float(total), 4),
+        annual_return=round(float(annual), 4),
+        volatility=round(vol, 4),
+        sharpe_ratio=round((annual - risk_free_rate) / vol, 4) if vol > 0 else 0.0,
+        max_drawdown=round(float(drawdown.min()), 4)
+    )
@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+class BacktestRequest(BaseModel):
+    tickers: List[str]
+    risk_appetites: List[float] = [0.5] # One run per setting (0.0 Low risk to 1.0 High risk)
+    lookback_days: int = 252 # Trading days of history behind each rebalance
+    rebalance_days: int = 21 # Trading days between rebalances (21 ~ monthly)
+    period: str = "10y" # History to replay (yfinance period string)
+    initial_capital: float = 10000.0
+    cost_rate: float = 0.0 # Proportional trading cost (0.001 = 10 bps of traded value)
+    max_points: Optional[int] = None # Downsample the curves to at most this many points
+    offline: bool = False # Only use the local price store, never the network
+
+class BacktestStats(BaseModel):
+    total_return: float
+    annual_return: float
+    volatility: float
+    sharpe_ratio: float
+    max_drawdown: float # Negative fraction, e.g. -0.25
+
+class BacktestRun(BaseModel):
+    risk_appetite: float
+    objective: str # "min_volatility" or "max_sharpe"
+    stats: BacktestStats
+    turnover: float # Average one-way turnover per rebalance (after the initial buy)
+    annual_turnover: float
+    equity: List[float] # Aligned with BacktestResult.dates
+    final_weights: Dict[str, float]
+
+class BacktestResult(BaseModel):
+    dates: List[str] # YYYY-MM-DD
+    rebalances: int
+    runs: List[BacktestRun]
+    benchmark: Optional[List[float]] = None # SPY buy-and-hold, scaled to initial_capital
+    benchmark_stats: Optional[BacktestStats] = None
@@ -0,0 +1,21 @@
+import logging
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from .models import BacktestRequest, BacktestResult
+from .engine import BacktestEngine
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/backtest", tags=["backtest"])
+
+@router.post("", response_model=BacktestResult)
+async def run_backtest(request: BacktestRequest):
+    engine = BacktestEngine()
+    try:
+        # CPU-bound (fans out to a process pool); keep it off the event loop
+        return await run_in_threadpool(engine.run, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Backtest Error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal Backtest Error")
@@ -1 +1 @@
-from .optimization import PortfolioOptimizer, OptimizationRequest, OptimizationResult
+from .optimization import PortfolioOptimizer, OptimizationRequest, OptimizationResult, BatchOptimizationRequest, BatchOptimizationResult, FrontierRequest, FrontierResult, Projection, ProjectionBand
@@ -0,0 +1,257 @@
+"""
+Discrete allocation: turns target dollar amounts into tradable share counts.
+
+Two modes:
+- "fast": floor every target to whole units, then spend the remaining cash
+  one unit at a time on the positions furthest below target (largest
+  remainder first). Vectorized apart from the remainder pass, which stops
+  as soon as nothing else is affordable.
+- "exact": mixed-integer program (scipy.optimize.milp / HiGHS) minimizing
+  the L1 dollar deviation from target, cash included, plus trading costs.
+  If `time_limit` runs out, the better of the solver's best solution and
+  the "fast" one is returned.
+
+Positions trade in units of their lot size (1 share by default, or
+FRACTIONAL_STEP for fractional positions). With `current` holdings the
+result is a rebalance: sells fund buys, trades smaller than `min_trade`
+dollars are skipped, and every buy or sell pays `cost_per_trade` plus
+`cost_rate` times its value.
+"""
+from typing import NamedTuple, Optional
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+ALLOCATION_MODES = ("fast", "exact")
+
+# Smallest tradable fraction of a share for fractional positions
+FRACTIONAL_STEP = 0.01
+
+# Relative optimality gap accepted by the "exact" solver
+MIP_GAP = 1e-6
+
+
+class Allocation(NamedTuple):
+    shares: np.ndarray      # Final holding per position
+    leftover_cash: float
+    costs: float            # Trading costs paid
+
+
+def allocate(target_values, prices, budget: float, current=None, lot_sizes=None, fractional=None,
+             min_trade: float = 0.0, cost_per_trade: float = 0.0, cost_rate: float = 0.0,
+             mode: str = "fast", time_limit: float = 1.0) -> Allocation:
+    """
+    target_values: dollars wanted in each position after trading.
+    prices: positive price per share.
+    budget: everything that can be spent, i.e. cash plus the value of `current`.
+    current: shares held now (default none).
+    lot_sizes: shares per tradable lot (default 1). Ignored for fractional positions.
+    fractional: bool or per-position flags allowing FRACTIONAL_STEP units.
+    """
+    if mode not in ALLOCATION_MODES:
+        raise ValueError(f"Unknown allocation mode: {mode}")
+    target = np.asarray(target_values, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    n = len(target)
+    current = np.zeros(n) if current is None else np.asarray(current, dtype=float)
+    lots = np.ones(n) if lot_sizes is None else np.asarray(lot_sizes, dtype=float)
+    frac = np.broadcast_to(np.asarray(False if fractional is None else fractional, dtype=bool), (n,))
+    lots = np.where(frac, FRACTIONAL_STEP, lots)
+    if n == 0:
+        return Allocation(np.zeros(0), round(float(budget), 2), 0.0)
+    if np.any(prices <= 0) or np.any(lots <= 0):
+        raise ValueError("Prices and lot sizes must be positive")
+
+    fast = _fast(target, prices, budget, current, lots, min_trade, cost_per_trade, cost_rate)
+    if mode == "fast":
+        return fast
+    exact = _exact(target, prices, budget, current, lots, min_trade, cost_per_trade, cost_rate, time_limit)
+    # On a time limit the solver's incumbent can be worse than the heuristic
+    if exact is None or _deviation(exact, target, prices, budget) > _deviation(fast, target, prices, budget):
+        return fast
+    return exact
+
+
+def _deviation(a: Allocation, target: np.ndarray, prices: np.ndarray, budget: float) -> float:
+    # Objective minimized by "exact": L1 distance to target, cash included, plus costs
+    cash_target = budget - target.sum()
+    return float(np.abs(a.shares * prices - target).sum() + abs(a.leftover_cash - cash_target) + a.costs)
+
+
+def _costs(trade: np.ndarray, prices: np.ndarray, cost_per_trade: float, cost_rate: float) -> float:
+    traded = np.abs(trade) > 1e-12
+    return float(cost_per_trade * traded.sum() + cost_rate * (np.abs(trade) * prices).sum())
+
+
+def _fast(target, prices, budget, current, lots, min_trade, cost_per_trade, cost_rate) -> Allocation:
+    unit_price = prices * lots
+    # Units already held (positions that aren't a whole number of lots keep their odd remainder)
+    held_units = np.floor(current / lots + 1e-9)
+    odd = current - held_units * lots
+
+    # 1. Floor, after reserving cash for the costs the trades will roughly incur
+    units = np.floor((target - odd * prices) / unit_price + 1e-9).clip(min=0)
+    n_trades = np.count_nonzero(units != held_units)
+    reserve = cost_per_trade * n_trades + cost_rate * np.abs(units - held_units) @ unit_price
+    if reserve > 0 and budget > 0:
+        scale = max(0.0, 1 - reserve / budget)
+        units = np.floor(scale * (target - odd * prices) / unit_price + 1e-9).clip(min=0)
+
+    # 2. Trades below min_trade stay as they are
+    if min_trade > 0:
+        small = np.abs(units - held_units) * unit_price < min_trade
+        units = np.where(small, held_units, units)
+
+    shares = units * lots + odd
+    trade = shares - current
+    cash = budget - shares @ prices - _costs(trade, prices, cost_per_trade, cost_rate)
+
+    def trade_cost(i, u):
+        # Cost of holding u units of position i after trading
+        t = abs(u - held_units[i]) * unit_price[i]
+        return (cost_per_trade if t > 1e-12 else 0.0) + cost_rate * t
+
+    # 3. Cost overshoot (rare): undo buys, smallest first
+    if cash < -1e-9:
+        buys = np.nonzero(units > held_units)[0]
+        for i in buys[np.argsort((units - held_units)[buys] * unit_price[buys])]:
+            if cash >= -1e-9:
+                break
+            cash += (units[i] - held_units[i]) * unit_price[i] + trade_cost(i, units[i])
+            units[i] = held_units[i]
+
+    # 4. Distribute the remainder: one more unit to whoever is furthest below target
+    shortfall = target - (units * lots + odd) * prices
+    order = np.argsort(-shortfall / unit_price)
+    order = order[shortfall[order] > 0]
+    if len(order) and cash >= unit_price[order].min():
+        cheapest = unit_price[order].min()
+        for i in order:
+            if cash < cheapest:
+                break
+            new = units[i] + 1
+            if min_trade > 0 and 0 < abs(new - held_units[i]) * unit_price[i] < min_trade:
+                continue
+            step = unit_price[i] + trade_cost(i, new) - trade_cost(i, units[i])
+            if step <= cash:
+                units[i] = new
+                cash -= step
+
+    shares = units * lots + odd
+    trade = shares - current
+    costs = _costs(trade, prices, cost_per_trade, cost_rate)
+    return Allocation(shares, round(float(budget - shares @ prices - costs), 2), round(costs, 2))
+
+
+def _exact(target, prices, budget, current, lots, min_trade, cost_per_trade, cost_rate, time_limit) -> Optional[Allocation]:
+    """
+    Each position's cost (|value - target| + cost_rate * |trade value|) is
+    convex and piecewise linear in its unit count, with kinks at the target
+    and the current holding. x is written as its lower bound plus integer
+    segment variables between those kinks, so the LP relaxation is the convex
+    envelope of the integer problem (a knapsack-tight bound) rather than the
+    trivial zero-deviation bound of an |x - target| formulation. Fixed costs
+    and min_trade add a buy and a sell binary per position.
+    """
+    n = len(target)
+    unit_price = prices * lots
+    held = np.floor(current / lots + 1e-9)
+    odd = current - held * lots
+    target = target - odd * prices
+    floor_units = np.floor(target / unit_price + 1e-9)
+    max_units = np.floor(budget / unit_price + 1e-9)
+
+    # An optimum never sits more than a unit or two from the floored target
+    # unless it stays at the current holding, so x is bounded to that range
+    lo = np.minimum(floor_units - 1, held).clip(min=0)
+    hi = np.maximum(np.minimum(np.maximum(floor_units + 2, held), max_units), lo)
+    points = np.column_stack([lo, floor_units - 1, floor_units, floor_units + 1, floor_units + 2, held - 1, held, held + 1, hi])
+    points = np.sort(np.clip(points, lo[:, None], hi[:, None]), axis=1)
+
+    def cost(x):
+        return np.abs(x * unit_price[:, None] - target[:, None]) + cost_rate * unit_price[:, None] * np.abs(x - held[:, None])
+
+    # Segments between consecutive distinct breakpoints
+    length = np.diff(points, axis=1)
+    slope = np.divide(np.diff(cost(points), axis=1), length, out=np.zeros_like(length), where=length > 0)
+    seg_pos, seg_k = np.nonzero(length > 0)
+    seg_len = length[seg_pos, seg_k]
+    seg_slope = slope[seg_pos, seg_k]
+    seg_buy = points[seg_pos, seg_k] >= held[seg_pos]
+    m = len(seg_pos)
+
+    with_flags = cost_per_trade > 0 or min_trade > 0
+    # Columns: segments, [zb, zs per position], d_cash, offset (fixed at 1)
+    zb0 = m
+    zs0 = m + n
+    dc = m + 2 * n if with_flags else m
+    offset = dc + 1
+    nv = dc + 2
+
+    # Spend = fixed part + segment units; cash = budget - spend
+    sells = held - lo
+    base_spend = float(lo @ unit_price + odd @ prices + cost_rate * sells @ unit_price)
+    spend = np.zeros(nv)
+    spend[:m] = unit_price[seg_pos] * (1 + np.where(seg_buy, cost_rate, -cost_rate))
+    if with_flags:
+        spend[zb0:dc] = cost_per_trade
+    cash_target = budget - (target + odd * prices).sum()
+
+    rows, cols, vals, lower, upper = [], [], [], [], []
+
+    def add_row(c, v, lb, ub):
+        r = len(lower)
+        rows.extend([r] * len(c))
+        cols.extend(c)
+        vals.extend(v)
+        lower.append(lb)
+        upper.append(ub)
+
+    nz = np.nonzero(spend)[0]
+    add_row(nz, spend[nz], -np.inf, budget - base_spend)
+    # d_cash >= |budget - spend - cash_target|
+    add_row(list(nz) + [dc], list(spend[nz]) + [1.0], budget - base_spend - cash_target, np.inf)
+    add_row(list(nz) + [dc], list(-spend[nz]) + [1.0], cash_target - budget + base_spend, np.inf)
+
+    if with_flags:
+        min_units = np.maximum(np.ceil(min_trade / unit_price - 1e-9), 1)
+        seg_ids = np.arange(m)
+        for i in range(n):
+            mine = seg_ids[seg_pos == i]
+            buy, sell = mine[seg_buy[mine]], mine[~seg_buy[mine]]
+            if len(buy):
+                # Buy units <= room * zb and >= min_units * zb
+                add_row(list(buy) + [zb0 + i], [1.0] * len(buy) + [-(hi[i] - held[i])], -np.inf, 0.0)
+                add_row(list(buy) + [zb0 + i], [1.0] * len(buy) + [-min_units[i]], 0.0, np.inf)
+            if len(sell):
+                # Sold units = sells - sum(sell segments): <= sells * zs and >= min_units * zs
+                add_row(list(sell) + [zs0 + i], [1.0] * len(sell) + [sells[i]], sells[i], np.inf)
+                add_row(list(sell) + [zs0 + i], [1.0] * len(sell) + [min_units[i]], -np.inf, sells[i])
+            add_row([zb0 + i, zs0 + i], [1.0, 1.0], -np.inf, 1.0)
+
+    A = sparse.csr_matrix((vals, (rows, cols)), shape=(len(lower), nv))
+
+    c = np.zeros(nv)
+    c[:m] = seg_slope
+    c[dc] = 1.0
+    # Constant cost of sitting at lo, so the solver's relative gap is measured on the real deviation
+    c[offset] = cost(lo[:, None]).sum()
+    var_lb = np.zeros(nv)
+    var_lb[offset] = 1
+    var_ub = np.full(nv, np.inf)
+    var_ub[:m] = seg_len
+    var_ub[offset] = 1
+    integrality = np.ones(nv)
+    integrality[dc] = integrality[offset] = 0
+    if with_flags:
+        c[zb0:dc] = cost_per_trade
+        var_ub[zb0:dc] = 1
+
+    res = milp(c, integrality=integrality, bounds=Bounds(var_lb, var_ub), constraints=LinearConstraint(A, lower, upper),
+               options={"time_limit": time_limit, "mip_rel_gap": MIP_GAP})
+    if res.x is None:
+        return None
+    units = lo + np.bincount(seg_pos, weights=np.round(res.x[:m]), minlength=n)
+    shares = units * lots + odd
+    costs = _costs(shares - current, prices, cost_per_trade, cost_rate)
+    return Allocation(shares, round(float(budget - shares @ prices - costs), 2), round(costs, 2))
@@ -0,0 +1,362 @@
+"""
+Covariance estimators for daily return panels.
+
+The dense estimators are built on running (optionally exponentially decayed)
+moment sums, so when a window of returns moves forward by a few bars the
+estimate is updated in O(n^2) per bar instead of being recomputed over the
+whole history.
+
+"factor" is a statistical (PCA) factor model S = B F B' + D for very large
+universes. It is returned as a FactorCovariance operator that never builds
+the n x n matrix: S @ x and w' S w cost O(n k).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+ESTIMATORS = ("sample", "ewma", "ledoit_wolf", "factor")
+
+# RiskMetrics daily decay
+EWMA_DECAY = 0.94
+
+# Factor model: number of principal components, extra randomized-SVD columns and
+# power iterations, and the smallest residual variance as a share of an asset's
+# total variance (keeps S positive definite when k factors explain everything)
+FACTOR_COUNT = 20
+FACTOR_OVERSAMPLING = 10
+FACTOR_POWER_ITERATIONS = 4
+RESIDUAL_FLOOR = 0.01
+
+
+class FactorCovariance:
+    """
+    Covariance S = B F B' + diag(D) kept in factored form.
+
+    B: (n, k) loadings, F: (k, k) factor covariance, D: (n,) residual
+    variances, index: optional ticker labels. Supports `S @ x`, `x @ S`,
+    scaling by a number and subsetting, which is all the solvers and the
+    risk statistics need.
+    """
+
+    # Make `ndarray @ S` defer to __rmatmul__ instead of converting S to an array
+    __array_ufunc__ = None
+
+    def __init__(self, B: np.ndarray, F: np.ndarray, D: np.ndarray, index: Optional[pd.Index] = None):
+        self.B = B
+        self.F = F
+        self.D = D
+        self.index = index
+
+    @property
+    def shape(self):
+        return (len(self.D), len(self.D))
+
+    def __matmul__(self, x):
+        x = np.asarray(x, dtype=float)
+        D = self.D if x.ndim == 1 else self.D[:, None]
+        return self.B @ (self.F @ (self.B.T @ x)) + D * x
+
+    def __rmatmul__(self, x):
+        # S is symmetric
+        return (self @ np.asarray(x, dtype=float).T).T
+
+    def __mul__(self, c: float) -> "FactorCovariance":
+        return FactorCovariance(self.B, self.F * c, self.D * c, self.index)
+
+    __rmul__ = __mul__
+
+    def diagonal(self) -> np.ndarray:
+        return np.einsum("ik,kl,il->i", self.B, self.F, self.B) + self.D
+
+    def take(self, tickers) -> "FactorCovariance":
+        """
+        Covariance of a subset of the assets, by label.
+        """
+        pos = self.index.get_indexer(tickers)
+        if (pos < 0).any():
+            raise KeyError(f"Unknown tickers: {list(pd.Index(tickers)[pos < 0])}")
+        return FactorCovariance(self.B[pos], self.F, self.D[pos], pd.Index(tickers))
+
+    def to_dense(self) -> np.ndarray:
+        return self.B @ self.F @ self.B.T + np.diag(self.D)
+
+
+def factor_model(X: np.ndarray, k: int = FACTOR_COUNT) -> tuple:
+    """
+    PCA factor model of a (T, n) return matrix: returns (B, F, D).
+
+    The top k principal components come from a randomized SVD of the
+    centered returns, O(T n k) instead of the O(n^2 T) of a dense
+    covariance. B are the component directions, F the variances along
+    them and D whatever variance of each asset they leave unexplained.
+    """
+    T, n = X.shape
+    Xc = X - X.mean(axis=0)
+    k = max(1, min(k, T - 1, n))
+    width = k + FACTOR_OVERSAMPLING
+
+    if width >= min(T, n):
+        _, s, Vt = np.linalg.svd(Xc, full_matrices=False)
+    else:
+        # Randomized range finder with power iterations (Halko et al. 2011)
+        Q = Xc @ np.random.default_rng(0).standard_normal((n, width))
+        for _ in range(FACTOR_POWER_ITERATIONS):
+            Q, _ = np.linalg.qr(Q)
+            Q = Xc @ (Xc.T @ Q)
+        Q, _ = np.linalg.qr(Q)
+        _, s, Vt = np.linalg.svd(Q.T @ Xc, full_matrices=False)
+
+    B = Vt[:k].T
+    F = np.diag(s[:k] ** 2 / (T - 1))
+    variance = np.einsum("ij,ij->j", Xc, Xc) / (T - 1)
+    explained = (B * B) @ np.diag(F)
+    D = np.maximum(variance - explained, RESIDUAL_FLOOR * variance)
+    return B, F, D
+
+
+class _RunningMoments:
+    """
+    Weighted moment sums over a window of return rows.
+
+    With decay < 1 the row that is k bars old has weight decay**k; with
+    decay == 1 this reduces to plain sums. Rows are added at the end and
+    removed from the start of the window.
+    """
+
+    def __init__(self, n: int, decay: float = 1.0):
+        self.decay = decay
+        self.count = 0
+        self.weight = 0.0               # sum of weights
+        self.sum_x = np.zeros(n)        # sum of w * x
+        self.sum_xx = np.zeros((n, n))  # sum of w * x x'
+        # Fourth-moment sums for Ledoit-Wolf (only meaningful when decay == 1)
+        self.sum_a2 = 0.0               # sum of ||x||^4
+        self.sum_ax = np.zeros(n)       # sum of ||x||^2 * x
+
+    def copy(self) -> "_RunningMoments":
+        other = _RunningMoments.__new__(_RunningMoments)
+        other.__dict__ = {k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in self.__dict__.items()}
+        return other
+
+    def add(self, X: np.ndarray):
+        k = len(X)
+        if k == 0:
+            return
+        # Newest row gets weight 1, the one before decay, ...
+        w = self.decay ** np.arange(k - 1, -1, -1)
+        shift = self.decay ** k
+        self.weight = shift * self.weight + w.sum()
+        self.sum_x = shift * self.sum_x + w @ X
+        self.sum_xx = shift * self.sum_xx + (X * w[:, None]).T @ X
+        a = np.einsum("ij,ij->i", X, X)
+        self.sum_a2 += a @ a
+        self.sum_ax += a @ X
+        self.count += k
+
+    def remove_oldest(self, X: np.ndarray):
+        """
+        Removes the `len(X)` oldest rows of the window (X in date order).
+        """
+        k = len(X)
+        if k == 0:
+            return
+        ages = self.count - 1 - np.arange(k)
+        w = self.decay ** ages
+        self.weight -= w.sum()
+        self.sum_x -= w @ X
+        self.sum_xx -= (X * w[:, None]).T @ X
+        a = np.einsum("ij,ij->i", X, X)
+        self.sum_a2 -= a @ a
+        self.sum_ax -= a @ X
+        self.count -= k
+
+    def sample(self) -> np.ndarray:
+        m = self.sum_x / self.count
+        return (self.sum_xx - self.count * np.outer(m, m)) / (self.count - 1)
+
+    def ewma(self) -> np.ndarray:
+        m = self.sum_x / self.weight
+        return self.sum_xx / self.weight - np.outer(m, m)
+
+    def ledoit_wolf(self) -> np.ndarray:
+        """
+        Ledoit-Wolf (2004) shrinkage towards a scaled identity, computed from
+        the running sums (same estimator as sklearn.covariance.ledoit_wolf).
+        """
+        T, n = self.count, len(self.sum_x)
+        m = self.sum_x / T
+        c = m @ m
+        emp = self.sum_xx / T - np.outer(m, m)
+
+        # sum_t ||x_t - m||^4 expanded in terms of the running sums
+        trace_xx = np.trace(self.sum_xx)
+        centered_a2 = (self.sum_a2 + 4 * m @ self.sum_xx @ m + T * c * c
+                       - 4 * m @ self.sum_ax + 2 * c * trace_xx - 4 * T * c * c)
+
+        target = np.trace(emp) / n
+        emp_norm = np.sum(emp * emp)
+        delta = (emp_norm - 2 * target * np.trace(emp) + n * target * target) / n
+        beta = (centered_a2 / T - emp_norm) / (n * T)
+        beta = min(max(beta, 0.0), delta)
+        shrinkage = beta / delta if delta > 0 else 0.0
+
+        shrunk = (1 - shrinkage) * emp
+        shrunk[np.diag_indices(n)] += shrinkage * target
+        return shrunk
+
+
+def _decay(estimator: str) -> float:
+    return EWMA_DECAY if estimator == "ewma" else 1.0
+
+
+def _finalize(state: _RunningMoments, estimator: str) -> np.ndarray:
+    if estimator == "ewma":
+        return state.ewma()
+    if estimator == "ledoit_wolf":
+        return state.ledoit_wolf()
+    return state.sample()
+
+
+class CovarianceCache:
+    """
+    Covariance estimates keyed by (universe, window, digest of the returns, estimator).
+
+    Alongside finished estimates it keeps the latest running state per
+    (universe, estimator). A request whose window is the cached one moved
+    forward (same overlapping rows, some bars dropped at the start and some
+    appended at the end) is served by updating that state.
+
+    Both grow quadratically with the universe, so besides the entry counts
+    everything cached together is kept under `max_bytes`: the least recently
+    used estimates go first, then states. Anything larger than the budget on
+    its own is not cached.
+    """
+
+    def __init__(self, max_entries: int = 128, max_states: int = 32, max_bytes: int = 256 * 2**20):
+        self.max_entries = max_entries
+        self.max_states = max_states
+        self.max_bytes = max_bytes
+        self._results: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._states: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.incremental_updates = 0
+        self.full_computes = 0
+
+    def estimate(self, returns: pd.DataFrame, estimator: str = "sample"):
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"Unknown covariance estimator: {estimator}")
+        if len(returns) < 2:
+            raise ValueError("Insufficient data points after cleaning")
+
+        universe = tuple(returns.columns)
+        dates = returns.index.values
+        X = np.ascontiguousarray(returns.values, dtype=float)
+        # The values are part of the key: a revised (e.g. intraday) last bar or a
+        # re-adjusted history over the same dates must not get the old estimate
+        key = (universe, dates[0], dates[-1], len(dates), hashlib.sha1(memoryview(X)).hexdigest(), estimator)
+
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return cached
+            previous = self._states.get((universe, estimator))
+
+        if estimator == "factor":
+            # No running state: an n x n moment sum is exactly what this mode avoids
+            S = FactorCovariance(*factor_model(X), index=returns.columns)
+            with self._lock:
+                self.full_computes += 1
+                self._store(self._results, key, S)
+                self._evict()
+            return S
+
+        state = self._advance(previous, dates, X) if previous is not None else None
+        incremental = state is not None
+        if state is None:
+            state = _RunningMoments(X.shape[1], _decay(estimator))
+            state.add(X)
+
+        S = _finalize(state, estimator)
+        with self._lock:
+            if incremental:
+                self.incremental_updates += 1
+            else:
+                self.full_computes += 1
+            self._store(self._results, key, S)
+            self._store(self._states, (universe, estimator), (state, dates, X))
+            self._evict()
+        return S
+
+    def _store(self, entries: OrderedDict, key: tuple, value):
+        # Caller holds the lock
+        size = _nbytes(value)
+        if key in entries:
+            self._bytes -= _nbytes(entries.pop(key))
+        if size <= self.max_bytes:
+            entries[key] = value
+            self._bytes += size
+
+    def _evict(self):
+        # Caller holds the lock
+        while len(self._results) > self.max_entries:
+            self._bytes -= _nbytes(self._results.popitem(last=False)[1])
+        while len(self._states) > self.max_states:
+            self._bytes -= _nbytes(self._states.popitem(last=False)[1])
+        while self._bytes > self.max_bytes and (self._results or self._states):
+            entries = self._results if self._results else self._states
+            self._bytes -= _nbytes(entries.popitem(last=False)[1])
+
+    @staticmethod
+    def _advance(previous: tuple, dates: np.ndarray, X: np.ndarray) -> Optional[_RunningMoments]:
+        state, old_dates, old_X = previous
+        # Bars that left the window at the start / joined at the end
+        dropped = int(np.searchsorted(old_dates, dates[0]))
+        kept = len(old_dates) - dropped
+        if kept <= 0 or kept > len(dates):
+            return None
+        # Only worth it if most of the window is shared
+        if dropped + (len(dates) - kept) > len(dates) // 2:
+            return None
+        # The overlapping rows must be identical (e.g. a re-fetched last bar invalidates the state)
+        if not np.array_equal(old_dates[dropped:], dates[:kept]) or not np.array_equal(old_X[dropped:], X[:kept]):
+            return None
+
+        state = state.copy()
+        state.remove_oldest(old_X[:dropped])
+        state.add(X[kept:])
+        return state
+
+
+def _nbytes(value) -> int:
+    # Memory held by a cached estimate or (state, dates, X) tuple
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, _RunningMoments):
+        return sum(v.nbytes for v in vars(value).values() if isinstance(v, np.ndarray))
+    if isinstance(value, FactorCovariance):
+        return value.B.nbytes + value.F.nbytes + value.D.nbytes
+    return value.nbytes
+
+
+default_cache = CovarianceCache(max_bytes=int(os.environ.get("COVARIANCE_CACHE_MB", 256)) * 2**20)
+
+
+def estimate_covariance(returns: pd.DataFrame, estimator: str = "sample", cache: Optional[CovarianceCache] = None):
+    """
+    Daily covariance of `returns` (rows = dates, columns = tickers, no NaNs)
+    using the given estimator, served from / stored in the cache.
+    A DataFrame, or a FactorCovariance labelled by ticker for "factor".
+    """
+    S = (cache or default_cache).estimate(returns, estimator)
+    if isinstance(S, FactorCovariance):
+        return S
+    return pd.DataFrame(S, index=returns.columns, columns=returns.columns)
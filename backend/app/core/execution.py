@@ -0,0 +1,216 @@
+"""
+Process-pool execution of the portfolio solvers.
+
+Solves of large universes run in worker processes, so they use the other
+cores and never hold the API process's GIL. mu and S travel through one
+shared memory block that the worker maps; nothing large is pickled.
+Small problems are cheaper inline than the round trip and stay in-process.
+
+Workers are spawned lazily on the first large solve and run at a lower
+scheduling priority than the API process, so a busy pool does not slow
+down request handling.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from . import solvers
+from .covariance import FactorCovariance
+from ..instrumentation.metrics import SOLVE_DISPATCH
+
+logger = logging.getLogger(__name__)
+
+# Assets up to which a solve runs in the calling thread (a 250-asset max-Sharpe solve takes ~0.1 s)
+INLINE_MAX_ASSETS = 250
+
+# Niceness added to worker processes
+WORKER_NICENESS = 5
+
+# How often a waiting caller checks for cancellation (seconds)
+CANCEL_POLL = 0.05
+
+# Problem name -> call on (mu, S, keyword arguments)
+_PROBLEMS = {
+    "min_volatility": lambda mu, S, kwargs: solvers.min_volatility(S, **kwargs),
+    "max_sharpe": lambda mu, S, kwargs: solvers.max_sharpe(mu, S, **kwargs),
+    "efficient_frontier": lambda mu, S, kwargs: solvers.efficient_frontier(mu, S, **kwargs),
+}
+
+# Array layout in a shared block: (name, shape, memory order, byte offset)
+Layout = List[Tuple[str, tuple, str, int]]
+
+
+class SolveCancelled(Exception):
+    """
+    The caller's cancel event was set while its solve was waiting or running.
+    """
+
+
+class SolveExecutor:
+    """
+    Runs solver problems inline or on a process pool, by universe size.
+
+    workers: pool size (default: all cores but one, at least one); 0 runs
+    everything inline. The pool is created on the first solve that needs it.
+    """
+
+    def __init__(self, workers: Optional[int] = None, inline_max_assets: int = INLINE_MAX_ASSETS, niceness: int = WORKER_NICENESS):
+        self.workers = max(1, (os.cpu_count() or 1) - 1) if workers is None else workers
+        self.inline_max_assets = inline_max_assets
+        self.niceness = niceness
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def solve(self, problem: str, mu: np.ndarray, S, cancel: Optional[threading.Event] = None, **kwargs):
+        """
+        solvers.<problem>(mu, S, **kwargs) (min_volatility ignores mu). S is a
+        dense array or a FactorCovariance. Raises SolveCancelled when `cancel`
+        is set before a pooled solve returns; a solve a worker already started
+        runs to completion and its result is dropped.
+        """
+        if problem not in _PROBLEMS:
+            raise ValueError(f"Unknown solver problem: {problem}")
+        mu = np.asarray(mu, dtype=float)
+        if self.workers == 0 or len(mu) <= self.inline_max_assets:
+            SOLVE_DISPATCH.inc(mode="inline")
+            return _PROBLEMS[problem](mu, S, kwargs)
+
+        SOLVE_DISPATCH.inc(mode="pool")
+        # 1. Copy mu and S into one shared block
+        block, layout = _share(mu, S)
+        pool = self._get_pool()
+        try:
+            future = pool.submit(_run_shared, problem, block.name, layout, kwargs)
+        except BaseException:
+            _release(block)
+            raise
+        # The worker maps the block until it finishes, which may be after we stop waiting
+        future.add_done_callback(lambda _: _release(block))
+
+        # 2. Wait, checking for cancellation
+        try:
+            return _wait(future, cancel)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); the next solve starts a fresh pool
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False)
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "inline_max_assets": self.inline_max_assets, "started": self._pool is not None}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs server threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.niceness,)
+                )
+            return self._pool
+
+
+@lru_cache(maxsize=None)
+def get_solve_executor() -> SolveExecutor:
+    """
+    Process-wide solver executor (SOLVER_WORKERS, SOLVE_INLINE_MAX_ASSETS).
+    """
+    workers = os.environ.get("SOLVER_WORKERS")
+    return SolveExecutor(
+        workers=int(workers) if workers else None,
+        inline_max_assets=int(os.environ.get("SOLVE_INLINE_MAX_ASSETS", INLINE_MAX_ASSETS))
+    )
+
+
+def _wait(future: Future, cancel: Optional[threading.Event]):
+    if cancel is None:
+        return future.result()
+    while True:
+        if cancel.is_set():
+            future.cancel() # Only succeeds while the job is still queued
+            raise SolveCancelled("Solve cancelled")
+        try:
+            return future.result(timeout=CANCEL_POLL)
+        except FutureTimeout:
+            continue
+        except CancelledError:
+            raise SolveCancelled("Solve cancelled")
+
+
+def _share(mu: np.ndarray, S) -> Tuple[shared_memory.SharedMemory, Layout]:
+    # mu, then either S or the factor model's B, F, D, packed back to back
+    if isinstance(S, FactorCovariance):
+        arrays = {"mu": mu, "B": S.B, "F": S.F, "D": S.D}
+    else:
+        arrays = {"mu": mu, "S": np.asarray(S, dtype=float)}
+    # Memory order is kept so BLAS sums in the same order as an inline solve (identical results)
+    layout: Layout = []
+    offset = 0
+    for name, array in arrays.items():
+        order = "F" if array.flags.f_contiguous and not array.flags.c_contiguous else "C"
+        layout.append((name, array.shape, order, offset))
+        offset += array.size * 8
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (name, shape, order, start), array in zip(layout, arrays.values()):
+        np.ndarray(shape, dtype=np.float64, buffer=block.buf, offset=start, order=order)[...] = array
+    return block, layout
+
+
+def _release(block: shared_memory.SharedMemory):
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _init_worker(niceness: int):
+    if not hasattr(os, "nice"):
+        return # Windows: no niceness; workers run at normal priority
+    try:
+        os.nice(niceness)
+    except OSError as e:
+        logger.warning("Could not lower solver worker priority: %s", e)
+
+
+def _run_shared(problem: str, name: str, layout: Layout, kwargs: Dict):
+    # Worker side: map the caller's block and solve on read-only views of it. Workers
+    # share the caller's resource tracker, which the caller's unlink settles.
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return _solve_views(problem, block, layout, kwargs)
+    finally:
+        try:
+            block.close()
+        except BufferError:
+            pass # Views still referenced by a traceback; unmapped when they are collected
+
+
+def _solve_views(problem: str, block: shared_memory.SharedMemory, layout: Layout, kwargs: Dict):
+    arrays = {}
+    for key, shape, order, start in layout:
+        array = np.ndarray(shape, dtype=np.float64, buffer=block.buf, offset=start, order=order)
+        array.flags.writeable = False
+        arrays[key] = array
+    S = FactorCovariance(arrays["B"], arrays["F"], arrays["D"]) if "B" in arrays else arrays["S"]
+    result = _PROBLEMS[problem](arrays["mu"], S, kwargs)
+    # Results must own their weights to outlive the block
+    if isinstance(result, list):
+        return [r._replace(weights=np.array(r.weights)) for r in result]
+    return result._replace(weights=np.array(result.weights))
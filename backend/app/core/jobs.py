@@ -0,0 +1,312 @@
+"""
+Asynchronous optimization jobs: submit, poll, cancel.
+
+A job fetches prices like POST /optimize and solves off the event loop;
+large solves go to the solver process pool (see execution.py). It runs in
+the server process that accepted it; at most `max_running` jobs run at
+once per process, so jobs never hold more than that many threadpool
+threads.
+
+Job state lives in a SQLite table in the shared state directory, so any
+server worker process can answer a poll or a cancellation. The owning
+process picks up cancellations from the table and refreshes a heartbeat
+on its unfinished jobs; a job whose heartbeat stops (its process died) is
+reported as failed. At most `max_running + max_queued` jobs may be
+unfinished across all processes; submissions beyond that are refused.
+Finished jobs are forgotten after `retention` seconds.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from .execution import SolveCancelled, get_solve_executor
+from .optimization import PortfolioOptimizer, OptimizationRequest, OptimizationResult
+from ..data.defaults import get_async_provider, state_dir
+from ..instrumentation.metrics import OPTIMIZE_JOBS
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("done", "failed", "cancelled")
+
+# How often the owning process checks for cancellations and refreshes heartbeats (seconds)
+WATCH_INTERVAL = 0.5
+
+# An unfinished job whose heartbeat is older than this is considered lost (seconds)
+HEARTBEAT_TIMEOUT = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT
+)
+"""
+
+
+class OptimizationJob(BaseModel):
+    id: str
+    status: str = "queued" # "queued", "running", "done", "failed" or "cancelled"
+    submitted_at: float # Unix time
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[OptimizationResult] = None
+    error: Optional[str] = None
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobStore:
+    """
+    Thread-safe SQLite table of jobs, shared by the server processes
+    (WAL journal, one connection per thread). Blocking: call it off the event loop.
+    """
+
+    def __init__(self, path: str, heartbeat_timeout: float = HEARTBEAT_TIMEOUT):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.heartbeat_timeout = heartbeat_timeout
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def insert(self, job: OptimizationJob, limit: int) -> bool:
+        """
+        Adds a queued job unless `limit` jobs are already unfinished (checked
+        and inserted atomically across processes). False when refused.
+        """
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_lost(db)
+            unfinished = db.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE status NOT IN ({_FINISHED_SQL})").fetchone()[0]
+            if unfinished >= limit:
+                db.execute("ROLLBACK")
+                return False
+            db.execute(
+                "INSERT INTO jobs (id, status, submitted_at, heartbeat_at) VALUES (?, ?, ?, ?)",
+                (job.id, job.status, job.submitted_at, time.time())
+            )
+            db.execute("COMMIT")
+            return True
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def get(self, job_id: str) -> Optional[OptimizationJob]:
+        db = self._connect()
+        self._expire_lost(db)
+        row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _to_job(row) if row is not None else None
+
+    def start(self, job_id: str, started_at: float) -> bool:
+        """
+        Marks a queued job running; False if it was cancelled meanwhile.
+        """
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ? WHERE id = ? AND status = 'queued'",
+            (started_at, time.time(), job_id)
+        )
+        return cursor.rowcount > 0
+
+    def finish(self, job_id: str, status: str, result: Optional[OptimizationResult] = None, error: Optional[str] = None) -> bool:
+        """
+        Records the outcome unless the job already finished (e.g. was cancelled).
+        """
+        cursor = self._connect().execute(
+            f"UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ? AND status NOT IN ({_FINISHED_SQL})",
+            (status, time.time(), result.model_dump_json() if result is not None else None, error, job_id)
+        )
+        return cursor.rowcount > 0
+
+    def cancel(self, job_id: str) -> Optional[OptimizationJob]:
+        """
+        Cancels an unfinished job (the owning process stops it on its next
+        watch tick). Finished jobs are returned as they are.
+        """
+        self._connect().execute(
+            f"UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? WHERE id = ? AND status NOT IN ({_FINISHED_SQL})",
+            (time.time(), job_id)
+        )
+        return self.get(job_id)
+
+    def watch(self, job_ids: Iterable[str]) -> Set[str]:
+        """
+        Refreshes the heartbeat of the given (locally running) jobs and
+        returns those that were cancelled.
+        """
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        db = self._connect()
+        marks = ",".join("?" * len(job_ids))
+        db.execute(f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({marks})", (time.time(), *job_ids))
+        return {row["id"] for row in db.execute(f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({marks})", job_ids)}
+
+    def counts(self) -> Dict[str, int]:
+        counts = {status: 0 for status in ("queued", "running") + FINISHED}
+        for row in self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts
+
+    def prune(self, finished_before: float):
+        self._connect().execute(
+            f"DELETE FROM jobs WHERE status IN ({_FINISHED_SQL}) AND finished_at < ?", (finished_before,))
+
+    def _expire_lost(self, db: sqlite3.Connection):
+        # Jobs whose owning process stopped refreshing them (crashed or restarted)
+        now = time.time()
+        db.execute(
+            f"UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Job lost: its server process exited' "
+            f"WHERE status NOT IN ({_FINISHED_SQL}) AND heartbeat_at < ?",
+            (now, now - self.heartbeat_timeout)
+        )
+
+
+_FINISHED_SQL = ",".join(f"'{status}'" for status in FINISHED)
+
+
+class OptimizationJobs:
+    def __init__(self, store: Optional[JobStore] = None, max_running: Optional[int] = None, max_queued: Optional[int] = None,
+                 retention: Optional[float] = None, optimizer_factory: Callable[[], PortfolioOptimizer] = PortfolioOptimizer):
+        self._store = store
+        self.max_running = max_running or int(os.environ.get("OPTIMIZE_JOBS_MAX_RUNNING", 0)) or max(1, get_solve_executor().workers)
+        self.max_queued = max_queued if max_queued is not None else int(os.environ.get("OPTIMIZE_JOBS_MAX_QUEUED", 32))
+        self.retention = retention if retention is not None else float(os.environ.get("OPTIMIZE_JOBS_RETENTION", 900))
+        self.optimizer_factory = optimizer_factory
+        # Jobs running in this process: id -> (task, cancel event seen by the solve executor)
+        self._local: Dict[str, Tuple[asyncio.Task, threading.Event]] = {}
+        self._slots = asyncio.Semaphore(self.max_running)
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def store(self) -> JobStore:
+        # Opened on first use, not when the app module is imported
+        if self._store is None:
+            self._store = JobStore(state_dir() / "jobs.sqlite")
+        return self._store
+
+    async def submit(self, request: OptimizationRequest) -> OptimizationJob:
+        """
+        Queues a job to run in this process. Raises JobQueueFull when
+        max_running + max_queued jobs are already unfinished.
+        """
+        job = OptimizationJob(id=uuid.uuid4().hex, submitted_at=time.time())
+        await run_in_threadpool(self.store.prune, time.time() - self.retention)
+        if not await run_in_threadpool(self.store.insert, job, self.max_running + self.max_queued):
+            raise JobQueueFull("Too many optimization jobs in progress, try again later")
+
+        cancel = threading.Event()
+        task = asyncio.get_running_loop().create_task(self._run(job.id, request, cancel))
+        self._local[job.id] = (task, cancel)
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+        return job
+
+    async def get(self, job_id: str) -> Optional[OptimizationJob]:
+        return await run_in_threadpool(self.store.get, job_id)
+
+    async def cancel(self, job_id: str) -> Optional[OptimizationJob]:
+        """
+        Cancels a queued or running job, whichever process runs it. A solve
+        already running in a worker process finishes there; its result is dropped.
+        """
+        job = await run_in_threadpool(self.store.cancel, job_id)
+        if job is not None and job_id in self._local:
+            self._stop_local(job_id) # Ours: no need to wait for the watcher
+        return job
+
+    async def stats(self) -> Dict[str, int]:
+        counts = await run_in_threadpool(self.store.counts)
+        return {**counts, "running_here": len(self._local), "max_running": self.max_running, "max_queued": self.max_queued}
+
+    async def shutdown(self):
+        tasks = [task for task, _ in self._local.values()]
+        for job_id in list(self._local):
+            await run_in_threadpool(self.store.cancel, job_id)
+            self._stop_local(job_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._watcher is not None:
+            self._watcher.cancel()
+
+    def _stop_local(self, job_id: str):
+        task, cancel = self._local[job_id]
+        cancel.set()
+        task.cancel()
+
+    async def _watch(self):
+        # Heartbeats for our jobs, and cancellations requested through other processes
+        while self._local:
+            try:
+                for job_id in await run_in_threadpool(self.store.watch, list(self._local)):
+                    if job_id in self._local:
+                        self._stop_local(job_id)
+            except Exception as e:
+                logger.warning("Watching optimization jobs failed: %s", e)
+            await asyncio.sleep(WATCH_INTERVAL)
+
+    async def _run(self, job_id: str, request: OptimizationRequest, cancel: threading.Event):
+        try:
+            async with self._slots:
+                if not await run_in_threadpool(self.store.start, job_id, time.time()):
+                    return # Cancelled while queued
+                optimizer = self.optimizer_factory()
+                optimizer.cancel = cancel
+
+                # 1. Fetch on the event loop, then clean, estimate and solve in a thread
+                tickers = await run_in_threadpool(optimizer.screen_tickers, request.tickers)
+                prices = await get_async_provider().get_historical_prices(tickers) if tickers else None
+                result = await run_in_threadpool(optimizer.optimize_portfolio, request, prices)
+        except (asyncio.CancelledError, SolveCancelled):
+            await self._finish(job_id, "cancelled")
+        except ValueError as e:
+            await self._finish(job_id, "failed", error=str(e))
+        except asyncio.TimeoutError:
+            await self._finish(job_id, "failed", error="Market data request timed out")
+        except Exception as e:
+            logger.exception("Optimization job %s failed: %s", job_id, e)
+            await self._finish(job_id, "failed", error="Internal Optimization Error")
+        else:
+            await self._finish(job_id, "done", result=result)
+        finally:
+            self._local.pop(job_id, None)
+
+    async def _finish(self, job_id: str, status: str, result: Optional[OptimizationResult] = None, error: Optional[str] = None):
+        # Cancellations are recorded by cancel(); this only counts them
+        if status == "cancelled" or await run_in_threadpool(self.store.finish, job_id, status, result, error):
+            OPTIMIZE_JOBS.inc(status=status)
+
+
+def _to_job(row: sqlite3.Row) -> OptimizationJob:
+    return OptimizationJob(
+        id=row["id"],
+        status=row["status"],
+        submitted_at=row["submitted_at"],
+        started_at=row["started_at"],
+        finished_at=row["finished_at"],
+        result=OptimizationResult.model_validate_json(row["result"]) if row["result"] else None,
+        error=row["error"]
+    )
@@ -1,16 +1,51 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 import pandas as pd
 import numpy as np
-from scipy.optimize import minimize
+from . import simulation, solvers
+from .allocation import allocate
+from .covariance import ESTIMATORS, FactorCovariance, estimate_covariance
+from .execution import SolveExecutor, get_solve_executor
+from .result_cache import ResultCache
 from ..data.adapter import MarketDataProvider
-from ..data.yahoo_adapter import YahooFinanceProvider
+from ..data.defaults import get_default_provider, get_ticker_metadata
+from ..data.metadata import TickerMetadataService
+from ..data.panel import ReturnsPanel
+from ..instrumentation import observe_solver, stage
 
 class OptimizationRequest(BaseModel):
     tickers: List[str]
     risk_appetite: float # 0.0 (Low risk) to 1.0 (High risk)
     investment_amount: float
     time_horizon_years: int
+    allocation_mode: str = "fast" # Discrete allocation: "fast" or "exact" (see allocation.py)
+    projection: str = "parametric" # Monte Carlo over time_horizon_years: "parametric", "bootstrap" or "none"
+    projection_paths: int = 2000
+    projection_seed: int = 0 # Same seed, same projection
+    covariance: Optional[str] = None # Estimator override, e.g. "factor" for very large universes (see covariance.py)
+
+class ProjectionBand(BaseModel):
+    year: int
+    p5: float
+    p25: float
+    p50: float
+    p75: float
+    p95: float
+
+class Projection(BaseModel):
+    method: str
+    horizon_years: int
+    paths: int
+    seed: int
+    initial_value: float
+    expected_value: float # Mean terminal value
+    probability_of_loss: float # Share of paths ending below initial_value
+    percentiles: Dict[str, float] # Terminal value percentiles ("p5" ... "p95")
+    bands: List[ProjectionBand] # Percentiles at each year end
 
 class OptimizationResult(BaseModel):
     weights: Dict[str, float]
@@ -19,110 +54,456 @@ class OptimizationResult(BaseModel):
     volatility: float
     sharpe_ratio: float
     leftover_cash: float
+    projection: Optional[Projection] = None
+
+class BatchOptimizationRequest(BaseModel):
+    requests: List[OptimizationRequest]
+
+class BatchOptimizationResult(BaseModel):
+    result: Optional[OptimizationResult] = None
+    error: Optional[str] = None # Set instead of result when the request was invalid
+
+class FrontierRequest(BaseModel):
+    tickers: List[str]
+    risk_appetite: Optional[float] = None # If set, the matching frontier point is returned as `selected`
+    num_points: int = 20
+    covariance: Optional[str] = None # Estimator override (see OptimizationRequest)
+
+class FrontierPoint(BaseModel):
+    weights: Dict[str, float]
+    expected_return: float
+    volatility: float
+    sharpe_ratio: float
+
+class FrontierResult(BaseModel):
+    as_of: str # Date of the last price bar used
+    points: List[FrontierPoint]
+    selected: Optional[FrontierPoint] = None
+
+# Largest simulation accepted inline on a request
+MAX_PROJECTION_PATHS = 100_000
+MAX_PROJECTION_YEARS = 100
+
+# Solved frontiers keyed by (universe and data version, num_points, solver, estimator).
+# Repeat requests for the same universe only interpolate.
+_FRONTIER_CACHE_SIZE = 64
+_frontier_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_frontier_lock = threading.Lock()
+
+# optimize_portfolio solutions (weights, and mu, S of the held assets) keyed by universe, objective
+# and data version (see _solution_key); a new bar changes the key. Discrete
+# allocation and projection depend on the amount, so they run per request.
+_solve_cache = ResultCache(
+    "optimize",
+    max_entries=int(os.environ.get("OPTIMIZE_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("OPTIMIZE_CACHE_TTL", 900))
+)
 
 class PortfolioOptimizer:
-    def __init__(self, provider=YahooFinanceProvider()):
-        self.provider = provider
+    def __init__(self, provider: MarketDataProvider = None, solver: str = "qp", covariance: str = "sample",
+                 metadata: Optional[TickerMetadataService] = None, executor: Optional[SolveExecutor] = None):
+        if solver not in solvers.SOLVER_BACKENDS:
+            raise ValueError(f"Unknown solver backend: {solver}")
+        if covariance not in ESTIMATORS:
+            raise ValueError(f"Unknown covariance estimator: {covariance}")
+        self.provider = provider or get_default_provider()
+        # Known-bad tickers are screened out before fetching (only with the default provider unless injected)
+        self.metadata = metadata or (get_ticker_metadata() if provider is None else None)
+        # Large solves go to a process pool; `cancel` (a threading.Event) abandons a pooled solve
+        self.executor = executor or get_solve_executor()
+        self.cancel = None
+        self.solver = solver # "qp" (fast projected gradient) or "slsqp" (fallback)
+        self.covariance = covariance # "sample" (default), "ewma", "ledoit_wolf" or "factor"; requests may override
         self.risk_free_rate = 0.02 # Assumption for MVP
 
-    def optimize_portfolio(self, request: OptimizationRequest) -> OptimizationResult:
+    def optimize_portfolio(self, request: OptimizationRequest, prices: Optional[pd.DataFrame] = None) -> OptimizationResult:
+        """
+        `prices` (a DataFrame or ReturnsPanel) may be passed in when the caller
+        already fetched the history (e.g. through the async provider);
+        otherwise it is fetched here.
+        """
         # 0. Basic Validation
         if not request.tickers:
              raise ValueError("No tickers provided for optimization")
 
+        estimator = self._estimator(request.covariance)
+
         # 1. Fetch Data
-        df = self.provider.get_historical_prices(request.tickers)
-        
-        if df.empty:
-            raise ValueError(f"No historical data found for tickers: {request.tickers}")
+        panel = prices if prices is not None else self._fetch(self.screen_tickers(request.tickers))
+        panel = self.clean_prices(panel, request.tickers)
+
+        # 2./3. Expected Returns, Covariance and Optimization (reused across amounts)
+        weights, mu, S = self._solution(panel, request.risk_appetite, estimator)
+
+        # 4. Discrete Allocation & Stats
+        result = self.build_result(weights, mu, S, panel.latest(), request.investment_amount, request.allocation_mode)
+
+        # 5. Projected outcomes over the horizon
+        result.projection = self.project(request, weights, mu, S, panel)
+        return result
+
+    def optimize_many(self, requests: List[OptimizationRequest], prices: Optional[pd.DataFrame] = None) -> List[BatchOptimizationResult]:
+        """
+        Optimizes many requests while sharing work between them.
+
+        The union of all tickers is fetched once. Requests are grouped by
+        universe, estimator and objective so each group is solved once; only
+        the discrete allocation runs per request. mu/S are computed once on the
+        union and sliced per group whenever the group's cleaned history matches
+        the union's, otherwise the group computes its own (so results are
+        identical to calling optimize_portfolio in a loop).
+        """
+        results: List[Optional[BatchOptimizationResult]] = [None] * len(requests)
+
+        # Group by exact universe (order preserved), estimator and objective
+        groups: Dict[tuple, List[int]] = {}
+        for i, req in enumerate(requests):
+            if not req.tickers:
+                results[i] = BatchOptimizationResult(error="No tickers provided for optimization")
+                continue
+            try:
+                estimator = self._estimator(req.covariance)
+            except ValueError as e:
+                results[i] = BatchOptimizationResult(error=str(e))
+                continue
+            universe = tuple(dict.fromkeys(req.tickers))
+            groups.setdefault((universe, estimator, self.objective(req.risk_appetite)), []).append(i)
+
+        if not groups:
+            return results
+
+        # 1. Fetch the union universe once
+        union = self.batch_universe(requests)
+        if prices is None:
+            prices = self._fetch(union) if union else pd.DataFrame()
+        raw = ReturnsPanel.coerce(prices)
+
+        # 2. Shared estimates on the union (when every ticker has usable history),
+        # computed the first time a group needs them
+        union_estimates: Dict[str, Optional[tuple]] = {}
+
+        def union_estimate(estimator: str) -> Optional[tuple]:
+            # Ledoit-Wolf shrinkage and PCA factors depend on the whole universe, so they can't be sliced.
+            if estimator in ("ledoit_wolf", "factor"):
+                return None
+            if estimator not in union_estimates:
+                try:
+                    union_panel = self.clean_prices(raw, union)
+                    union_estimates[estimator] = (union_panel, *self.estimate(union_panel, estimator))
+                except ValueError:
+                    union_estimates[estimator] = None
+            return union_estimates[estimator]
+
+        estimates: Dict[tuple, tuple] = {}
+        for (universe, estimator, objective), indices in groups.items():
+            try:
+                if (universe, estimator) not in estimates:
+                    # Rows that only exist for other tickers (e.g. crypto weekends) are not part of this universe
+                    sub = raw.select([t for t in universe if t in raw])
+                    if not np.isnan(sub.prices).all():
+                        sub = sub.observed_rows()
+                    panel = self.clean_prices(sub, list(universe))
+                    shared = union_estimate(estimator)
+                    if shared is not None and np.array_equal(panel.dates, shared[0].dates) and all(t in shared[0] for t in panel.tickers):
+                        cols = list(panel.tickers)
+                        mu, S = shared[1][cols], _cov_take(shared[2], cols)
+                    else:
+                        mu, S = self.estimate(panel, estimator)
+                    estimates[(universe, estimator)] = (panel, mu, S)
+                panel, mu, S = estimates[(universe, estimator)]
+
+                # 3. One solve per group
+                weights = self.solve(mu, S, requests[indices[0]].risk_appetite)
+            except ValueError as e:
+                for i in indices:
+                    results[i] = BatchOptimizationResult(error=str(e))
+                continue
+
+            # 4. Allocation per request
+            for i in indices:
+                try:
+                    result = self.build_result(weights, mu, S, panel.latest(), requests[i].investment_amount, requests[i].allocation_mode)
+                    result.projection = self.project(requests[i], weights, mu, S, panel)
+                except ValueError as e:
+                    results[i] = BatchOptimizationResult(error=str(e))
+                    continue
+                results[i] = BatchOptimizationResult(result=result)
+
+        return results
+
+    def efficient_frontier(self, request: FrontierRequest, prices: Optional[pd.DataFrame] = None) -> FrontierResult:
+        """
+        Returns `num_points` points of the long-only efficient frontier, from
+        minimum volatility to the highest-return asset. risk_appetite maps
+        linearly onto the return range (0 = min-vol, 1 = max return).
+        """
+        if not request.tickers:
+             raise ValueError("No tickers provided for optimization")
+        if not 2 <= request.num_points <= 200:
+            raise ValueError("num_points must be between 2 and 200")
+        estimator = self._estimator(request.covariance)
+
+        panel = prices if prices is not None else self._fetch(self.screen_tickers(request.tickers))
+        panel = self.clean_prices(panel, request.tickers)
+        as_of = panel.index[-1].strftime("%Y-%m-%d")
+
+        key = (self._data_version(panel), request.num_points, self.solver, estimator)
+        with _frontier_lock:
+            cached = _frontier_cache.get(key)
+            if cached is not None:
+                _frontier_cache.move_to_end(key)
+
+        if cached is None:
+            mu, S = self.estimate(panel, estimator)
+            with stage("optimizer", "frontier"):
+                points = self.executor.solve("efficient_frontier", mu.values, _cov_matrix(S), self.cancel,
+                                             num_points=request.num_points, backend=self.solver)
+            for point in points:
+                observe_solver(self.solver, "target_return", point)
+            frontier = np.array([p.weights for p in points])
+            # Only assets some point holds count towards volatility, so S is kept for those alone
+            used = np.flatnonzero((frontier > 0).any(axis=0))
+            cached = (list(mu.index), mu.values, used, _cov_matrix(_cov_take(S, list(mu.index[used]))), frontier)
+            with _frontier_lock:
+                _frontier_cache[key] = cached
+                while len(_frontier_cache) > _FRONTIER_CACHE_SIZE:
+                    _frontier_cache.popitem(last=False)
+
+        tickers, mu, used, S, frontier = cached
+        result = FrontierResult(
+            as_of=as_of,
+            points=[self._frontier_point(w, tickers, mu, used, S) for w in frontier]
+        )
+        if request.risk_appetite is not None:
+            # A blend of two points holds no asset outside `used`
+            weights = self._interpolate_frontier(frontier, mu, request.risk_appetite)
+            result.selected = self._frontier_point(weights, tickers, mu, used, S)
+        return result
+
+    @staticmethod
+    def _interpolate_frontier(frontier: np.ndarray, mu: np.ndarray, risk_appetite: float) -> np.ndarray:
+        # Blending two neighbouring frontier portfolios stays feasible and hits the target return exactly
+        returns = frontier @ mu
+        appetite = min(max(risk_appetite, 0.0), 1.0)
+        target = returns[0] + appetite * (returns[-1] - returns[0])
+        i = int(np.clip(np.searchsorted(returns, target), 1, len(returns) - 1))
+        span = returns[i] - returns[i - 1]
+        t = (target - returns[i - 1]) / span if span > 0 else 0.0
+        return (1 - t) * frontier[i - 1] + t * frontier[i]
+
+    def _frontier_point(self, weights: np.ndarray, tickers: List[str], mu: np.ndarray, used: np.ndarray, S: np.ndarray) -> FrontierPoint:
+        # S: covariance of the assets at positions `used` (the only ones any point holds)
+        exp_ret = float(weights @ mu)
+        held = weights[used]
+        vol = float(np.sqrt(held @ S @ held))
+        sharpe = (exp_ret - self.risk_free_rate) / vol if vol > 0 else 0.0
+        return FrontierPoint(
+            weights={ticker: round(float(w), 4) for ticker, w in zip(tickers, weights)},
+            expected_return=round(exp_ret, 4),
+            volatility=round(vol, 4),
+            sharpe_ratio=round(sharpe, 4)
+        )
+
+    def screen_tickers(self, tickers: List[str]) -> List[str]:
+        """
+        The tickers worth fetching: known invalid or delisted ones are left
+        out (they would only come back as empty columns). Raises ValueError,
+        without any upstream call, when none are left.
+        """
+        if self.metadata is None or not tickers:
+            return list(tickers)
+        invalid = set(self.metadata.known_invalid(tickers))
+        if not invalid:
+            return list(tickers)
+        kept = [t for t in tickers if t not in invalid]
+        if not kept:
+            raise ValueError(f"All tickers failed to return data (delisted or invalid): {sorted(invalid)}")
+        return kept
+
+    def batch_universe(self, requests: List[OptimizationRequest]) -> List[str]:
+        """
+        Union of all tickers in a batch, i.e. what optimize_many fetches
+        (without known invalid tickers).
+        """
+        union = list(dict.fromkeys(t for req in requests for t in req.tickers))
+        if self.metadata is None:
+            return union
+        invalid = set(self.metadata.known_invalid(union))
+        return [t for t in union if t not in invalid]
+
+    @stage("optimizer", "fetch")
+    def _fetch(self, tickers: List[str]) -> pd.DataFrame:
+        return self.provider.get_historical_prices(tickers)
+
+    @stage("optimizer", "clean")
+    def clean_prices(self, prices, tickers: List[str]) -> ReturnsPanel:
+        """
+        Step 1 of optimize_portfolio: drops empty tickers and forward-fills
+        from the first date all have a price. `prices` is a DataFrame or
+        ReturnsPanel; clean data passes through without copies.
+        """
+        panel = ReturnsPanel.coerce(prices)
+        if panel.empty:
+            raise ValueError(f"No historical data found for tickers: {tickers}")
 
         # Drop columns with no data (all NaNs)
-        df = df.dropna(axis=1, how='all')
-        if df.empty:
+        panel = panel.drop_empty_columns()
+        if panel.empty:
              raise ValueError("All tickers failed to return data (delisted or invalid)")
         
-        # Fill missing values (ffill)
-        df = df.fillna(method='ffill').dropna()
+        # Fill missing values (ffill), from the first date every ticker has a price
+        panel = panel.complete()
         
-        if df.empty:
+        if panel.empty:
              raise ValueError("Insufficient data points after cleaning")
 
-        # 2. Calculate Expected Returns and Covariance
-        
-        # 2. Calculate Expected Returns and Covariance
-        # annualized returns
-        mu = df.pct_change().mean() * 252
-        S = df.pct_change().cov() * 252
-
-        # 3. Optimization Logic (Generic SciPy)
-        num_assets = len(mu)
-        args = (mu, S, self.risk_free_rate)
-        
-        # Constraints: Sum of weights = 1
-        constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
-        
-        # Bounds: 0 <= weight <= 1
-        bounds = tuple((0.0, 1.0) for asset in range(num_assets))
-        
-        # Initial Expectation: Equal weights
-        init_guess = num_assets * [1. / num_assets,]
-
-        # Objective Function: Negative Sharpe Ratio (to minimize)
-        def neg_sharpe_ratio(weights, mu, S, rf):
-            p_ret = np.sum(weights * mu)
-            p_vol = np.sqrt(np.dot(weights.T, np.dot(S, weights)))
-            return - (p_ret - rf) / p_vol
-        
-        # Objective Function: Volatility (for low risk users)
-        def portfolio_volatility(weights, mu, S, rf):
-            return np.sqrt(np.dot(weights.T, np.dot(S, weights)))
+        return panel
+
+    def _estimator(self, override: Optional[str] = None) -> str:
+        estimator = override or self.covariance
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"Unknown covariance estimator: {estimator}")
+        return estimator
+
+    @stage("optimizer", "estimate")
+    def estimate(self, panel: ReturnsPanel, estimator: Optional[str] = None):
+        """
+        Step 2: annualized expected returns mu and covariance S of a cleaned
+        history. S is a DataFrame, or a FactorCovariance for "factor".
+        """
+        returns = panel.returns_frame()
+        mu = returns.mean() * 252
+        S = estimate_covariance(returns, estimator or self.covariance) * 252
+        return mu, S
+
+    def _solution(self, panel: ReturnsPanel, risk_appetite: float, estimator: Optional[str] = None):
+        """
+        weights, mu, S for a cleaned history, from the solve cache when the
+        same universe and objective were solved on the same data. mu and S
+        only cover the held assets (weight > 0).
+        """
+        estimator = estimator or self.covariance
+        key = self._solution_key(panel, risk_appetite, estimator)
+        cached = _solve_cache.get(key)
+        if cached is None:
+            mu, S = self.estimate(panel, estimator)
+            weights = self.solve(mu, S, risk_appetite)
+            # Allocation, stats and projection only look at held assets; the full S is n x n
+            held = list(weights.index[weights.values > 0])
+            cached = (weights, mu[held], _cov_take(S, held))
+            _solve_cache.put(key, cached)
 
+        weights, mu, S = cached
+        cols = list(panel.tickers)
+        if list(weights.index) != cols:
+            # Cached for the same tickers in another order
+            weights = weights[cols]
+        return weights, mu, S
+
+    def _solution_key(self, panel: ReturnsPanel, risk_appetite: float, estimator: str) -> tuple:
+        # The exact risk_appetite within an objective doesn't change the solution
+        return (self._data_version(panel), self.objective(risk_appetite), self.solver, estimator)
+
+    @staticmethod
+    def _data_version(panel: ReturnsPanel) -> tuple:
+        # Universe (in any order) plus the window and a digest of its first and last
+        # rows, so a new bar, a revised intraday close or a re-adjusted history
+        # (splits, dividends) gives a new version.
+        order = np.argsort(np.array(panel.tickers))
+        edges = np.ascontiguousarray(panel.prices[[0, -1]][:, order], dtype=float)
+        digest = hashlib.sha1(edges.tobytes()).hexdigest()
+        return (tuple(panel.tickers[i] for i in order), int(panel.dates[0]), int(panel.dates[-1]), len(panel), digest)
+
+    @staticmethod
+    def objective(risk_appetite: float) -> str:
         # Select Objective based on Risk Appetite
         # High Risk (> 0.7) -> Max Portfolio Return (Not implemented solely, usually max Sharpe is best)
         # Low Risk (< 0.3) -> Min Volatility
         # Medium -> Max Sharpe
-        
-        if request.risk_appetite < 0.3:
-            result = minimize(portfolio_volatility, init_guess, args=(mu, S, self.risk_free_rate), 
-                              method='SLSQP', bounds=bounds, constraints=constraints)
+        return "min_volatility" if risk_appetite < 0.3 else "max_sharpe"
+
+    @stage("optimizer", "solve")
+    def solve(self, mu: pd.Series, S: pd.DataFrame, risk_appetite: float, x0: Optional[np.ndarray] = None) -> pd.Series:
+        """
+        Step 3: long-only weights for the objective `risk_appetite` maps to.
+        x0: optional starting weights (e.g. the previous backtest window's).
+        """
+        objective = self.objective(risk_appetite)
+        if objective == "min_volatility":
+            result = self.executor.solve("min_volatility", mu.values, _cov_matrix(S), self.cancel, backend=self.solver, x0=x0)
         else:
-             # Default to Max Sharpe
-            result = minimize(neg_sharpe_ratio, init_guess, args=(mu, S, self.risk_free_rate), 
-                              method='SLSQP', bounds=bounds, constraints=constraints)
-            
-        cleaned_weights = {ticker: round(weight, 4) for ticker, weight in zip(mu.index, result.x)}
+            # Default to Max Sharpe
+            result = self.executor.solve("max_sharpe", mu.values, _cov_matrix(S), self.cancel,
+                                         risk_free_rate=self.risk_free_rate, backend=self.solver, x0=x0)
+
+        observe_solver(self.solver, objective, result)
+        return pd.Series(result.weights, index=mu.index)
+
+    @stage("optimizer", "project")
+    def project(self, request: OptimizationRequest, weights: pd.Series, mu: pd.Series, S: pd.DataFrame, panel: ReturnsPanel) -> Optional[Projection]:
+        """
+        Step 5: Monte Carlo bands of the invested amount held for time_horizon_years
+        (see simulation.py). None when the horizon is not positive or
+        projection is "none".
+        """
+        method = request.projection
+        years = request.time_horizon_years
+        if method == "none" or years <= 0:
+            return None
+        if method not in simulation.SIMULATION_METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+        if not 1 <= request.projection_paths <= MAX_PROJECTION_PATHS:
+            raise ValueError(f"projection_paths must be between 1 and {MAX_PROJECTION_PATHS}")
+        if years > MAX_PROJECTION_YEARS:
+            raise ValueError(f"time_horizon_years must be at most {MAX_PROJECTION_YEARS}")
+
+        initial = request.investment_amount if request.investment_amount > 0 else 1.0
+        # Zero-weight assets don't move a buy-and-hold portfolio, so only held ones are simulated
+        held = list(weights.index[weights.values > 0])
+        w = weights[held].values
+        if method == "parametric":
+            wealth = simulation.simulate_parametric(w, mu[held].values, _cov_matrix(_cov_take(S, held)), years, request.projection_paths, request.projection_seed, initial)
+        else:
+            returns = panel.select(held).simple_returns
+            wealth = simulation.simulate_bootstrap(w, returns, years, request.projection_paths, request.projection_seed, initial)
+
+        summary = simulation.summarize(wealth, initial)
+        return Projection(
+            method=method,
+            horizon_years=years,
+            paths=request.projection_paths,
+            seed=request.projection_seed,
+            initial_value=round(initial, 2),
+            expected_value=round(summary["expected_value"], 2),
+            probability_of_loss=round(summary["probability_of_loss"], 4),
+            percentiles={k: round(v, 2) for k, v in summary["percentiles"].items()},
+            bands=[ProjectionBand(**{k: (round(v, 2) if k != "year" else v) for k, v in band.items()}) for band in summary["bands"]]
+        )
+
+    @stage("optimizer", "allocate")
+    def build_result(self, weights: pd.Series, mu: pd.Series, S: pd.DataFrame, latest_prices: pd.Series, investment_amount: float, allocation_mode: str = "fast") -> OptimizationResult:
+        """
+        Step 4: whole-share allocation of the amount and the portfolio's stats.
+        mu and S need only cover the held assets.
+        """
+        cleaned_weights = {ticker: round(weight, 4) for ticker, weight in weights.items()}
         
-        # 4. Discrete Allocation & Stats
-        # Recalculate stats for the optimized weights
-        opt_weights = result.x
+        # Recalculate stats for the optimized weights (mu and S may only cover the held assets)
+        opt_weights = weights[mu.index].values
         exp_ret = np.sum(opt_weights * mu)
-        vol = np.sqrt(np.dot(opt_weights.T, np.dot(S, opt_weights)))
+        vol = np.sqrt(opt_weights @ (_cov_matrix(S) @ opt_weights))
         sharpe = (exp_ret - self.risk_free_rate) / vol
 
-        # Simple greedy allocation
-        # Simple greedy allocation
-        if df.empty:
-             # Should be caught above, but safety first
-             return OptimizationResult(
-                weights={}, allocation={}, expected_return=0, volatility=0, sharpe_ratio=0, leftover_cash=request.investment_amount
-             )
-             
-        latest_prices = df.iloc[-1]
-        allocation = {}
-        cash = request.investment_amount
-        
-        # Sort by weight desc to prioritize big chunks
-        sorted_tickers = sorted(cleaned_weights.keys(), key=lambda x: cleaned_weights[x], reverse=True)
-        
-        for ticker in sorted_tickers:
-            target_val = request.investment_amount * cleaned_weights[ticker]
-            price = latest_prices[ticker]
-            if price > 0:
-                shares = int(target_val // price)
-                allocation[ticker] = shares
-                cash -= (shares * price)
-            else:
-                allocation[ticker] = 0
+        # Whole-share allocation of the investment amount
+        tickers = list(cleaned_weights)
+        prices = latest_prices.reindex(tickers).to_numpy(dtype=float)
+        priced = np.isfinite(prices) & (prices > 0)
+        target = investment_amount * np.array([cleaned_weights[t] for t in tickers])
+        result = allocate(target[priced], prices[priced], investment_amount, mode=allocation_mode)
+        shares = np.zeros(len(tickers))
+        shares[priced] = result.shares
+        allocation = {ticker: int(n) for ticker, n in zip(tickers, shares)}
+        cash = result.leftover_cash
 
         return OptimizationResult(
             weights=cleaned_weights,
@@ -132,3 +513,13 @@ class PortfolioOptimizer:
             sharpe_ratio=round(sharpe, 4),
             leftover_cash=round(cash, 2)
         )
+
+
+def _cov_matrix(S):
+    # What the solvers take: the dense array, or the factor operator as is
+    return S if isinstance(S, FactorCovariance) else S.values
+
+
+def _cov_take(S, tickers: List[str]):
+    # Covariance of a subset of the tickers, in the given order
+    return S.take(tickers) if isinstance(S, FactorCovariance) else S.loc[tickers, tickers]
@@ -0,0 +1,45 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from ..instrumentation.metrics import RESULT_CACHE_LOOKUPS
+
+
+class ResultCache:
+    """
+    Thread-safe in-memory LRU cache whose entries also expire after `ttl`
+    seconds (None: never). Lookups are counted per `name` on /metrics.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: Optional[float] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and now - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        RESULT_CACHE_LOOKUPS.inc(cache=self.name, result="miss" if entry is None else "hit")
+        return None if entry is None else entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,122 @@
+"""
+Monte Carlo projections of a buy-and-hold portfolio.
+
+Two return models:
+- "parametric": correlated annual asset returns drawn from mu / S through
+  one Cholesky factor of S (or, for a FactorCovariance, of the k x k factor
+  covariance plus independent residuals, so the cost stays O(n k)).
+- "bootstrap": historical daily returns resampled in blocks of
+  BOOTSTRAP_BLOCK_DAYS (keeps fat tails, volatility clustering and the
+  cross-asset dependence inside each block).
+
+Paths are generated in chunks of at most CHUNK_ELEMENTS random numbers, so
+memory stays bounded however many paths are requested; only the year-end
+portfolio values are kept. The same seed always gives the same result.
+"""
+from typing import Dict
+import numpy as np
+from .covariance import FactorCovariance
+
+SIMULATION_METHODS = ("parametric", "bootstrap")
+
+# Random numbers generated per chunk (~32 MB of float64)
+CHUNK_ELEMENTS = 1 << 22
+
+# One quarter of trading days; 252 / 63 = 4 blocks per year
+BOOTSTRAP_BLOCK_DAYS = 63
+TRADING_DAYS = 252
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def simulate_parametric(weights: np.ndarray, mu: np.ndarray, S: np.ndarray, years: int, paths: int,
+                        seed: int = 0, initial_value: float = 1.0) -> np.ndarray:
+    """
+    Year-end portfolio values, shape (paths, years). Annual simple returns
+    are N(mu, S); each asset compounds on its own (no rebalancing).
+    """
+    weights, mu = np.asarray(weights, dtype=float), np.asarray(mu, dtype=float)
+    n = len(weights)
+    factored = isinstance(S, FactorCovariance)
+    if factored:
+        # r = mu + (B L_F) z_f + sqrt(D) z_e
+        loadings = S.B @ _cholesky(S.F)
+        residual = np.sqrt(S.D)
+        k = loadings.shape[1]
+    else:
+        L = _cholesky(np.asarray(S, dtype=float))
+        k = 0
+    rng = np.random.default_rng(seed)
+    out = np.empty((paths, years))
+
+    for lo, hi in _chunks(paths, years * (n + k)):
+        z = rng.standard_normal((hi - lo, years, n))
+        if factored:
+            returns = mu + z * residual + rng.standard_normal((hi - lo, years, k)) @ loadings.T
+        else:
+            returns = mu + z @ L.T
+        # Log growth per asset, cumulated over the years (a -100% year wipes the asset out)
+        growth = np.exp(np.cumsum(np.log(np.maximum(1.0 + returns, 1e-12)), axis=1))
+        out[lo:hi] = initial_value * (growth @ weights)
+    return out
+
+
+def simulate_bootstrap(weights: np.ndarray, daily_returns: np.ndarray, years: int, paths: int,
+                       seed: int = 0, initial_value: float = 1.0, block_days: int = BOOTSTRAP_BLOCK_DAYS) -> np.ndarray:
+    """
+    Year-end portfolio values, shape (paths, years), from historical daily
+    returns (rows = days, columns = assets) resampled in blocks.
+    """
+    weights = np.asarray(weights, dtype=float)
+    R = np.asarray(daily_returns, dtype=float)
+    if len(R) < block_days:
+        raise ValueError(f"Bootstrap needs at least {block_days} days of history, got {len(R)}")
+    if TRADING_DAYS % block_days:
+        raise ValueError(f"block_days must divide {TRADING_DAYS}")
+
+    # Log growth of every block start, from cumulative sums: C[s + b] - C[s]
+    C = np.vstack([np.zeros(R.shape[1]), np.cumsum(np.log(np.maximum(1.0 + R, 1e-12)), axis=0)])
+    blocks = C[block_days:] - C[:-block_days]             # (starts, assets)
+    per_year = TRADING_DAYS // block_days
+    steps = years * per_year
+
+    rng = np.random.default_rng(seed)
+    out = np.empty((paths, years))
+    n = R.shape[1]
+    for lo, hi in _chunks(paths, steps * n):
+        starts = rng.integers(0, len(blocks), size=(hi - lo, steps))
+        log_growth = np.cumsum(blocks[starts], axis=1)[:, per_year - 1::per_year]   # year ends
+        out[lo:hi] = initial_value * (np.exp(log_growth) @ weights)
+    return out
+
+
+def summarize(wealth: np.ndarray, initial_value: float) -> Dict:
+    """
+    Terminal percentiles, mean, probability of loss and per-year bands.
+    """
+    terminal = wealth[:, -1]
+    bands = np.percentile(wealth, PERCENTILES, axis=0)     # (percentiles, years)
+    return {
+        "expected_value": float(terminal.mean()),
+        "probability_of_loss": float(np.mean(terminal < initial_value)),
+        "percentiles": {f"p{p}": float(v) for p, v in zip(PERCENTILES, bands[:, -1])},
+        "bands": [
+            {"year": year + 1, **{f"p{p}": float(v) for p, v in zip(PERCENTILES, bands[:, year])}}
+            for year in range(wealth.shape[1])
+        ],
+    }
+
+
+def _chunks(paths: int, elements_per_path: int):
+    size = max(1, CHUNK_ELEMENTS // max(elements_per_path, 1))
+    for lo in range(0, paths, size):
+        yield lo, min(lo + size, paths)
+
+
+def _cholesky(S: np.ndarray) -> np.ndarray:
+    try:
+        return np.linalg.cholesky(S)
+    except np.linalg.LinAlgError:
+        # Singular / slightly indefinite estimate: any factor L with L L' = S works
+        vals, vecs = np.linalg.eigh(S)
+        return vecs * np.sqrt(np.clip(vals, 0.0, None))
@@ -0,0 +1,271 @@
+"""
+Long-only, fully-invested mean-variance solvers.
+
+Two backends are available:
+- "qp": accelerated projected gradient (FISTA with adaptive restart).
+  Min-volatility is solved directly over the simplex. Max-Sharpe uses the
+  standard convex reformulation: minimize y'Sy subject to (mu - rf)'y = 1,
+  y >= 0, then w = y / sum(y).
+- "slsqp": scipy's SLSQP with analytic gradients (previous behaviour, kept as a fallback).
+
+Covariance arguments only need to support `S @ x`, so a dense ndarray or any
+matrix-like operator works.
+"""
+from typing import List, NamedTuple, Optional
+import numpy as np
+from scipy.optimize import minimize
+
+SOLVER_BACKENDS = ("qp", "slsqp")
+
+
+class SolverResult(NamedTuple):
+    weights: np.ndarray
+    iterations: int
+    converged: bool
+
+
+def min_volatility(S, backend: str = "qp", x0: Optional[np.ndarray] = None, tol: float = 1e-10, max_iter: int = 20000) -> SolverResult:
+    n = S.shape[0]
+    x0 = _initial_weights(n, x0)
+    if backend == "slsqp":
+        return _slsqp_min_volatility(S, x0)
+    _check_backend(backend)
+
+    L = _max_eigenvalue(S)
+    return _fista(lambda w: S @ w, project_simplex, L, x0, tol, max_iter)
+
+
+def max_sharpe(mu: np.ndarray, S, risk_free_rate: float, backend: str = "qp", x0: Optional[np.ndarray] = None, tol: float = 1e-10, max_iter: int = 20000) -> SolverResult:
+    mu = np.asarray(mu, dtype=float)
+    n = len(mu)
+    x0 = _initial_weights(n, x0)
+    if backend == "slsqp":
+        return _slsqp_max_sharpe(mu, S, risk_free_rate, x0)
+    _check_backend(backend)
+
+    excess = mu - risk_free_rate
+    if not np.any(excess > 0):
+        # No asset beats the risk-free rate, so the reformulation is infeasible.
+        # The least-bad portfolio is the minimum-volatility one.
+        return min_volatility(S, backend=backend, x0=x0, tol=tol, max_iter=max_iter)
+
+    # Scale the starting weights onto the constraint set (mu - rf)'y = 1
+    scale = excess @ x0
+    y0 = x0 / scale if scale > 0 else x0
+    project = lambda v: project_halfspace_orthant(v, excess)
+
+    L = _max_eigenvalue(S)
+    result = _fista(lambda y: S @ y, project, L, y0, tol, max_iter)
+    y = result.weights
+    return SolverResult(y / y.sum(), result.iterations, result.converged)
+
+
+def target_return(mu: np.ndarray, S, target: float, backend: str = "qp", x0: Optional[np.ndarray] = None, tol: float = 1e-10, max_iter: int = 20000) -> SolverResult:
+    """
+    Minimum-variance portfolio with expected return `target`.
+    Pass a neighbouring solution as x0 to warm-start.
+    """
+    mu = np.asarray(mu, dtype=float)
+    n = len(mu)
+    x0 = _initial_weights(n, x0)
+    if backend == "slsqp":
+        return _slsqp_target_return(mu, S, target, x0)
+    _check_backend(backend)
+
+    target = min(max(target, mu.min()), mu.max())
+    project = lambda v: project_simplex_return(v, mu, target)
+    L = _max_eigenvalue(S)
+    return _fista(lambda w: S @ w, project, L, x0, tol, max_iter)
+
+
+def efficient_frontier(mu: np.ndarray, S, num_points: int, backend: str = "qp") -> List[SolverResult]:
+    """
+    Sweeps `num_points` target returns from the minimum-volatility portfolio
+    up to the highest single-asset return, warm-starting each solve from the
+    previous point's weights.
+    """
+    mu = np.asarray(mu, dtype=float)
+    start = min_volatility(S, backend=backend)
+    low, high = mu @ start.weights, mu.max()
+    if high - low <= 1e-12:
+        return [start] * num_points
+
+    points = [start]
+    w = start.weights
+    for target in np.linspace(low, high, num_points)[1:]:
+        result = target_return(mu, S, target, backend=backend, x0=w)
+        points.append(result)
+        w = result.weights
+    return points
+
+
+def project_simplex(v: np.ndarray) -> np.ndarray:
+    """
+    Euclidean projection onto {w >= 0, sum(w) = 1} (sort-based, O(n log n)).
+    """
+    u = np.sort(v)[::-1]
+    css = np.cumsum(u) - 1.0
+    k = np.arange(1, len(v) + 1)
+    rho = np.nonzero(u - css / k > 0)[0][-1]
+    theta = css[rho] / (rho + 1)
+    return np.maximum(v - theta, 0.0)
+
+
+def project_halfspace_orthant(v: np.ndarray, a: np.ndarray) -> np.ndarray:
+    """
+    Euclidean projection onto {y >= 0, a'y = 1}.
+
+    The solution is y = max(0, v + lam * a) where a'y(lam) is non-decreasing
+    in lam. Bracket and bisect lam, then solve it exactly on the final active set.
+    """
+    def g(lam):
+        return a @ np.maximum(v + lam * a, 0.0)
+
+    lo, hi = -1.0, 1.0
+    while g(hi) < 1.0:
+        hi *= 2.0
+    while g(lo) > 1.0:
+        lo *= 2.0
+    for _ in range(60):
+        mid = 0.5 * (lo + hi)
+        if g(mid) < 1.0:
+            lo = mid
+        else:
+            hi = mid
+
+    lam = 0.5 * (lo + hi)
+    active = (v + lam * a) > 0
+    a_active = a[active]
+    denom = a_active @ a_active
+    if denom > 0:
+        lam = (1.0 - a_active @ v[active]) / denom
+    return np.maximum(v + lam * a, 0.0)
+
+
+def project_simplex_return(v: np.ndarray, mu: np.ndarray, target: float) -> np.ndarray:
+    """
+    Euclidean projection onto {w >= 0, sum(w) = 1, mu'w = target}.
+
+    The solution is the simplex projection of v + beta * mu, where mu'w(beta)
+    is non-decreasing in beta (derivative of a concave dual), so beta is found
+    by bisection.
+    """
+    def w_of(beta):
+        return project_simplex(v + beta * mu)
+
+    lo, hi = -1.0, 1.0
+    for _ in range(64):
+        if mu @ w_of(hi) >= target:
+            break
+        hi *= 2.0
+    for _ in range(64):
+        if mu @ w_of(lo) <= target:
+            break
+        lo *= 2.0
+    for _ in range(60):
+        mid = 0.5 * (lo + hi)
+        if mu @ w_of(mid) < target:
+            lo = mid
+        else:
+            hi = mid
+        if hi - lo <= 1e-14 * max(1.0, abs(hi)):
+            break
+    return w_of(0.5 * (lo + hi))
+
+
+def _fista(grad, project, L: float, x0: np.ndarray, tol: float, max_iter: int) -> SolverResult:
+    step = 1.0 / L
+    x = project(x0)
+    y = x.copy()
+    t = 1.0
+    for k in range(1, max_iter + 1):
+        x_new = project(y - step * grad(y))
+        delta = x_new - x
+        if np.max(np.abs(delta)) <= tol * max(1.0, np.max(np.abs(x_new))):
+            return SolverResult(x_new, k, True)
+
+        # Restart momentum when it points uphill
+        if (y - x_new) @ delta > 0:
+            t = 1.0
+        t_new = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t))
+        y = x_new + ((t - 1.0) / t_new) * delta
+        x, t = x_new, t_new
+    return SolverResult(x, max_iter, False)
+
+
+def _max_eigenvalue(S, iterations: int = 50) -> float:
+    # Power iteration; only needs S @ v
+    n = S.shape[0]
+    v = np.random.default_rng(0).standard_normal(n)
+    v /= np.linalg.norm(v)
+    lam = 0.0
+    for _ in range(iterations):
+        w = S @ v
+        norm = np.linalg.norm(w)
+        if norm == 0:
+            return 1.0
+        lam_new = v @ w
+        v = w / norm
+        if abs(lam_new - lam) <= 1e-6 * abs(lam_new):
+            lam = lam_new
+            break
+        lam = lam_new
+    # Small safety margin since power iteration approaches from below
+    return max(lam, 1e-12) * 1.05
+
+
+def _initial_weights(n: int, x0: Optional[np.ndarray]) -> np.ndarray:
+    if x0 is None:
+        # Initial Expectation: Equal weights
+        return np.full(n, 1.0 / n)
+    return np.asarray(x0, dtype=float)
+
+
+def _check_backend(backend: str):
+    if backend not in SOLVER_BACKENDS:
+        raise ValueError(f"Unknown solver backend: {backend}")
+
+
+def _slsqp_min_volatility(S, x0: np.ndarray) -> SolverResult:
+    def portfolio_volatility(w):
+        return np.sqrt(w @ (S @ w))
+
+    def portfolio_volatility_grad(w):
+        Sw = S @ w
+        return Sw / np.sqrt(w @ Sw)
+
+    return _slsqp(portfolio_volatility, portfolio_volatility_grad, x0)
+
+
+def _slsqp_max_sharpe(mu: np.ndarray, S, rf: float, x0: np.ndarray) -> SolverResult:
+    def neg_sharpe_ratio(w):
+        return -(mu @ w - rf) / np.sqrt(w @ (S @ w))
+
+    def neg_sharpe_ratio_grad(w):
+        Sw = S @ w
+        vol = np.sqrt(w @ Sw)
+        excess = mu @ w - rf
+        return -(mu * vol - excess * Sw / vol) / (vol * vol)
+
+    return _slsqp(neg_sharpe_ratio, neg_sharpe_ratio_grad, x0)
+
+
+def _slsqp(fun, jac, x0: np.ndarray, extra_constraints: tuple = ()) -> SolverResult:
+    n = len(x0)
+    # Constraints: Sum of weights = 1
+    constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: np.ones_like(x)},) + extra_constraints
+    # Bounds: 0 <= weight <= 1
+    bounds = tuple((0.0, 1.0) for _ in range(n))
+    result = minimize(fun, x0, jac=jac, method='SLSQP', bounds=bounds, constraints=constraints)
+    return SolverResult(result.x, result.nit, bool(result.success))
+
+
+def _slsqp_target_return(mu: np.ndarray, S, target: float, x0: np.ndarray) -> SolverResult:
+    def portfolio_variance(w):
+        return w @ (S @ w)
+
+    def portfolio_variance_grad(w):
+        return 2.0 * (S @ w)
+
+    extra = ({'type': 'eq', 'fun': lambda x: mu @ x - target, 'jac': lambda x: mu},)
+    return _slsqp(portfolio_variance, portfolio_variance_grad, x0, extra)
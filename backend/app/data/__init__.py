@@ -1,2 +1,10 @@
-from .adapter import MarketDataProvider
+from .adapter import MarketDataProvider, AsyncMarketDataProvider
 from .yahoo_adapter import YahooFinanceProvider
+from .synthetic_adapter import SyntheticMarketDataProvider
+from .panel import ReturnsPanel
+from .cache import CachedMarketDataProvider
+from .coalescing import CoalescingMarketDataProvider
+from .async_adapter import ExecutorAsyncProvider
+from .metadata import TickerMetadataStore, TickerMetadataService, TickerInfo, TickerValidation
+from .defaults import get_source_provider, get_default_provider, get_coalescing_provider, get_async_provider, get_offline_provider, \
+    get_ticker_store, get_ticker_metadata
@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
+from datetime import date
+import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from .asof import prices_asof
 
 class MarketDataProvider(ABC):
     """
@@ -9,10 +12,15 @@ class MarketDataProvider(ABC):
     """
 
     @abstractmethod
-    def get_historical_prices(self, tickers: list[str], period: str = "5y") -> pd.DataFrame:
+    def get_historical_prices(self, tickers: list[str], period: str = "5y", start: Optional[date] = None,
+                              end: Optional[date] = None, interval: str = "1d") -> pd.DataFrame:
         """
         Fetch historical close prices for a list of tickers.
         Returns a DataFrame where columns are Tickers and Index is Date.
+
+        The window starts at `start`, or `period` before today when start is
+        None, and ends at `end` (inclusive, default today). interval is the
+        bar size, one of periods.INTERVALS.
         """
         pass
 
@@ -22,3 +30,41 @@ class MarketDataProvider(ABC):
         Get metadata for a ticker (name, sector, summary).
         """
         pass
+
+    def get_prices_asof(self, queries: List[Tuple[str, date]]) -> np.ndarray:
+        """
+        Close of each (ticker, date) query on or before that date (previous
+        trading day semantics); NaN for unknown tickers. One range fetch
+        covering the queried dates serves the whole batch (see asof.py).
+        """
+        return prices_asof(self, queries)
+
+
+class AsyncMarketDataProvider(ABC):
+    """
+    Async counterpart of MarketDataProvider, for use from async request handlers.
+    """
+
+    @abstractmethod
+    async def get_historical_prices(self, tickers: list[str], period: str = "5y", start: Optional[date] = None,
+                                    end: Optional[date] = None, interval: str = "1d") -> pd.DataFrame:
+        """
+        Fetch historical close prices for a list of tickers.
+        Returns a DataFrame where columns are Tickers and Index is Date.
+        See MarketDataProvider.get_historical_prices for the window.
+        """
+        pass
+
+    @abstractmethod
+    async def get_ticker_info(self, ticker: str) -> Dict[str, Any]:
+        """
+        Get metadata for a ticker (name, sector, summary).
+        """
+        pass
+
+    @abstractmethod
+    async def get_prices_asof(self, queries: List[Tuple[str, date]]) -> np.ndarray:
+        """
+        Batched point-in-time closes (see MarketDataProvider.get_prices_asof).
+        """
+        pass
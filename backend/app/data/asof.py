@@ -0,0 +1,36 @@
+"""
+Batched point-in-time price lookups.
+
+All (ticker, date) queries of a batch are answered from one range fetch
+that spans just the queried dates, then resolved in a single vectorized
+pass over the aligned panel (see ReturnsPanel.asof).
+"""
+from datetime import date, timedelta
+from typing import List, Tuple
+import numpy as np
+from .panel import ReturnsPanel
+
+# Calendar days fetched before the earliest query, so a query on a weekend or
+# after a holiday still finds the previous trading day's close
+ASOF_LOOKBACK_DAYS = 10
+
+
+def prices_asof(provider, queries: List[Tuple[str, date]]) -> np.ndarray:
+    """
+    Close of each (ticker, date) on or before the date, NaN for unknown
+    tickers or dates before the ticker's first bar in the fetched window.
+    `provider` is any MarketDataProvider.
+    """
+    if not queries:
+        return np.empty(0)
+    tickers = list(dict.fromkeys(ticker for ticker, _ in queries))
+    dates = np.array([d for _, d in queries], dtype="datetime64[D]")
+
+    # 1. One fetch covering every query (future dates resolve to the latest close)
+    today = date.today()
+    start = min(dates.min().astype(date), today) - timedelta(days=ASOF_LOOKBACK_DAYS)
+    end = min(dates.max().astype(date), today)
+    panel = ReturnsPanel.coerce(provider.get_historical_prices(tickers, start=start, end=end))
+
+    # 2. Previous-trading-day lookups for the whole batch at once
+    return panel.asof(panel.columns_of([ticker for ticker, _ in queries]), dates.astype("datetime64[ns]"))
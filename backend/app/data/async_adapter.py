@@ -0,0 +1,74 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..instrumentation import stage
+from .adapter import MarketDataProvider, AsyncMarketDataProvider
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorAsyncProvider(AsyncMarketDataProvider):
+    """
+    Runs a blocking MarketDataProvider on a dedicated, bounded thread pool.
+
+    At most `max_concurrency` upstream calls run at once, and each call is
+    abandoned after `timeout` seconds (asyncio.TimeoutError). The thread keeps
+    running until the blocking call returns, but the request no longer waits
+    on it. With `fan_out`, multi-ticker requests are split into concurrent
+    per-ticker calls; tickers whose call fails come back as all-NaN columns.
+    """
+
+    def __init__(self, provider: MarketDataProvider, max_concurrency: int = 8, timeout: Optional[float] = 30.0, fan_out: bool = False):
+        self.provider = provider
+        self.timeout = timeout
+        self.fan_out = fan_out
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="market-data")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def get_historical_prices(self, tickers: list[str], period: str = "5y", start: Optional[date] = None,
+                                    end: Optional[date] = None, interval: str = "1d") -> pd.DataFrame:
+        # Timed here, in the request's context (the executor threads don't inherit it)
+        with stage("data", "fetch"):
+            return await self._get_historical_prices(tickers, period, start, end, interval)
+
+    async def _get_historical_prices(self, tickers: list[str], period: str, start: Optional[date], end: Optional[date], interval: str) -> pd.DataFrame:
+        unique = list(dict.fromkeys(tickers))
+        fetch = functools.partial(self.provider.get_historical_prices, period=period, start=start, end=end, interval=interval)
+        if not self.fan_out or len(unique) <= 1:
+            return await self._call(fetch, unique)
+
+        frames = await asyncio.gather(
+            *(self._call(fetch, [t]) for t in unique),
+            return_exceptions=True
+        )
+        columns = {}
+        errors = []
+        for ticker, frame in zip(unique, frames):
+            if isinstance(frame, BaseException):
+                logger.warning("Fetching %s failed: %r", ticker, frame)
+                errors.append(frame)
+            elif ticker in frame.columns:
+                columns[ticker] = frame[ticker]
+        if not columns and errors:
+            raise errors[0]
+        return pd.DataFrame(columns).reindex(columns=unique)
+
+    async def get_ticker_info(self, ticker: str) -> Dict[str, Any]:
+        return await self._call(self.provider.get_ticker_info, ticker)
+
+    async def get_prices_asof(self, queries: List[Tuple[str, date]]) -> np.ndarray:
+        with stage("data", "asof"):
+            return await self._call(self.provider.get_prices_asof, queries)
+
+    async def _call(self, fn, *args):
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, functools.partial(fn, *args))
+            return await asyncio.wait_for(future, self.timeout)
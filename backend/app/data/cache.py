@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from ..instrumentation.metrics import CACHE_LOOKUPS
+from .adapter import MarketDataProvider
+from .metadata import TickerMetadataStore, confirm_missing
+from .periods import period_start, period_covering, check_interval, clip_window, to_interval, TRADING_BAR_PERIODS
+
+logger = logging.getLogger(__name__)
+
+# One row per trading day, stored as a .npy file per ticker.
+BAR_DTYPE = np.dtype([("date", "M8[D]"), ("close", "f8")])
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[2] / ".cache" / "prices"
+
+# Tries at replacing a cache file that another process has open (Windows)
+REPLACE_ATTEMPTS = 5
+
+
+class _StoredSeries:
+    """
+    Close series for one ticker as read from disk, plus its coverage metadata.
+    """
+
+    def __init__(self, bars: np.ndarray, covered_from: Optional[date], checked_at: float):
+        self.bars = bars
+        self.covered_from = covered_from  # None means full ("max") history
+        self.checked_at = checked_at
+
+    @property
+    def last_date(self) -> date:
+        return self.bars["date"][-1].astype(date)
+
+    def covers(self, start: Optional[date]) -> bool:
+        if self.covered_from is None:
+            return True
+        if start is None:
+            return False
+        return self.covered_from <= start
+
+    def to_series(self, ticker: str, start: Optional[date] = None, end: Optional[date] = None) -> pd.Series:
+        # Only the bars within [start, end] are converted
+        bars = self.bars
+        lo = np.searchsorted(bars["date"], np.datetime64(start, "D")) if start is not None else 0
+        hi = np.searchsorted(bars["date"], np.datetime64(end, "D"), side="right") if end is not None else len(bars)
+        bars = bars[lo:hi]
+        index = pd.DatetimeIndex(bars["date"].astype("M8[ns]"), name="Date")
+        return pd.Series(np.asarray(bars["close"]), index=index, name=ticker)
+
+
+class CachedMarketDataProvider(MarketDataProvider):
+    """
+    Wraps any MarketDataProvider with a persistent per-ticker close cache.
+
+    Each ticker is kept on disk as a memory-mapped NumPy file. Repeat requests
+    are served from disk; once `refresh_interval` seconds have passed since the
+    last upstream check, only the bars after the last stored one are fetched and
+    appended. If the upstream fails, the stored (stale) series is served instead.
+
+    Daily bars are stored; weekly/monthly intervals are built from them. A
+    window that ends before the last stored bar is served without any
+    refresh, and a start before the stored history fetches from that start
+    on (the stored history always runs up to the latest bar).
+
+    With offline=True the upstream is never contacted (provider may be None):
+    whatever is stored is served as-is, unknown tickers come back all-NaN.
+
+    With a `metadata` store, every upstream fetch also records which tickers
+    had data (valid) and which came back empty for the whole window (invalid).
+    """
+
+    def __init__(self, provider: Optional[MarketDataProvider], cache_dir: Optional[str] = None, refresh_interval: float = 900.0, offline: bool = False,
+                 metadata: Optional[TickerMetadataStore] = None):
+        if provider is None and not offline:
+            raise ValueError("An upstream provider is required unless offline=True")
+        self.provider = provider
+        self.offline = offline
+        self.metadata = metadata
+        self.cache_dir = Path(cache_dir or os.environ.get("PRICE_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.refresh_interval = refresh_interval
+        self._write_lock = threading.Lock()
+
+    def get_historical_prices(self, tickers: list[str], period: str = "5y", start: Optional[date] = None,
+                              end: Optional[date] = None, interval: str = "1d") -> pd.DataFrame:
+        check_interval(interval)
+        today = date.today()
+        explicit = start is not None
+        start = start if explicit else period_start(period, today)
+        now = time.time()
+
+        stored: Dict[str, Optional[_StoredSeries]] = {}
+        # (upstream period, explicit start, is full fetch) -> tickers that need it
+        pending: Dict[tuple, List[str]] = {}
+
+        lookups = {"hit": 0, "stale": 0, "miss": 0}
+
+        for ticker in dict.fromkeys(tickers):
+            entry = self._load(ticker)
+            stored[ticker] = entry
+            if self.offline:
+                lookups["miss" if entry is None else "hit"] += 1
+            elif entry is None or not entry.covers(start):
+                lookups["miss"] += 1
+                pending.setdefault((period, start if explicit else None, True), []).append(ticker)
+            elif now - entry.checked_at > self.refresh_interval and not (end is not None and entry.last_date > end):
+                lookups["stale"] += 1
+                # Re-fetch the last stored bar too, it may have been an intraday close.
+                gap = (today - entry.last_date).days + 1
+                pending.setdefault((period_covering(gap), None, False), []).append(ticker)
+            else:
+                lookups["hit"] += 1
+        for result, n in lookups.items():
+            if n:
+                CACHE_LOOKUPS.inc(n, result=result)
+
+        for (fetch_period, fetch_start, full_fetch), group in pending.items():
+            try:
+                frame = self.provider.get_historical_prices(group, period=fetch_period, start=fetch_start)
+            except Exception as e:
+                if any(stored[t] is None for t in group):
+                    raise
+                logger.warning("Upstream refresh failed for %s, serving cached data: %s", group, e)
+                continue
+
+            last_dates, missing = {}, []
+            for ticker in group:
+                fetched = _extract_column(frame, ticker)
+                if fetched is None:
+                    if full_fetch:
+                        missing.append(ticker)
+                    continue
+                entry = self._merge(stored[ticker], fetched, start, full_fetch, now)
+                self._save(ticker, entry)
+                stored[ticker] = entry
+                last_dates[ticker] = entry.last_date
+            if self.metadata is not None:
+                # An empty column in a batch may be a transient failure: only a repeat, single-ticker miss counts
+                self.metadata.record_prices(last_dates, confirm_missing(self.provider, missing))
+
+        df = self._assemble(tickers, stored, None if explicit else period, start, end)
+        return to_interval(df, interval)
+
+    def get_ticker_info(self, ticker: str) -> Dict[str, Any]:
+        if self.offline:
+            return {"symbol": ticker}
+        return self.provider.get_ticker_info(ticker)
+
+    # Storage
+
+    def _paths(self, ticker: str):
+        name = quote(ticker, safe="")
+        return self.cache_dir / f"{name}.npy", self.cache_dir / f"{name}.json"
+
+    def _load(self, ticker: str) -> Optional[_StoredSeries]:
+        bars_path, meta_path = self._paths(ticker)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            # Read fully, not memory-mapped: Windows cannot replace a file that is mapped
+            bars = np.load(bars_path)
+        except (OSError, ValueError):
+            return None
+        if bars.dtype != BAR_DTYPE or len(bars) == 0:
+            return None
+        covered_from = date.fromisoformat(meta["covered_from"]) if meta.get("covered_from") else None
+        return _StoredSeries(bars, covered_from, meta.get("checked_at", 0.0))
+
+    def _save(self, ticker: str, entry: _StoredSeries):
+        bars_path, meta_path = self._paths(ticker)
+        meta = {
+            "covered_from": entry.covered_from.isoformat() if entry.covered_from else None,
+            "checked_at": entry.checked_at,
+        }
+        # Write to temp files and rename so concurrent readers (other workers) never see partial data
+        with self._write_lock:
+            try:
+                _atomic_write(bars_path, lambda f: np.save(f, np.ascontiguousarray(entry.bars)))
+                _atomic_write(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+            except PermissionError as e:
+                # Windows: another process holds the file open; the next refresh writes it
+                logger.warning("Could not update cached prices for %s: %s", ticker, e)
+
+    @staticmethod
+    def _merge(entry: Optional[_StoredSeries], fetched: pd.Series, start: Optional[date], full_fetch: bool, now: float) -> _StoredSeries:
+        new_bars = np.empty(len(fetched), dtype=BAR_DTYPE)
+        new_bars["date"] = fetched.index.values.astype("M8[D]")
+        new_bars["close"] = fetched.values
+
+        if entry is None or full_fetch:
+            # Full (re)download replaces the stored history
+            return _StoredSeries(new_bars, start, now)
+
+        first_new = new_bars["date"][0]
+        kept = entry.bars[entry.bars["date"] < first_new]
+        bars = np.concatenate([kept, new_bars])
+        return _StoredSeries(bars, entry.covered_from, now)
+
+    @staticmethod
+    def _assemble(tickers: list[str], stored: Dict[str, Optional[_StoredSeries]], period: Optional[str], start: Optional[date], end: Optional[date]) -> pd.DataFrame:
+        # Trading-bar periods count bars on the joint calendar, so they can only be cut after the join
+        bars = period in TRADING_BAR_PERIODS
+        columns = {}
+        for ticker in dict.fromkeys(tickers):
+            entry = stored.get(ticker)
+            if entry is None:
+                # Mirror yfinance: unknown tickers come back as an all-NaN column
+                columns[ticker] = pd.Series(dtype=float, index=pd.DatetimeIndex([]), name=ticker)
+            else:
+                columns[ticker] = entry.to_series(ticker, None if bars else start, end)
+
+        df = pd.concat(columns, axis=1).sort_index()
+        df.index.name = "Date"
+
+        if bars:
+            return clip_window(df.iloc[-TRADING_BAR_PERIODS[period]:], end=end)
+        return df
+
+
+def _extract_column(frame: Optional[pd.DataFrame], ticker: str) -> Optional[pd.Series]:
+    if frame is None or frame.empty or ticker not in frame.columns:
+        return None
+    series = frame[ticker].dropna()
+    if series.empty:
+        return None
+    index = pd.DatetimeIndex(series.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return pd.Series(series.values.astype(float), index=index.normalize())
+
+
+def _atomic_write(path: Path, write, attempts: int = REPLACE_ATTEMPTS):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        for attempt in range(attempts):
+            try:
+                os.replace(tmp, path)
+                break
+            except PermissionError:
+                # Windows refuses while a reader has the target open; readers hold it only briefly
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
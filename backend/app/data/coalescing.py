@@ -0,0 +1,109 @@
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date
+from typing import Dict, Any, List, Optional
+
+import pandas as pd
+
+from .adapter import MarketDataProvider
+
+
+class _Batch:
+    """
+    One upstream download shared by every caller that joined it.
+    """
+
+    def __init__(self, window: tuple):
+        self.window = window # (period, start, end, interval)
+        self.tickers: List[str] = []
+        self.future: Future = Future()
+
+
+class CoalescingMarketDataProvider(MarketDataProvider):
+    """
+    Single-flight layer in front of a MarketDataProvider.
+
+    Concurrent requests for the same ticker and window (period or start/end,
+    and interval) wait on one in-flight upstream fetch instead of issuing
+    their own. Requests for the same window that arrive within `window`
+    seconds of each other are merged into a single batched download, and
+    each caller gets back only the columns it asked for.
+    """
+
+    def __init__(self, provider: MarketDataProvider, window: float = 0.02, timeout: Optional[float] = 60.0):
+        self.provider = provider
+        self.window = window
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._open: Dict[tuple, _Batch] = {}  # window -> batch still accepting tickers
+        self._inflight: Dict[tuple, _Batch] = {}  # (ticker, window) -> batch that will fetch it
+
+        # Counters
+        self.requests = 0
+        self.upstream_calls = 0
+
+    @property
+    def upstream_calls_saved(self) -> int:
+        return self.requests - self.upstream_calls
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "upstream_calls": self.upstream_calls,
+                "upstream_calls_saved": self.upstream_calls_saved,
+            }
+
+    def get_historical_prices(self, tickers: list[str], period: str = "5y", start: Optional[date] = None,
+                              end: Optional[date] = None, interval: str = "1d") -> pd.DataFrame:
+        window = (period, start, end, interval)
+        waits: Dict[_Batch, List[str]] = {}
+        leader: Optional[_Batch] = None
+
+        with self._lock:
+            self.requests += 1
+            for ticker in dict.fromkeys(tickers):
+                batch = self._inflight.get((ticker, window))
+                if batch is None:
+                    batch = self._open.get(window)
+                    if batch is None:
+                        batch = leader = _Batch(window)
+                        self._open[window] = batch
+                    batch.tickers.append(ticker)
+                    self._inflight[(ticker, window)] = batch
+                waits.setdefault(batch, []).append(ticker)
+
+        if leader is not None:
+            self._run(leader)
+
+        frames = [batch.future.result(timeout=self.timeout)[names] for batch, names in waits.items()]
+        df = frames[0] if len(frames) == 1 else pd.concat(frames, axis=1)
+        return df[list(dict.fromkeys(tickers))]
+
+    def get_ticker_info(self, ticker: str) -> Dict[str, Any]:
+        return self.provider.get_ticker_info(ticker)
+
+    def _run(self, batch: _Batch):
+        # Give callers arriving close together a chance to join this download
+        if self.window > 0:
+            time.sleep(self.window)
+
+        with self._lock:
+            if self._open.get(batch.window) is batch:
+                del self._open[batch.window]
+            self.upstream_calls += 1
+            tickers = list(batch.tickers)
+
+        try:
+            period, start, end, interval = batch.window
+            df = self.provider.get_historical_prices(tickers, period=period, start=start, end=end, interval=interval)
+            # Callers index by ticker, so make sure every requested column exists
+            batch.future.set_result(df.reindex(columns=tickers))
+        except BaseException as e:
+            batch.future.set_exception(e)
+        finally:
+            with self._lock:
+                for ticker in tickers:
+                    if self._inflight.get((ticker, batch.window)) is batch:
+                        del self._inflight[(ticker, batch.window)]
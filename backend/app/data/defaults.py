@@ -0,0 +1,98 @@
+import os
+from functools import lru_cache
+from pathlib import Path
+from .adapter import MarketDataProvider, AsyncMarketDataProvider
+from .yahoo_adapter import YahooFinanceProvider
+from .synthetic_adapter import SyntheticMarketDataProvider
+from .cache import CachedMarketDataProvider, DEFAULT_CACHE_DIR
+from .coalescing import CoalescingMarketDataProvider
+from .async_adapter import ExecutorAsyncProvider
+from .metadata import TickerMetadataStore, TickerMetadataService, POSITIVE_TTL, NEGATIVE_TTL
+
+
+def get_source_provider() -> MarketDataProvider:
+    """
+    Upstream price source: Yahoo Finance, or generated prices when
+    MARKET_DATA_SOURCE=synthetic (offline profiling and demos).
+    """
+    source = os.environ.get("MARKET_DATA_SOURCE", "yahoo")
+    if source == "synthetic":
+        return SyntheticMarketDataProvider(seed=int(os.environ.get("SYNTHETIC_SEED", 0)))
+    if source != "yahoo":
+        raise ValueError(f"Unknown MARKET_DATA_SOURCE: {source}")
+    return YahooFinanceProvider()
+
+
+@lru_cache(maxsize=None)
+def get_coalescing_provider() -> CoalescingMarketDataProvider:
+    """
+    Process-wide single-flight layer in front of the price source.
+    """
+    window = float(os.environ.get("MARKET_DATA_BATCH_WINDOW", 0.02))
+    return CoalescingMarketDataProvider(get_source_provider(), window=window)
+
+
+@lru_cache(maxsize=None)
+def get_default_provider() -> MarketDataProvider:
+    """
+    Process-wide provider used by the engines when none is injected.
+    The price source behind request coalescing and the on-disk price cache.
+    """
+    refresh_interval = float(os.environ.get("PRICE_CACHE_REFRESH_SECONDS", 900))
+    return CachedMarketDataProvider(get_coalescing_provider(), cache_dir=_cache_dir(), refresh_interval=refresh_interval,
+                                    metadata=get_ticker_store())
+
+
+@lru_cache(maxsize=None)
+def get_ticker_store() -> TickerMetadataStore:
+    """
+    Ticker validity and metadata, stored next to the price cache.
+    """
+    return TickerMetadataStore(
+        state_dir() / "tickers.sqlite",
+        positive_ttl=float(os.environ.get("TICKER_INFO_TTL", POSITIVE_TTL)),
+        negative_ttl=float(os.environ.get("TICKER_INVALID_TTL", NEGATIVE_TTL))
+    )
+
+
+@lru_cache(maxsize=None)
+def get_ticker_metadata() -> TickerMetadataService:
+    """
+    Ticker validation and metadata lookups; misses go to the price source.
+    """
+    return TickerMetadataService(get_coalescing_provider(), get_ticker_store())
+
+
+@lru_cache(maxsize=None)
+def get_offline_provider() -> MarketDataProvider:
+    """
+    The on-disk price cache without any network access (e.g. for backtests).
+    """
+    return CachedMarketDataProvider(None, cache_dir=_cache_dir(), offline=True)
+
+
+@lru_cache(maxsize=None)
+def get_async_provider() -> AsyncMarketDataProvider:
+    """
+    Async view of the default provider for the request handlers.
+    """
+    return ExecutorAsyncProvider(
+        get_default_provider(),
+        max_concurrency=int(os.environ.get("MARKET_DATA_CONCURRENCY", 8)),
+        timeout=float(os.environ.get("MARKET_DATA_TIMEOUT", 30)),
+        fan_out=os.environ.get("MARKET_DATA_FAN_OUT", "0") == "1"
+    )
+
+
+def state_dir() -> Path:
+    """
+    Directory shared by the server processes: the price cache and the SQLite stores.
+    """
+    return Path(_cache_dir() or os.environ.get("PRICE_CACHE_DIR") or DEFAULT_CACHE_DIR)
+
+
+def _cache_dir():
+    # Generated prices must never end up in the Yahoo cache
+    if os.environ.get("MARKET_DATA_SOURCE", "yahoo") == "synthetic" and not os.environ.get("PRICE_CACHE_DIR"):
+        return str(DEFAULT_CACHE_DIR.parent / f"synthetic-{os.environ.get('SYNTHETIC_SEED', 0)}")
+    return None
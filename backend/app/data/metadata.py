@@ -0,0 +1,283 @@
+"""
+Ticker metadata and validity, cached in SQLite.
+
+The store learns from every upstream price fetch (see
+CachedMarketDataProvider): tickers that came back with bars are valid,
+tickers with no data are invalid once a fetch of their own confirms it
+(batch downloads also leave a ticker empty on transient failures). At
+most `CONFIRM_MAX` tickers are confirmed per fetch; the rest stay
+unrecorded until a later fetch. Valid entries and fetched metadata (name,
+sector, listing dates) stay fresh for `positive_ttl` seconds, invalid
+ones for the shorter `negative_ttl`, so a bad symbol is rejected without
+another upstream round trip until it expires.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import pandas as pd
+from pydantic import BaseModel
+from .adapter import MarketDataProvider
+
+logger = logging.getLogger(__name__)
+
+POSITIVE_TTL = 7 * 86400.0
+NEGATIVE_TTL = 86400.0
+
+# Window fetched to check tickers the store doesn't know yet
+VALIDATION_PERIOD = "1mo"
+
+# Concurrent upstream metadata calls in one bulk info request
+INFO_CONCURRENCY = 8
+
+# Empty tickers confirmed (one upstream call each) per price fetch
+CONFIRM_MAX = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickers (
+    symbol TEXT PRIMARY KEY,
+    valid INTEGER NOT NULL,
+    last_trade_date TEXT,
+    checked_at REAL NOT NULL,
+    name TEXT,
+    sector TEXT,
+    summary TEXT,
+    first_trade_date TEXT,
+    info_at REAL
+)
+"""
+
+
+class TickerInfo(BaseModel):
+    symbol: str
+    valid: Optional[bool] = None # None when validity could not be checked
+    name: Optional[str] = None
+    sector: Optional[str] = None
+    summary: Optional[str] = None
+    first_trade_date: Optional[date] = None
+    last_trade_date: Optional[date] = None # Last bar seen in a price fetch
+
+
+class TickerValidation(BaseModel):
+    valid: List[str]
+    invalid: List[str]
+    unknown: List[str] = [] # Could not be checked (upstream failure)
+
+
+class TickersRequest(BaseModel):
+    tickers: List[str]
+
+
+class TickerMetadataStore:
+    """
+    Thread-safe SQLite table of ticker validity and metadata. Safe to share
+    between worker processes (WAL journal, one connection per thread).
+    """
+
+    def __init__(self, path: str, positive_ttl: float = POSITIVE_TTL, negative_ttl: float = NEGATIVE_TTL):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=10.0)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def get_many(self, symbols: Iterable[str]) -> Dict[str, sqlite3.Row]:
+        """
+        Fresh entries by symbol; expired and unknown symbols are left out.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        now = time.time()
+        rows = {}
+        db = self._connect()
+        # Chunked to stay under SQLite's bound-parameter limit
+        for i in range(0, len(symbols), 500):
+            chunk = symbols[i:i + 500]
+            query = f"SELECT * FROM tickers WHERE symbol IN ({','.join('?' * len(chunk))})"
+            for row in db.execute(query, chunk):
+                ttl = self.positive_ttl if row["valid"] else self.negative_ttl
+                if now - row["checked_at"] <= ttl:
+                    rows[row["symbol"]] = row
+        return rows
+
+    def invalid(self, symbols: Iterable[str]) -> List[str]:
+        """
+        The symbols known to be invalid (fresh negative entries), in input order.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        rows = self.get_many(symbols)
+        return [s for s in symbols if s in rows and not rows[s]["valid"]]
+
+    def record_prices(self, last_dates: Dict[str, date], missing: Iterable[str] = ()):
+        """
+        Outcome of a price fetch: last bar date of each ticker that had data,
+        and the tickers that had none.
+        """
+        now = time.time()
+        rows = [(s, 1, d.isoformat(), now) for s, d in last_dates.items()]
+        rows += [(s, 0, None, now) for s in missing]
+        if not rows:
+            return
+        with self._connect() as db:
+            db.executemany(
+                "INSERT INTO tickers (symbol, valid, last_trade_date, checked_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET valid = excluded.valid, checked_at = excluded.checked_at, "
+                "last_trade_date = COALESCE(excluded.last_trade_date, last_trade_date)",
+                rows
+            )
+
+    def record_info(self, infos: Iterable[TickerInfo]):
+        now = time.time()
+        rows = [(i.name, i.sector, i.summary, i.first_trade_date.isoformat() if i.first_trade_date else None, now, i.symbol)
+                for i in infos]
+        if not rows:
+            return
+        with self._connect() as db:
+            db.executemany(
+                "UPDATE tickers SET name = ?, sector = ?, summary = ?, first_trade_date = ?, info_at = ? WHERE symbol = ?",
+                rows
+            )
+
+    def info_fresh(self, row: sqlite3.Row) -> bool:
+        return row["info_at"] is not None and time.time() - row["info_at"] <= self.positive_ttl
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM tickers")
+
+
+class TickerMetadataService:
+    """
+    Validation and metadata lookups in front of a TickerMetadataStore.
+    Only tickers the store has no fresh entry for reach the upstream `provider`.
+    """
+
+    def __init__(self, provider: MarketDataProvider, store: TickerMetadataStore):
+        self.provider = provider
+        self.store = store
+
+    def known_invalid(self, tickers: Iterable[str]) -> List[str]:
+        """
+        Tickers already known to be invalid. Never calls the upstream.
+        """
+        return self.store.invalid(tickers)
+
+    def validate(self, tickers: List[str]) -> TickerValidation:
+        tickers = list(dict.fromkeys(tickers))
+        rows = self.store.get_many(tickers)
+        unknown: List[str] = []
+
+        # 1. One short price fetch for everything the store doesn't know
+        misses = [t for t in tickers if t not in rows]
+        if misses:
+            try:
+                frame = self.provider.get_historical_prices(misses, period=VALIDATION_PERIOD)
+            except Exception as e:
+                logger.warning("Validating %s failed: %s", misses, e)
+                unknown = misses
+            else:
+                last_dates, missing = _fetch_outcome(frame, misses)
+                self.store.record_prices(last_dates, confirm_missing(self.provider, missing))
+                rows = self.store.get_many(tickers)
+                # Empty but not confirmed (over CONFIRM_MAX, or the check failed)
+                unknown = [t for t in misses if t not in rows]
+
+        return TickerValidation(
+            valid=[t for t in tickers if t in rows and rows[t]["valid"]],
+            invalid=[t for t in tickers if t in rows and not rows[t]["valid"]],
+            unknown=unknown
+        )
+
+    def info(self, tickers: List[str]) -> List[TickerInfo]:
+        tickers = list(dict.fromkeys(tickers))
+        validation = self.validate(tickers)
+        rows = self.store.get_many(tickers)
+
+        # 1. Upstream metadata for valid tickers without fresh metadata, a few at a time
+        stale = [t for t in validation.valid if not self.store.info_fresh(rows[t])]
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(INFO_CONCURRENCY, len(stale))) as pool:
+                fetched = [info for info in pool.map(self._fetch_info, stale) if info is not None]
+            self.store.record_info(fetched)
+            rows = self.store.get_many(tickers)
+
+        # 2. Everything from the store (unknown tickers only carry the symbol)
+        return [_to_info(t, rows.get(t)) for t in tickers]
+
+    def _fetch_info(self, ticker: str) -> Optional[TickerInfo]:
+        try:
+            info = self.provider.get_ticker_info(ticker)
+        except Exception as e:
+            logger.warning("Fetching info for %s failed: %s", ticker, e)
+            return None
+        return TickerInfo(
+            symbol=ticker,
+            name=info.get("name"),
+            sector=info.get("sector"),
+            summary=info.get("summary"),
+            first_trade_date=info.get("first_trade_date")
+        )
+
+
+def confirm_missing(provider: MarketDataProvider, tickers: List[str], limit: int = CONFIRM_MAX) -> List[str]:
+    """
+    The tickers that still come back without data when fetched on their own.
+    Only the first `limit` are checked, so a request full of bad symbols
+    costs a bounded number of upstream calls. A failed check does not
+    confirm anything.
+    """
+    def still_missing(ticker: str) -> bool:
+        try:
+            frame = provider.get_historical_prices([ticker], period=VALIDATION_PERIOD)
+        except Exception as e:
+            logger.warning("Confirming %s as invalid failed: %s", ticker, e)
+            return False
+        return bool(_fetch_outcome(frame, [ticker])[1])
+
+    tickers = tickers[:limit]
+    if not tickers:
+        return []
+    with ThreadPoolExecutor(max_workers=min(INFO_CONCURRENCY, len(tickers))) as pool:
+        return [t for t, missing in zip(tickers, pool.map(still_missing, tickers)) if missing]
+
+
+def _fetch_outcome(frame: Optional[pd.DataFrame], tickers: List[str]):
+    # Last bar date per ticker with data, and the tickers without any
+    last_dates: Dict[str, date] = {}
+    missing: List[str] = []
+    for ticker in tickers:
+        series = frame[ticker].dropna() if frame is not None and ticker in frame.columns else None
+        if series is None or series.empty:
+            missing.append(ticker)
+        else:
+            last_dates[ticker] = pd.Timestamp(series.index[-1]).date()
+    return last_dates, missing
+
+
+def _to_info(symbol: str, row: Optional[sqlite3.Row]) -> TickerInfo:
+    if row is None:
+        return TickerInfo(symbol=symbol)
+    return TickerInfo(
+        symbol=symbol,
+        valid=bool(row["valid"]),
+        name=row["name"],
+        sector=row["sector"],
+        summary=row["summary"],
+        first_trade_date=row["first_trade_date"],
+        last_trade_date=row["last_trade_date"]
+    )
@@ -0,0 +1,318 @@
+"""
+ReturnsPanel: the aligned price history the engines share.
+
+Prices are one contiguous (dates x tickers) float array with an int64
+date axis (nanoseconds since the epoch) and a ticker -> column index.
+Simple and log returns are computed once per underlying array and shared
+by every view of it.
+
+Panels are immutable. Date windows and contiguous ticker ranges are
+zero-copy views; other ticker subsets are gathered once and cached. Cleaning
+steps return the panel itself when they have nothing to do, so clean data is
+never copied. float32 halves the memory of very large universes.
+"""
+from typing import Dict, Sequence, Union
+import numpy as np
+import pandas as pd
+
+
+class ReturnsPanel:
+    def __init__(self, prices: np.ndarray, dates: np.ndarray, tickers: Sequence[str], dtype=np.float64):
+        """
+        prices: (dates x tickers) closes, NaN where there is no bar.
+        dates: sorted datetime64 values or int64 nanoseconds.
+        """
+        self._root = _Root(prices, dates, tickers, dtype)
+        self._rows = slice(0, self._root.prices.shape[0])
+        self._cols: Union[slice, np.ndarray] = slice(0, self._root.prices.shape[1])
+        self._tickers = self._root.tickers
+        self._cache: Dict[str, object] = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dtype=np.float64) -> "ReturnsPanel":
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        if not index.is_monotonic_increasing:
+            order = np.argsort(index.values, kind="stable")
+            df, index = df.iloc[order], index[order]
+        return cls(df.to_numpy(dtype=dtype), index.values, [str(c) for c in df.columns], dtype)
+
+    @classmethod
+    def coerce(cls, prices: Union["ReturnsPanel", pd.DataFrame], dtype=np.float64) -> "ReturnsPanel":
+        return prices if isinstance(prices, ReturnsPanel) else cls.from_frame(prices, dtype)
+
+    def _view(self, rows: slice, cols: Union[slice, np.ndarray]) -> "ReturnsPanel":
+        view = ReturnsPanel.__new__(ReturnsPanel)
+        view._root = self._root
+        view._rows = rows
+        view._cols = cols
+        view._tickers = tuple(self._root.tickers[c] for c in _positions(cols, len(self._root.tickers)))
+        view._cache = {}
+        return view
+
+    # Shape and labels
+
+    @property
+    def tickers(self) -> tuple:
+        return self._tickers
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self._root.dates[self._rows]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        if "index" not in self._cache:
+            self._cache["index"] = pd.DatetimeIndex(self.dates.view("datetime64[ns]"), name="Date")
+        return self._cache["index"]
+
+    @property
+    def shape(self) -> tuple:
+        return (len(self.dates), len(self._tickers))
+
+    @property
+    def dtype(self):
+        return self._root.prices.dtype
+
+    @property
+    def empty(self) -> bool:
+        return 0 in self.shape
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __contains__(self, ticker: str) -> bool:
+        return self.column(ticker) >= 0
+
+    def column(self, ticker: str) -> int:
+        """
+        Column of `ticker` in this panel, -1 if absent.
+        """
+        return int(self.columns_of([ticker])[0])
+
+    def columns_of(self, tickers: Sequence[str]) -> np.ndarray:
+        if "columns" not in self._cache:
+            self._cache["columns"] = {t: i for i, t in enumerate(self._tickers)}
+        columns = self._cache["columns"]
+        return np.array([columns.get(t, -1) for t in tickers], dtype=np.int64)
+
+    # Data
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self._slice("prices", self._root.prices)
+
+    @property
+    def simple_returns(self) -> np.ndarray:
+        """
+        (dates - 1) x tickers, row t = prices[t + 1] / prices[t] - 1.
+        """
+        return self._returns("simple")
+
+    @property
+    def log_returns(self) -> np.ndarray:
+        return self._returns("log")
+
+    def latest(self) -> pd.Series:
+        """
+        Last row of prices, labelled by ticker (NaN when the panel has no dates).
+        """
+        values = self.prices[-1] if len(self) else np.full(len(self._tickers), np.nan)
+        return pd.Series(values, index=list(self._tickers), dtype=float)
+
+    def column_values(self, ticker: str) -> np.ndarray:
+        col = self.column(ticker)
+        return self.prices[:, col] if col >= 0 else np.full(len(self), np.nan)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.prices, index=self.index, columns=list(self._tickers), copy=False)
+
+    def returns_frame(self) -> pd.DataFrame:
+        """
+        Simple returns as a DataFrame (no copy), indexed by the later date of each pair.
+        """
+        return pd.DataFrame(self.simple_returns, index=self.index[1:], columns=list(self._tickers), copy=False)
+
+    # Views
+
+    def select(self, tickers: Sequence[str]) -> "ReturnsPanel":
+        """
+        Sub-universe in the given order; every ticker must be present.
+        """
+        pos = self.columns_of(tickers)
+        if (pos < 0).any():
+            raise KeyError(f"Tickers not in panel: {[t for t, p in zip(tickers, pos) if p < 0]}")
+        return self.take(pos)
+
+    def take(self, columns: np.ndarray) -> "ReturnsPanel":
+        """
+        Sub-universe by column position.
+        """
+        return self._view(self._rows, _compose(self._cols, np.asarray(columns, dtype=np.int64), len(self._root.tickers)))
+
+    def reindex(self, tickers: Sequence[str]) -> "ReturnsPanel":
+        """
+        Panel with exactly these columns; absent tickers come back all-NaN.
+        """
+        pos = self.columns_of(tickers)
+        if (pos >= 0).all():
+            return self.select(tickers)
+        prices = np.full((len(self), len(tickers)), np.nan, dtype=self.dtype)
+        present = pos >= 0
+        prices[:, present] = self.prices[:, pos[present]]
+        return ReturnsPanel(prices, self.dates, list(tickers), self.dtype)
+
+    def window(self, start=None, end=None) -> "ReturnsPanel":
+        """
+        Dates in [start, end] (either bound optional), as a view.
+        """
+        dates = self.dates
+        lo = np.searchsorted(dates, _ns(start), side="left") if start is not None else 0
+        hi = np.searchsorted(dates, _ns(end), side="right") if end is not None else len(dates)
+        return self.rows(int(lo), int(hi))
+
+    def rows(self, lo: int, hi: int) -> "ReturnsPanel":
+        start = self._rows.start
+        lo = min(max(0, lo), len(self))
+        hi = max(lo, min(hi, len(self)))
+        return self._view(slice(start + lo, start + hi), self._cols)
+
+    # Cleaning
+
+    def ffill(self) -> "ReturnsPanel":
+        """
+        Missing bars filled with the previous close (leading NaNs stay).
+        """
+        if "ffill" not in self._cache:
+            prices = self.prices
+            if not np.isnan(prices).any():
+                self._cache["ffill"] = self
+            else:
+                filled = pd.DataFrame(prices, copy=False).ffill().to_numpy(dtype=self.dtype)
+                self._cache["ffill"] = ReturnsPanel(filled, self.dates, self._tickers, self.dtype)
+        return self._cache["ffill"]
+
+    def drop_empty_columns(self) -> "ReturnsPanel":
+        """
+        Without tickers that have no price at all.
+        """
+        has_data = ~np.isnan(self.prices).all(axis=0) if len(self) else np.zeros(len(self._tickers), dtype=bool)
+        return self if has_data.all() else self.take(np.flatnonzero(has_data))
+
+    def observed_rows(self) -> "ReturnsPanel":
+        """
+        Without dates on which none of the tickers has a bar (e.g. weekends
+        that only exist for other tickers of a wider panel).
+        """
+        observed = ~np.isnan(self.prices).all(axis=1)
+        if observed.all():
+            return self
+        keep = np.flatnonzero(observed)
+        return ReturnsPanel(self.prices[keep], self.dates[keep], self._tickers, self.dtype)
+
+    def complete(self) -> "ReturnsPanel":
+        """
+        Forward-filled, from the first date on which every ticker has a price.
+        """
+        filled = self.ffill()
+        complete = np.flatnonzero(~np.isnan(filled.prices).any(axis=1))
+        if len(complete) == 0:
+            return filled.rows(0, 0)
+        return filled.rows(int(complete[0]), len(filled))
+
+    # Point-in-time lookups
+
+    def asof(self, columns: np.ndarray, dates: np.ndarray) -> np.ndarray:
+        """
+        Last price on or before each date (previous-trading-day semantics)
+        for each (column, date) pair, in one pass. NaN for column -1 or dates
+        before the ticker's first bar.
+        """
+        columns = np.asarray(columns, dtype=np.int64)
+        filled = self.ffill()
+        pos = np.searchsorted(filled.dates, _ns(dates), side="right") - 1
+        ok = (pos >= 0) & (columns >= 0)
+        out = np.full(len(columns), np.nan)
+        if ok.any():
+            out[ok] = filled.prices[pos[ok], columns[ok]]
+        return out
+
+    # Internals
+
+    def _slice(self, name: str, base: np.ndarray) -> np.ndarray:
+        if name not in self._cache:
+            if isinstance(self._cols, slice):
+                out = base[self._rows, self._cols]
+            else:
+                out = base[self._rows][:, self._cols]
+                out.flags.writeable = False
+            self._cache[name] = out
+        return self._cache[name]
+
+    def _returns(self, kind: str) -> np.ndarray:
+        if kind not in self._cache:
+            base = self._root.returns(kind)
+            # Returns of rows [lo, hi) are base rows [lo, hi - 1)
+            rows = slice(self._rows.start, max(self._rows.start, self._rows.stop - 1))
+            out = base[rows, self._cols] if isinstance(self._cols, slice) else base[rows][:, self._cols]
+            out.flags.writeable = False
+            self._cache[kind] = out
+        return self._cache[kind]
+
+
+class _Root:
+    """
+    The arrays a panel and all its views share.
+    """
+
+    def __init__(self, prices: np.ndarray, dates: np.ndarray, tickers: Sequence[str], dtype):
+        prices = np.ascontiguousarray(prices, dtype=dtype)
+        dates = np.asarray(dates)
+        if dates.dtype.kind == "M":
+            dates = dates.astype("datetime64[ns]").view(np.int64)
+        dates = np.ascontiguousarray(dates, dtype=np.int64)
+        if prices.ndim != 2 or prices.shape != (len(dates), len(tickers)):
+            raise ValueError(f"prices shape {prices.shape} does not match {len(dates)} dates x {len(tickers)} tickers")
+        if len(dates) > 1 and (np.diff(dates) < 0).any():
+            raise ValueError("dates must be sorted")
+        prices.flags.writeable = False
+        dates.flags.writeable = False
+        self.prices = prices
+        self.dates = dates
+        self.tickers = tuple(tickers)
+        self._returns: Dict[str, np.ndarray] = {}
+
+    def returns(self, kind: str) -> np.ndarray:
+        if kind not in self._returns:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                if kind == "log":
+                    out = np.diff(np.log(self.prices), axis=0)
+                else:
+                    out = self.prices[1:] / self.prices[:-1] - 1
+            out.flags.writeable = False
+            self._returns[kind] = out
+        return self._returns[kind]
+
+
+def _positions(cols: Union[slice, np.ndarray], n: int) -> np.ndarray:
+    return np.arange(n)[cols] if isinstance(cols, slice) else cols
+
+
+def _compose(cols: Union[slice, np.ndarray], pos: np.ndarray, n: int) -> Union[slice, np.ndarray]:
+    # Root columns of `pos` taken from a view over `cols`; a slice again when contiguous
+    root = _positions(cols, n)[pos]
+    if len(root) and np.array_equal(root, np.arange(root[0], root[0] + len(root))):
+        return slice(int(root[0]), int(root[0]) + len(root))
+    if len(root) == 0:
+        return slice(0, 0)
+    return root
+
+
+def _ns(value) -> Union[int, np.ndarray]:
+    # Dates (scalar or array; date, datetime, Timestamp, datetime64) as int64 nanoseconds
+    if isinstance(value, np.ndarray) and value.dtype.kind == "i":
+        return value
+    if isinstance(value, np.ndarray) or isinstance(value, (list, tuple)):
+        return np.asarray(value, dtype="datetime64[ns]").view(np.int64)
+    return pd.Timestamp(value).as_unit("ns").value
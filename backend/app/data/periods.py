@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+from typing import Optional
+import pandas as pd
+
+# Calendar-day span of each yfinance period string, shortest first.
+# "max" has no lower bound.
+PERIOD_DAYS = {
+    "1d": 1,
+    "5d": 7,
+    "1mo": 31,
+    "3mo": 92,
+    "6mo": 183,
+    "1y": 366,
+    "2y": 731,
+    "5y": 1827,
+    "10y": 3653,
+    "max": None,
+}
+
+# Short periods that yfinance interprets as a number of trading bars, not calendar days.
+TRADING_BAR_PERIODS = {"1d": 1, "5d": 5}
+
+# Bar sizes (yfinance names) -> pandas period frequency of the coarser bars
+INTERVALS = {"1d": None, "1wk": "W-SUN", "1mo": "M"}
+
+
+def period_start(period: str, today: Optional[date] = None) -> Optional[date]:
+    """
+    First calendar date covered by a yfinance period string.
+    Returns None for "max" (unbounded history).
+    """
+    today = today or date.today()
+    if period == "ytd":
+        return date(today.year, 1, 1)
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unsupported period: {period}")
+    days = PERIOD_DAYS[period]
+    if days is None:
+        return None
+    return today - timedelta(days=days)
+
+
+def period_covering(days: int) -> str:
+    """
+    Smallest yfinance period string spanning at least `days` calendar days.
+    """
+    for period, span in PERIOD_DAYS.items():
+        if span is None or span >= days:
+            return period
+    return "max"
+
+
+def check_interval(interval: str):
+    if interval not in INTERVALS:
+        raise ValueError(f"Unsupported interval: {interval}")
+
+
+def to_interval(df: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Daily closes as `interval` bars: the last close of each week or month,
+    labelled by the first day of the week/month like yfinance.
+    """
+    check_interval(interval)
+    if INTERVALS[interval] is None or df.empty:
+        return df
+    out = df.groupby(df.index.to_period(INTERVALS[interval])).last()
+    out.index = out.index.start_time.rename("Date")
+    return out
+
+
+def clip_window(df: pd.DataFrame, start: Optional[date] = None, end: Optional[date] = None) -> pd.DataFrame:
+    """
+    Rows dated within [start, end] (either bound optional).
+    """
+    if df.empty:
+        return df
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df.index < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    return df
@@ -0,0 +1,38 @@
+from typing import List
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from .defaults import get_coalescing_provider, get_ticker_metadata
+from .metadata import TickerInfo, TickersRequest, TickerValidation
+
+router = APIRouter(prefix="/data", tags=["data"])
+
+# Tickers per bulk validation/info request
+MAX_TICKERS = 1000
+
+@router.get("/stats")
+async def get_data_stats():
+    return {"coalescing": get_coalescing_provider().stats()}
+
+
+tickers_router = APIRouter(prefix="/tickers", tags=["tickers"])
+
+def _check_size(request: TickersRequest):
+    if len(request.tickers) > MAX_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TICKERS} tickers per request")
+
+@tickers_router.post("/validate", response_model=TickerValidation)
+async def validate_tickers(request: TickersRequest):
+    """
+    Splits tickers into valid, invalid and unknown (could not be checked).
+    Only tickers without a fresh cached entry are checked upstream.
+    """
+    _check_size(request)
+    return await run_in_threadpool(get_ticker_metadata().validate, request.tickers)
+
+@tickers_router.post("/info", response_model=List[TickerInfo])
+async def get_tickers_info(request: TickersRequest):
+    """
+    Name, sector, summary and listing dates per ticker, in request order.
+    """
+    _check_size(request)
+    return await run_in_threadpool(get_ticker_metadata().info, request.tickers)
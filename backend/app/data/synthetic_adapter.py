@@ -0,0 +1,125 @@
+import zlib
+from datetime import date
+from typing import Any, Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+from ..instrumentation.metrics import UPSTREAM_REQUESTS, UPSTREAM_TICKERS
+from .adapter import MarketDataProvider
+from .periods import TRADING_BAR_PERIODS, check_interval, period_start, to_interval
+
+SECTORS = ["Technology", "Healthcare", "Financial Services", "Energy", "Industrials",
+           "Consumer Cyclical", "Consumer Defensive", "Utilities", "Real Estate", "Basic Materials"]
+
+# Tickers generated per block (bounds memory to block x calendar floats)
+TICKER_BLOCK = 256
+
+
+class SyntheticMarketDataProvider(MarketDataProvider):
+    """
+    Offline MarketDataProvider that generates correlated GBM prices.
+
+    Daily log returns follow a factor model: a few shared factor paths
+    (the first one a "market" factor every ticker loads on) plus
+    idiosyncratic noise. Everything is derived from `seed` and the ticker
+    symbol, so a ticker's series is the same whichever other tickers are
+    requested with it, and the same seed always gives the same panel.
+
+    To look like real data, a share of tickers list late (NaN before the
+    listing date), are delisted (NaN after the last trade, all-NaN when
+    that is before the requested window) or have missing quotes. Tickers in
+    `stable` (SPY by default) never do; tickers in `unknown` come back as
+    all-NaN columns like invalid symbols do from Yahoo.
+    """
+
+    def __init__(self, seed: int = 0, start: date = date(2005, 1, 3), end: Optional[date] = None, factors: int = 3,
+                 gap_rate: float = 0.002, late_listing_rate: float = 0.1, delisting_rate: float = 0.05,
+                 stable: Iterable[str] = ("SPY",), unknown: Iterable[str] = ()):
+        self.seed = seed
+        self.calendar = pd.bdate_range(start, end or date.today(), name="Date")
+        self.gap_rate = gap_rate
+        self.late_listing_rate = late_listing_rate
+        self.delisting_rate = delisting_rate
+        self.stable = set(stable)
+        self.unknown = set(unknown)
+
+        # Shared factor returns (days x factors); the market factor is the most volatile
+        self._factor_vols = np.array([0.01] + [0.005] * (factors - 1))[:factors]
+        self._factors = np.random.default_rng([seed, 0]).standard_normal((len(self.calendar), factors)) * self._factor_vols
+
+    def get_historical_prices(self, tickers: list[str], period: str = "5y", start: Optional[date] = None,
+                              end: Optional[date] = None, interval: str = "1d") -> pd.DataFrame:
+        check_interval(interval)
+        tickers = list(dict.fromkeys(tickers))
+        UPSTREAM_REQUESTS.inc(source="synthetic", call="history")
+        UPSTREAM_TICKERS.inc(len(tickers), source="synthetic")
+        # 1. Requested window on the calendar
+        hi = len(self.calendar) if end is None else int(self.calendar.searchsorted(pd.Timestamp(end), side="right"))
+        if start is None and period in TRADING_BAR_PERIODS:
+            lo = max(len(self.calendar) - TRADING_BAR_PERIODS[period], 0)
+        else:
+            first = start or period_start(period, today=self.calendar[-1].date())
+            lo = 0 if first is None else int(self.calendar.searchsorted(pd.Timestamp(first)))
+        hi = max(lo, hi)
+
+        # 2. Generate blocks of tickers, keeping only the window rows
+        out = np.full((hi - lo, len(tickers)), np.nan)
+        for col in range(0, len(tickers), TICKER_BLOCK):
+            block = tickers[col:col + TICKER_BLOCK]
+            out[:, col:col + len(block)] = self._generate(block)[lo:hi]
+
+        return to_interval(pd.DataFrame(out, index=self.calendar[lo:hi], columns=tickers), interval)
+
+    def get_ticker_info(self, ticker: str) -> Dict[str, Any]:
+        UPSTREAM_REQUESTS.inc(source="synthetic", call="info")
+        if ticker in self.unknown:
+            return {"symbol": ticker, "name": None, "sector": None, "summary": None, "first_trade_date": None}
+        listed = np.flatnonzero(~np.isnan(self._generate([ticker])[:, 0]))
+        return {
+            "symbol": ticker,
+            "name": f"{ticker} Synthetic Corp.",
+            "sector": SECTORS[_ticker_key(ticker) % len(SECTORS)],
+            "summary": f"Simulated security generated from seed {self.seed}.",
+            "first_trade_date": self.calendar[listed[0]].date() if len(listed) else None
+        }
+
+    def _generate(self, tickers: list[str]) -> np.ndarray:
+        """
+        Full-calendar prices (days x tickers) for one block of tickers.
+        """
+        days, k = self._factors.shape
+        prices = np.full((days, len(tickers)), np.nan)
+        for j, ticker in enumerate(tickers):
+            if ticker in self.unknown:
+                continue
+            # Independent streams so parameters, noise and events never shift each other
+            params, noise, events = (np.random.default_rng(s) for s in np.random.SeedSequence([self.seed, _ticker_key(ticker)]).spawn(3))
+
+            # 1. Parameters: market beta, other loadings, annual drift, idiosyncratic vol
+            loadings = np.concatenate([[params.normal(1.0, 0.3)], params.normal(0.0, 0.5, size=k - 1)])
+            drift = params.normal(0.07, 0.05) / 252
+            vol = params.uniform(0.008, 0.025)
+            p0 = params.lognormal(4.0, 0.8)
+
+            # 2. Log returns -> prices
+            variance = np.sum((loadings * self._factor_vols) ** 2) + vol ** 2
+            log_returns = self._factors @ loadings + vol * noise.standard_normal(days) + drift - 0.5 * variance
+            prices[:, j] = p0 * np.exp(np.cumsum(log_returns))
+
+            if ticker in self.stable:
+                continue
+
+            # 3. Listing events and missing quotes
+            listed, delisted = 0, days
+            if events.random() < self.late_listing_rate:
+                listed = int(events.integers(0, days))
+            if events.random() < self.delisting_rate:
+                delisted = int(events.integers(listed + 1, days + 1))
+            prices[:listed, j] = np.nan
+            prices[delisted:, j] = np.nan
+            prices[events.random(days) < self.gap_rate, j] = np.nan
+        return prices
+
+
+def _ticker_key(ticker: str) -> int:
+    # Stable across processes (unlike hash())
+    return zlib.crc32(ticker.encode())
@@ -1,7 +1,11 @@
 import yfinance as yf
 import pandas as pd
-from typing import Dict, Any
+from datetime import date, timedelta
+from typing import Dict, Any, Optional
+from ..instrumentation import stage
+from ..instrumentation.metrics import UPSTREAM_REQUESTS, UPSTREAM_TICKERS
 from .adapter import MarketDataProvider
+from .periods import check_interval, clip_window
 
 class YahooFinanceProvider(MarketDataProvider):
     """
@@ -9,11 +13,21 @@ class YahooFinanceProvider(MarketDataProvider):
     Best for development and MVP (free, delayed data).
     """
 
-    def get_historical_prices(self, tickers: list[str], period: str = "5y") -> pd.DataFrame:
+    def get_historical_prices(self, tickers: list[str], period: str = "5y", start: Optional[date] = None,
+                              end: Optional[date] = None, interval: str = "1d") -> pd.DataFrame:
+        return clip_window(self._download(tickers, period, start, end, interval), end=end)
+
+    def _download(self, tickers: list[str], period: str, start: Optional[date], end: Optional[date], interval: str) -> pd.DataFrame:
         # yfinance download returns a MultiIndex if multiple tickers.
         # We want just the 'Adj Close' or 'Close'.
         # auto_adjust=True gives us adjusted close as 'Close'.
-        data = yf.download(tickers, period=period, auto_adjust=True)
+        check_interval(interval)
+        # Only the requested window: an explicit range when start is given (yfinance's end is exclusive)
+        window = {"start": start, "end": end + timedelta(days=1) if end else None} if start else {"period": period}
+        UPSTREAM_REQUESTS.inc(source="yahoo", call="history")
+        UPSTREAM_TICKERS.inc(len(tickers), source="yahoo")
+        with stage("yahoo", "download"):
+            data = yf.download(tickers, interval=interval, auto_adjust=True, **window)
         
         if isinstance(data.columns, pd.MultiIndex):
             # If multi-index (Price, Ticker), extract Close and then just the tickers
@@ -31,11 +45,15 @@ class YahooFinanceProvider(MarketDataProvider):
             return data
 
     def get_ticker_info(self, ticker: str) -> Dict[str, Any]:
+        UPSTREAM_REQUESTS.inc(source="yahoo", call="info")
         t = yf.Ticker(ticker)
-        info = t.info
+        with stage("yahoo", "info"):
+            info = t.info
+        first_trade = info.get("firstTradeDateEpochUtc")
         return {
             "symbol": ticker,
             "name": info.get("longName"),
             "sector": info.get("sector"),
-            "summary": info.get("longBusinessSummary")
+            "summary": info.get("longBusinessSummary"),
+            "first_trade_date": pd.Timestamp(first_trade, unit="s").date() if first_trade else None
         }
@@ -1,143 +1,127 @@
 from typing import List
 from datetime import date
+import numpy as np
 from ..data.adapter import MarketDataProvider
-from ..data.yahoo_adapter import YahooFinanceProvider
+from ..data.defaults import get_default_provider
+from ..instrumentation import stage
 from .models import Influencer, Tip
 
+BENCHMARK_TICKER = "SPY"
+
 class HypeMeterEngine:
-    def __init__(self, provider: MarketDataProvider = YahooFinanceProvider()):
-        self.provider = provider
+    def __init__(self, provider: MarketDataProvider = None):
+        self.provider = provider or get_default_provider()
 
     def calculate_tip_performance(self, tip: Tip) -> Tip:
         """
         Calculates the performance of a single tip.
-        Fetches current price if exit_price is missing.
-        Fetches SPY price for benchmark comparison.
+        See score_tips for how prices are resolved.
         """
-        # 1. Fetch Entry/Current Price
-        # If entry_price is missing, we need to fetch historical data (not implemented in MVP fully efficiently)
-        # For now, assume entry_price is provided or we fetch "current" if needed.
-        
-        tickers = [tip.ticker, "SPY"]
-        prices = self.provider.get_historical_prices(tickers, period="max") # Inefficent query for just one date, optimizing later
-        
-        # Logic placeholder:
-        # entry_val = prices.loc[tip.entry_date][tip.ticker]
-        # current_val = prices.iloc[-1][tip.ticker]
-        
-        # Simple Mock Logic for MVP until we do full date-index matching
-        current_data = self.provider.get_historical_prices([tip.ticker])
-        if not current_data.empty:
-            # iloc[-1] gives the last row (Series). Access the ticker column to get value.
-            current_price = float(current_data.iloc[-1][tip.ticker])
-        else:
-            current_price = 0.0
-        
-        if tip.entry_price is None or tip.entry_price == 0:
-             # Fallback assumption for demo
-             tip.entry_price = current_price * 0.9 # Assume 10% gain for demo
-        
-        if tip.entry_price is None or tip.entry_price == 0:
-             # Fallback assumption for demo
-             tip.entry_price = current_price * 0.9 # Assume 10% gain for demo
-        
-        start_val = tip.entry_price
-
-        # Determine the "End Value" based on Time Horizon
-        if tip.valid_until:
-            # Logic: valid_until price. 
-            # In a real app we would fetch historical price at `valid_until`.
-            # For this MVP, if valid_until < today, we pretend the "current_price" 
-            # is actually the price at that date. 
-            # To make the demo effective without full historical data support:
-            # We will assume if valid_until is passed, the prediction failed if current price isn't much higher?
-            # actually let's try to do it slightly better:
-            
-            # If valid_until is in the past, checking "current_price" is WRONG.
-            # But we don't have easy historical lookup for single date yet in this MVP structure without yfinance overhead.
-            # So we will simplify: 
-            # If valid_until < today: we assume the price THEN was different.
-            
-            # Let's stick to the prompt's request: "if it only rises AFTER that period this should be taken into consideration".
-            # So if valid_until < today, and today's price is high, but valid_until price was low -> FAIL.
-            
-            # We will fetch the specific history row for `valid_until`.
-            # Our adapter `get_historical_prices` returns a dataframe. 
-            # We can try to query it.
-            pass
-
-        # MVP SIMPLIFICATION because we are hitting Yahoo Finance live:
-        # We will use the logical "exit_price" if set, otherwise current.
-        # But we need to enforce that if `valid_until` is set and passed, we use THAT date's price.
-        
-        end_val = current_price
-        
-        if tip.exit_price:
-            end_val = tip.exit_price
-        
-        # Override if valid_until is set and in the past
-        if tip.valid_until and tip.valid_until < date.today():
-             # Try to get close price on that day
-             try:
-                 # Fetch small window around valid_until
-                 history = self.provider.get_historical_prices([tip.ticker], period="5y") # naive large fetch
-                 # We need to find the index closest to valid_until
-                 # Ensure index is datetime
-                 if not history.empty:
-                    # Convert index to date if needed or use string lookups depending on pandas version/yfinance
-                    # yfinance returns DatetimeIndex
-                    valid_ts = str(tip.valid_until)
-                    # finding nearest is tricky in pandas minimal.
-                    # Let's just approximate: look for the exact date or throw logic error?
-                    # Better: if we can't find exact, we skip for MVP.
-                    # Check if date exists in index (as string 'YYYY-MM-DD')
-                    if valid_ts in history.index.strftime('%Y-%m-%d'):
-                         end_val = float(history.loc[valid_ts][tip.ticker])
-             except Exception as e:
-                 print(f"Error fetching historical for {tip.ticker} on {tip.valid_until}: {e}")
-                 # Fallback to current (imperfect but safe)
-                 pass
-
-        
-        if start_val > 0:
-            raw_return = (end_val - start_val) / start_val
-            tip.return_pct = round(raw_return, 4)
-        else:
-            tip.return_pct = 0.0
-
-        # Invert return if it was a SELL recommendation
-        if tip.action.upper() == "SELL":
-            tip.return_pct = -tip.return_pct
-
+        self.score_tips([tip])
         return tip
 
+    def score_tips(self, tips: List[Tip]) -> List[Tip]:
+        """
+        Scores many tips with a single batched as-of lookup.
+
+        Every (ticker, date) the tips need, plus SPY on the same dates, is
+        resolved in one provider.get_prices_asof call (last close on or before
+        the date, from one fetch of just the window the tips span):
+        - start: entry_price, else the close on entry_date
+        - end: the current close, else exit_price / the close on exit_date,
+          overridden by the close on valid_until once that date has passed
+        benchmark_return_pct is SPY's return over the same window.
+        """
+        if not tips:
+            return tips
+
+        today = date.today()
+        entry_dates = [tip.entry_date for tip in tips]
+        end_dates = [self._end_date(tip, today) for tip in tips]
+        queries = ([(tip.ticker, d) for tip, d in zip(tips, entry_dates)] + [(tip.ticker, d) for tip, d in zip(tips, end_dates)]
+                   + [(BENCHMARK_TICKER, d) for d in entry_dates] + [(BENCHMARK_TICKER, d) for d in end_dates])
+        with stage("hypemeter", "fetch"):
+            values = self.provider.get_prices_asof(queries)
+        return self._score(tips, values.reshape(4, len(tips)), today)
+
+    @stage("hypemeter", "score")
+    def _score(self, tips: List[Tip], values: np.ndarray, today: date) -> List[Tip]:
+        # values: closes at entry and end for each tip, then SPY's at the same dates (NaN when unknown)
+        start_vals, end_vals, spy_start, spy_end = values
+        with np.errstate(divide="ignore", invalid="ignore"):
+            benchmark = (spy_end - spy_start) / spy_start
+
+        for i, tip in enumerate(tips):
+            if tip.entry_price is None or tip.entry_price == 0:
+                tip.entry_price = None if np.isnan(start_vals[i]) else float(start_vals[i])
+            start_val = tip.entry_price or 0.0
+
+            end_val = end_vals[i]
+            # Explicit exit price wins unless the prediction window has already closed
+            if tip.exit_price and not (tip.valid_until and tip.valid_until < today):
+                end_val = tip.exit_price
+
+            if start_val > 0 and not np.isnan(end_val):
+                raw_return = (end_val - start_val) / start_val
+                tip.return_pct = round(float(raw_return), 4)
+            else:
+                tip.return_pct = 0.0
+
+            # Invert return if it was a SELL recommendation
+            if tip.action.upper() == "SELL":
+                tip.return_pct = -tip.return_pct
+
+            tip.benchmark_return_pct = None if np.isnan(benchmark[i]) else round(float(benchmark[i]), 4)
+
+        return tips
+
+    @staticmethod
+    def _end_date(tip: Tip, today: date) -> date:
+        # If valid_until has passed, the prediction is judged at that date,
+        # even if the stock only rose afterwards.
+        if tip.valid_until and tip.valid_until < today:
+            return tip.valid_until
+        if tip.exit_price is None and tip.exit_date:
+            return tip.exit_date
+        return today
+
     def score_influencer(self, influencer: Influencer) -> Influencer:
         """
         Aggregates tip performance to update Influencer stats.
         """
+        return self.score_influencers([influencer])[0]
+
+    def score_influencers(self, influencers: List[Influencer]) -> List[Influencer]:
+        """
+        Scores every tip of every influencer with one batched fetch, then
+        aggregates per influencer.
+        """
+        self.score_tips([tip for inf in influencers for tip in inf.tips])
+        for influencer in influencers:
+            self.aggregate(influencer)
+        return influencers
+
+    def aggregate(self, influencer: Influencer) -> Influencer:
+        """
+        Recomputes an influencer's stats from its (already scored) tips.
+        """
         if not influencer.tips:
             return influencer
-            
-        total_return = 0.0
-        wins = 0
-        
-        for i, tip in enumerate(influencer.tips):
-            # Calculate individual tip stats
-            updated_tip = self.calculate_tip_performance(tip)
-            influencer.tips[i] = updated_tip
-            
-            if updated_tip.return_pct > 0:
-                wins += 1
-            total_return += updated_tip.return_pct
-            
+
+        wins = sum(1 for tip in influencer.tips if tip.return_pct > 0)
+        total_return = sum(tip.return_pct for tip in influencer.tips)
+
         influencer.total_tips = len(influencer.tips)
         influencer.success_rate = round(wins / influencer.total_tips, 2)
         influencer.average_return = round(total_return / influencer.total_tips, 4)
-        
+        influencer.reliability_score = self.reliability_score(influencer.success_rate, influencer.average_return)
+        return influencer
+
+    @staticmethod
+    def reliability_score(success_rate: float, average_return: float) -> float:
         # Reliability Score Formula (Simple):
-        # Base 50 + (WinRate * 20) + (AvgReturn * 100)
+        # Base 50 + (WinRate * 20) + (AvgReturn * 50)
         # 50% win rate + 0% return = 60 score
-        score = 50 + (influencer.success_rate * 20) + (influencer.average_return * 50)
-        influencer.reliability_score = min(100, max(0, round(score)))
-        
-        return influencer
+        score = 50 + (success_rate * 20) + (average_return * 50)
+        return min(100, max(0, round(score)))
+
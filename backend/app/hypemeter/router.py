@@ -1,8 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from typing import List
 from datetime import date
 from .models import Influencer, Tip
 from .engine import HypeMeterEngine
+from .snapshot import LeaderboardRefresher
 
 router = APIRouter(prefix="/hypemeter", tags=["hypemeter"])
 
@@ -101,27 +103,44 @@ mock_influencers = [
     )
 ]
 
-# Calculate initial scores
-engine = HypeMeterEngine()
-# First pass score
-for inf in mock_influencers:
-    engine.score_influencer(inf)
+# Scores are computed by a background refresh (see main.py lifespan), never at import.
+# Serve the last persisted snapshot right away; unscored seed data until the first refresh.
+leaderboard = LeaderboardRefresher(mock_influencers)
+leaderboard.load()
 
-# Assign Ranks based on reliability score
-# Sort descending
-mock_influencers.sort(key=lambda x: x.reliability_score, reverse=True)
-for i, inf in enumerate(mock_influencers):
-    inf.rank = i + 1
+def _set_snapshot_headers(response: Response):
+    age = leaderboard.age
+    if age is not None:
+        response.headers["X-Snapshot-Age"] = f"{age:.0f}"
+    if leaderboard.refresh_duration is not None:
+        response.headers["X-Snapshot-Refresh-Duration"] = f"{leaderboard.refresh_duration:.3f}"
 
 @router.get("/influencers", response_model=List[Influencer])
-def get_influencers():
-    # Recalculate lively just in case (for MVP)
-    # in prod we would cache this
-    return mock_influencers
+async def get_influencers(response: Response):
+    _set_snapshot_headers(response)
+    return leaderboard.store.leaderboard()
 
 @router.get("/influencers/{id}", response_model=Influencer)
-def get_influencer(id: str):
-    for inf in mock_influencers:
-        if inf.id == id:
-            return inf
-    return None
+async def get_influencer(id: str, response: Response):
+    _set_snapshot_headers(response)
+    return leaderboard.store.get(id)
+
+@router.post("/influencers/{id}/tips", response_model=Influencer)
+async def add_tip(id: str, tip: Tip):
+    """
+    Ingests a new tip: scores just this tip and updates the influencer's
+    stats and rank incrementally.
+    """
+    if leaderboard.store.get(id) is None:
+        raise HTTPException(status_code=404, detail=f"Influencer not found: {id}")
+    try:
+        await run_in_threadpool(HypeMeterEngine().score_tips, [tip])
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Could not price tip: {e}")
+    influencer = leaderboard.store.add_scored_tip(id, tip)
+    leaderboard.mark_dirty()
+    return influencer
+
+@router.get("/status")
+async def get_leaderboard_status():
+    return leaderboard.status()
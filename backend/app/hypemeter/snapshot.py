@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from ..data.defaults import state_dir
+from .models import Influencer
+from .engine import HypeMeterEngine
+from .store import InfluencerStore
+
+logger = logging.getLogger(__name__)
+
+# Stored in the state directory, so synthetic-price scores stay apart from the real leaderboard
+SNAPSHOT_NAME = "hypemeter_snapshot.json"
+
+
+class LeaderboardRefresher:
+    """
+    Keeps the scored influencer leaderboard off the request and import paths.
+
+    The last leaderboard is persisted as a JSON snapshot and loaded at boot,
+    so the API can serve it immediately. A background task rescores it every
+    `interval` seconds (right away if the snapshot is missing or stale) and
+    swaps the new scores into the store once scoring finishes. Changes made
+    in between (ingested tips) are flushed to the snapshot every
+    `flush_interval` seconds.
+    """
+
+    def __init__(self, seed: List[Influencer], path: Optional[str] = None, interval: Optional[float] = None, flush_interval: float = 30.0):
+        self.path = Path(path or os.environ.get("HYPEMETER_SNAPSHOT_PATH") or state_dir() / SNAPSHOT_NAME)
+        self.interval = interval if interval is not None else float(os.environ.get("HYPEMETER_REFRESH_SECONDS", 3600))
+        self.flush_interval = flush_interval
+        self.store = InfluencerStore(seed)
+        self.dirty = False
+        self.generated_at: Optional[float] = None  # Unix time of the served snapshot
+        self.refresh_duration: Optional[float] = None  # Seconds the last refresh took
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self) -> bool:
+        """
+        Loads the persisted snapshot if there is one. Returns True on success.
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            influencers = [Influencer.model_validate(inf) for inf in data["influencers"]]
+        except (OSError, ValueError, KeyError) as e:
+            logger.info("No usable HypeMeter snapshot at %s: %s", self.path, e)
+            return False
+        self.store.replace_all(influencers)
+        self.generated_at = data.get("generated_at")
+        self.refresh_duration = data.get("refresh_duration")
+        return True
+
+    def refresh(self, engine: Optional[HypeMeterEngine] = None):
+        """
+        Rescores every influencer (one batched price fetch) and persists the result.
+        Blocking; the background task runs it in a worker thread.
+        """
+        started = time.perf_counter()
+        engine = engine or HypeMeterEngine()
+        # Score copies so requests keep seeing a consistent leaderboard meanwhile
+        influencers = self.store.copies()
+        engine.score_influencers(influencers)
+        self.store.apply_rescore(influencers, engine)
+
+        self.refresh_duration = round(time.perf_counter() - started, 3)
+        self.generated_at = time.time()
+        self.last_error = None
+        self.save()
+
+    def mark_dirty(self):
+        """
+        Schedules a snapshot write on the next flush tick.
+        """
+        self.dirty = True
+
+    @property
+    def age(self) -> Optional[float]:
+        if self.generated_at is None:
+            return None
+        return max(0.0, time.time() - self.generated_at)
+
+    def status(self) -> dict:
+        age = self.age
+        return {
+            "snapshot_age_seconds": round(age, 1) if age is not None else None,
+            "last_refresh_seconds": self.refresh_duration,
+            "refresh_interval_seconds": self.interval,
+            "last_error": self.last_error,
+        }
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        retry_at = 0.0
+        while True:
+            age = self.age
+            if (age is None or age >= self.interval) and time.time() >= retry_at:
+                try:
+                    await asyncio.to_thread(self.refresh)
+                except Exception as e:
+                    # Keep serving the previous snapshot and retry later
+                    self.last_error = str(e)
+                    retry_at = time.time() + min(self.interval, 60)
+                    logger.warning("HypeMeter refresh failed: %s", e)
+            elif self.dirty:
+                await asyncio.to_thread(self.save)
+
+            remaining = self.interval - (self.age or 0)
+            await asyncio.sleep(max(1.0, min(remaining, self.flush_interval)))
+
+    def save(self):
+        self.dirty = False
+        data = {
+            "generated_at": self.generated_at,
+            "refresh_duration": self.refresh_duration,
+            "influencers": [inf.model_dump(mode="json") for inf in self.store.copies()],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
@@ -0,0 +1,119 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional
+
+from .models import Influencer, Tip
+from .engine import HypeMeterEngine
+
+
+class _TipStats:
+    """
+    Running aggregates behind an influencer's success_rate / average_return.
+    """
+
+    def __init__(self, tips: List[Tip]):
+        self.count = len(tips)
+        self.wins = sum(1 for tip in tips if (tip.return_pct or 0) > 0)
+        self.return_sum = sum(tip.return_pct or 0 for tip in tips)
+
+    def add(self, tip: Tip):
+        self.count += 1
+        self.wins += 1 if (tip.return_pct or 0) > 0 else 0
+        self.return_sum += tip.return_pct or 0
+
+
+class InfluencerStore:
+    """
+    Influencers indexed by id, plus a leaderboard ordered by reliability_score.
+
+    The leaderboard is a sorted list of (-score, seq, id) keys, so finding an
+    influencer's rank or moving it after a rescore is a binary search (the
+    list insert/delete itself is a memmove). Ties keep insertion order.
+    Ranks are derived from list positions when read, never stored eagerly.
+    """
+
+    def __init__(self, influencers: Iterable[Influencer] = ()):
+        self._lock = threading.RLock()
+        self.replace_all(influencers)
+
+    def replace_all(self, influencers: Iterable[Influencer]):
+        """
+        Rebuilds the store (e.g. after a full rescore). Input order breaks ties.
+        """
+        with self._lock:
+            self._by_id: Dict[str, Influencer] = {}
+            self._stats: Dict[str, _TipStats] = {}
+            self._keys: Dict[str, tuple] = {}
+            self._order: List[tuple] = []
+            for seq, inf in enumerate(influencers):
+                self._by_id[inf.id] = inf
+                self._stats[inf.id] = _TipStats(inf.tips)
+                self._keys[inf.id] = (-inf.reliability_score, seq, inf.id)
+            self._order = sorted(self._keys.values())
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def get(self, id: str) -> Optional[Influencer]:
+        with self._lock:
+            inf = self._by_id.get(id)
+            if inf is not None:
+                inf.rank = bisect_left(self._order, self._keys[id]) + 1
+            return inf
+
+    def leaderboard(self) -> List[Influencer]:
+        with self._lock:
+            ranked = []
+            for i, (_, _, id) in enumerate(self._order):
+                inf = self._by_id[id]
+                inf.rank = i + 1
+                ranked.append(inf)
+            return ranked
+
+    def copies(self) -> List[Influencer]:
+        """
+        Deep copies in leaderboard order, for rescoring off the lock.
+        """
+        with self._lock:
+            return [inf.model_copy(deep=True) for inf in self.leaderboard()]
+
+    def apply_rescore(self, scored: List[Influencer], engine: HypeMeterEngine):
+        """
+        Swaps in a full rescore made from copies(). Tips ingested while the
+        rescore was running are carried over so they aren't lost.
+        """
+        with self._lock:
+            for inf in scored:
+                current = self._by_id.get(inf.id)
+                if current is not None and len(current.tips) > len(inf.tips):
+                    inf.tips.extend(current.tips[len(inf.tips):])
+                    engine.aggregate(inf)
+            # Stable sort keeps the previous order between equal scores
+            self.replace_all(sorted(scored, key=lambda x: x.reliability_score, reverse=True))
+
+    def add_scored_tip(self, id: str, tip: Tip) -> Influencer:
+        """
+        Appends an already-scored tip and updates the influencer's stats and
+        leaderboard position without touching anyone else.
+        """
+        with self._lock:
+            inf = self._by_id.get(id)
+            if inf is None:
+                raise KeyError(id)
+            inf.tips.append(tip)
+            stats = self._stats[id]
+            stats.add(tip)
+
+            inf.total_tips = stats.count
+            inf.success_rate = round(stats.wins / stats.count, 2)
+            inf.average_return = round(stats.return_sum / stats.count, 4)
+            inf.reliability_score = HypeMeterEngine.reliability_score(inf.success_rate, inf.average_return)
+
+            old_key = self._keys[id]
+            new_key = (-inf.reliability_score, old_key[1], id)
+            if new_key != old_key:
+                del self._order[bisect_left(self._order, old_key)]
+                insort(self._order, new_key)
+                self._keys[id] = new_key
+            inf.rank = bisect_left(self._order, new_key) + 1
+            return inf
@@ -0,0 +1,3 @@
+from .metrics import REGISTRY, Counter, Histogram, counter, histogram
+from .timing import stage, observe_solver, current_request
+from .middleware import InstrumentationMiddleware
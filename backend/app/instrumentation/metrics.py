@@ -0,0 +1,161 @@
+"""
+Minimal Prometheus metrics: labelled counters and histograms rendered in
+the text exposition format (version 0.0.4) served on /metrics.
+
+Metrics live in one process-wide registry. With several server worker
+processes each process exposes its own values.
+"""
+import math
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; Prometheus client defaults extended for slow optimizations and backtests
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+ITERATION_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 20000)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._label_text(key)} {_number(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, +Inf count, sum)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        lines = []
+        for key, (counts, total, sum_) in items:
+            for bound, n in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{self._label_text(key, [('le', _number(bound))])} {n}")
+            lines.append(f"{self.name}_bucket{self._label_text(key, [('le', '+Inf')])} {total}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(sum_)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {total}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# Application metrics
+
+STAGE_SECONDS = histogram(
+    "portfolio_stage_duration_seconds", "Time spent in each engine stage.", ("engine", "stage"))
+HTTP_SECONDS = histogram(
+    "portfolio_http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status"))
+UPSTREAM_REQUESTS = counter(
+    "portfolio_market_data_upstream_requests_total", "Calls to the upstream market data source.", ("source", "call"))
+UPSTREAM_TICKERS = counter(
+    "portfolio_market_data_upstream_tickers_total", "Tickers requested from the upstream market data source.", ("source",))
+CACHE_LOOKUPS = counter(
+    "portfolio_price_cache_lookups_total", "On-disk price cache lookups by outcome (hit, stale, miss).", ("result",))
+SOLVER_ITERATIONS = histogram(
+    "portfolio_solver_iterations", "Iterations per optimizer solve.", ("backend", "problem", "converged"), ITERATION_BUCKETS)
+RESULT_CACHE_LOOKUPS = counter(
+    "portfolio_result_cache_lookups_total", "In-memory result cache lookups by cache and outcome (hit, miss).", ("cache", "result"))
+SOLVE_DISPATCH = counter(
+    "portfolio_solver_dispatch_total", "Optimizer solves by where they ran (inline, pool).", ("mode",))
+OPTIMIZE_JOBS = counter(
+    "portfolio_optimize_jobs_total", "Async optimization jobs by final status.", ("status",))
@@ -0,0 +1,51 @@
+import time
+from .metrics import HTTP_SECONDS
+from .profiling import PROFILE_HEADER, TOKEN_HEADER, RequestProfile, requested_modes
+from .timing import RequestContext, current_request
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware: request latency histogram, Server-Timing header with
+    the stage durations recorded while the request ran, and opt-in
+    profiling (see profiling.py).
+
+    Plain ASGI rather than BaseHTTPMiddleware so streaming responses pass
+    through untouched. For those, Server-Timing holds what ran before the
+    first byte was sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        modes = requested_modes(headers.get(PROFILE_HEADER), headers.get(TOKEN_HEADER))
+        context = RequestContext(RequestProfile(modes) if modes else None)
+        token = current_request.set(context)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                extra = [(b"server-timing", context.server_timing(time.perf_counter() - start).encode("latin-1"))]
+                if context.profile is not None:
+                    extra.append((b"x-profile-id", context.profile.id.encode("latin-1")))
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            # Route template, not the raw path, to keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_SECONDS.observe(elapsed, method=scope["method"], route=route, status=str(status))
+            if context.profile is not None:
+                context.profile.finish(scope["method"], scope["path"], elapsed)
@@ -0,0 +1,141 @@
+"""
+Opt-in per-request profiling.
+
+Only when PROFILING_ENABLED=1 (and, if PROFILING_TOKEN is set, the
+X-Profile-Token header matches it), a request carrying
+`X-Profile: cpu`, `memory` or `cpu,memory` is profiled:
+- cpu: cProfile over the instrumented engine stages (see timing.stage),
+  one profiler per worker thread, merged at the end of the request
+- memory: tracemalloc peak and top allocation sites while the request ran.
+  tracemalloc is process-wide, so concurrent requests show up too.
+
+The response carries X-Profile-Id; the text summary is kept for the last
+PROFILE_HISTORY requests at GET /metrics/profiles/{id} and logged.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+TOKEN_HEADER = "x-profile-token"
+PROFILE_MODES = ("cpu", "memory")
+PROFILE_HISTORY = 32
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 20
+
+_profiles: "OrderedDict[str, str]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+# Requests currently tracing memory (tracemalloc is started/stopped around them,
+# unless something else already started it)
+_tracing = 0
+_owns_tracing = False
+_tracing_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    return os.environ.get("PROFILING_ENABLED", "0") == "1"
+
+
+def requested_modes(header: Optional[str], token: Optional[str]) -> List[str]:
+    """
+    Profile modes requested by the headers, empty when profiling is off or not authorized.
+    """
+    if not header or not profiling_enabled():
+        return []
+    expected = os.environ.get("PROFILING_TOKEN")
+    if expected and token != expected:
+        return []
+    return [mode for mode in PROFILE_MODES if mode in {m.strip().lower() for m in header.split(",")}]
+
+
+class RequestProfile:
+    def __init__(self, modes: List[str]):
+        self.id = uuid.uuid4().hex
+        self.modes = modes
+        self._profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        if "memory" in modes:
+            _start_tracing()
+
+    def start_thread(self) -> Optional[cProfile.Profile]:
+        if "cpu" not in self.modes:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            return None
+        return profiler
+
+    def stop_thread(self, profiler: cProfile.Profile):
+        profiler.disable()
+        with self._lock:
+            self._profilers.append(profiler)
+
+    def finish(self, method: str, path: str, seconds: float) -> str:
+        parts = [f"{method} {path} {seconds * 1000:.1f} ms, modes: {','.join(self.modes)}"]
+
+        if "cpu" in self.modes:
+            with self._lock:
+                profilers = list(self._profilers)
+            if profilers:
+                out = io.StringIO()
+                stats = pstats.Stats(profilers[0], stream=out)
+                for profiler in profilers[1:]:
+                    stats.add(profiler)
+                stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+                parts.append(out.getvalue())
+            else:
+                parts.append("No instrumented stage ran in a worker thread; nothing to profile.")
+
+        if "memory" in self.modes:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            _stop_tracing()
+            lines = [f"Peak traced memory: {peak / 2**20:.1f} MiB", f"Top {TOP_ALLOCATIONS} allocation sites:"]
+            lines += [f"  {stat}" for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]]
+            parts.append("\n".join(lines))
+
+        summary = "\n\n".join(parts)
+        with _profiles_lock:
+            _profiles[self.id] = summary
+            while len(_profiles) > PROFILE_HISTORY:
+                _profiles.popitem(last=False)
+        logger.info("Profile %s\n%s", self.id, summary)
+        return summary
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def _start_tracing():
+    global _tracing, _owns_tracing
+    with _tracing_lock:
+        if _tracing == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owns_tracing = True
+        else:
+            tracemalloc.reset_peak()
+        _tracing += 1
+
+
+def _stop_tracing():
+    global _tracing, _owns_tracing
+    with _tracing_lock:
+        _tracing -= 1
+        if _tracing == 0 and _owns_tracing:
+            tracemalloc.stop()
+            _owns_tracing = False
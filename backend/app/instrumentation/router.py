@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from .metrics import REGISTRY
+from .profiling import get_profile, profiling_enabled
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: str):
+    summary = get_profile(profile_id) if profiling_enabled() else None
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
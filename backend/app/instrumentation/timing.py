@@ -0,0 +1,81 @@
+"""
+Stage timing.
+
+`with stage("optimizer", "solve"):` records the block's duration in the
+stage histogram and, when it runs inside an HTTP request, in that
+request's timings (returned as the Server-Timing header). The request
+context is a contextvar, so it follows the request into run_in_threadpool
+and the sync endpoints' worker threads.
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from .metrics import SOLVER_ITERATIONS, STAGE_SECONDS
+
+
+class RequestContext:
+    """
+    Per-request stage durations (seconds, summed per stage) and optional profile.
+    """
+
+    def __init__(self, profile=None):
+        self.timings: Dict[str, float] = {}
+        self.profile = profile
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        with self._lock:
+            items = list(self.timings.items())
+        if total is not None:
+            items.append(("total", total))
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in items)
+
+
+current_request: ContextVar[Optional[RequestContext]] = ContextVar("current_request", default=None)
+
+# Stage nesting per thread: a CPU profile covers the outermost stage only
+_depth = threading.local()
+
+
+@contextmanager
+def stage(engine: str, name: str):
+    request = current_request.get()
+    profiler = None
+    depth = getattr(_depth, "value", 0)
+    if request is not None and request.profile is not None and depth == 0 and not _in_event_loop():
+        profiler = request.profile.start_thread()
+    _depth.value = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _depth.value = depth
+        if profiler is not None:
+            request.profile.stop_thread(profiler)
+        STAGE_SECONDS.observe(elapsed, engine=engine, stage=name)
+        if request is not None:
+            request.add(f"{engine}.{name}", elapsed)
+
+
+def observe_solver(backend: str, problem: str, result):
+    """
+    Records the iterations of a solvers.SolverResult.
+    """
+    SOLVER_ITERATIONS.observe(result.iterations, backend=backend, problem=problem, converged=str(bool(result.converged)).lower())
+
+
+def _in_event_loop() -> bool:
+    # Profiling the loop thread would also capture other requests' coroutines
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
@@ -1,7 +1,27 @@
-from fastapi import FastAPI
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from .instrumentation import InstrumentationMiddleware
 
-app = FastAPI(title="Portfolio Optimizer API", version="0.1.0")
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background HypeMeter scoring (kept off the import path so startup never waits on the network)
+    from .hypemeter.router import leaderboard
+    leaderboard.start()
+    yield
+    await leaderboard.stop()
+    await optimize_jobs.shutdown()
+    await get_tracking_stream().stop()
+    get_solve_executor().shutdown()
+
+app = FastAPI(title="Portfolio Optimizer API", version="0.1.0", lifespan=lifespan)
 
 # Allow CORS for frontend
 app.add_middleware(
@@ -10,30 +30,125 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id", "ETag"],
 )
+# Stage timings, request metrics and opt-in profiling (served on /metrics)
+app.add_middleware(InstrumentationMiddleware)
 
 @app.get("/")
-def health_check():
+async def health_check():
     return {"status": "ok", "message": "Portfolio Optimizer API is running"}
 
-from .core.optimization import PortfolioOptimizer, OptimizationRequest, OptimizationResult
+from typing import List
+from .core.optimization import PortfolioOptimizer, OptimizationRequest, OptimizationResult, BatchOptimizationRequest, BatchOptimizationResult, FrontierRequest, FrontierResult
+from .core.execution import get_solve_executor
+from .core.jobs import OptimizationJobs, OptimizationJob, JobQueueFull
+from .tracking.stream import get_tracking_stream
 from .hypemeter.router import router as hypemeter_router
 from .tracking.router import router as tracking_router
+from .data.router import router as data_router, tickers_router
+from .backtest.router import router as backtest_router
+from .instrumentation.router import router as metrics_router
+from .data.defaults import get_async_provider
 
 app.include_router(hypemeter_router)
 app.include_router(tracking_router)
+app.include_router(data_router)
+app.include_router(tickers_router)
+app.include_router(backtest_router)
+app.include_router(metrics_router)
+
+# Async optimization jobs (POST /optimize/jobs): state shared by all workers in SQLite, each job runs in the process that accepted it
+optimize_jobs = OptimizationJobs()
+
+def etag_response(result, if_none_match: Optional[str]) -> Response:
+    """
+    JSON response with a strong ETag of its body, or 304 Not Modified when
+    the client's If-None-Match already has it.
+    """
+    body = result.model_dump_json()
+    etag = '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 @app.post("/optimize", response_model=OptimizationResult)
-def optimize_portfolio(request: OptimizationRequest):
+async def optimize_portfolio(request: OptimizationRequest, if_none_match: Optional[str] = Header(None)):
     optimizer = PortfolioOptimizer()
     try:
-        return optimizer.optimize_portfolio(request)
+        # Screen (SQLite) and solve off the event loop; fetch without holding a threadpool worker
+        tickers = await run_in_threadpool(optimizer.screen_tickers, request.tickers)
+        prices = await get_async_provider().get_historical_prices(tickers) if tickers else None
+        result = await run_in_threadpool(optimizer.optimize_portfolio, request, prices)
+        return etag_response(result, if_none_match)
     except ValueError as e:
         # User error (invalid tickers, empty list)
-        from fastapi import HTTPException
         raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Market data request timed out")
     except Exception as e:
         # Unexpected error
-        from fastapi import HTTPException
-        print(f"Optimization Error: {e}")
+        logger.exception("Optimization Error: %s", e)
         raise HTTPException(status_code=500, detail="Internal Optimization Error")
+
+@app.post("/optimize/batch", response_model=List[BatchOptimizationResult])
+async def optimize_portfolio_batch(request: BatchOptimizationRequest):
+    optimizer = PortfolioOptimizer()
+    try:
+        universe = await run_in_threadpool(optimizer.batch_universe, request.requests)
+        prices = await get_async_provider().get_historical_prices(universe) if universe else None
+        return await run_in_threadpool(optimizer.optimize_many, request.requests, prices)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Market data request timed out")
+    except Exception as e:
+        logger.exception("Batch Optimization Error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal Optimization Error")
+
+@app.post("/optimize/frontier", response_model=FrontierResult)
+async def optimize_frontier(request: FrontierRequest):
+    optimizer = PortfolioOptimizer()
+    try:
+        tickers = await run_in_threadpool(optimizer.screen_tickers, request.tickers)
+        prices = await get_async_provider().get_historical_prices(tickers) if tickers else None
+        return await run_in_threadpool(optimizer.efficient_frontier, request, prices)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Market data request timed out")
+    except Exception as e:
+        logger.exception("Frontier Error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal Optimization Error")
+
+@app.post("/optimize/jobs", response_model=OptimizationJob, status_code=202)
+async def submit_optimization_job(request: OptimizationRequest):
+    """
+    Queues an optimization and returns its job right away; poll
+    GET /optimize/jobs/{id} for the result.
+    """
+    if not request.tickers:
+        raise HTTPException(status_code=400, detail="No tickers provided for optimization")
+    try:
+        return await optimize_jobs.submit(request)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+@app.get("/optimize/jobs", response_model=dict)
+async def get_optimization_job_stats():
+    return {"jobs": await optimize_jobs.stats(), "executor": get_solve_executor().stats()}
+
+@app.get("/optimize/jobs/{job_id}", response_model=OptimizationJob)
+async def get_optimization_job(job_id: str):
+    job = await optimize_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.delete("/optimize/jobs/{job_id}", response_model=OptimizationJob)
+async def cancel_optimization_job(job_id: str):
+    job = await optimize_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
@@ -0,0 +1,78 @@
+"""
+Shape-preserving downsampling for chart series.
+
+Both functions take the y values of an evenly ordered series and return
+the sorted positions of the points to keep (first and last always kept),
+so the same selection can be applied to any aligned array (dates,
+benchmark, ...).
+"""
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb(y: np.ndarray, max_points: int, x: np.ndarray = None) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets (Steinarsson, 2013).
+
+    Keeps the point of each bucket that forms the largest triangle with the
+    previously kept point and the average of the next bucket, which keeps
+    peaks and troughs that plain resampling averages away.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if max_points >= n or n <= 2:
+        return np.arange(n)
+    if max_points < 3:
+        raise ValueError("max_points must be at least 3")
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+
+    # Interior points split into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    keep = np.empty(max_points, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        if b + 2 < len(edges):
+            nxt = slice(hi, edges[b + 2])
+            cx, cy = x[nxt].mean(), y[nxt].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[b + 1] = a
+    return keep
+
+
+def minmax(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Keeps the minimum and maximum of each of max_points // 2 buckets, so
+    every drawdown trough and spike in the original series survives.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if max_points >= n or n <= 2:
+        return np.arange(n)
+    if max_points < 4:
+        raise ValueError("max_points must be at least 4 for minmax")
+
+    # Reserve the endpoints, then two points per bucket
+    buckets = (max_points - 2) // 2
+    edges = np.linspace(1, n - 1, buckets + 1).astype(int)
+    keep = [0, n - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            seg = y[lo:hi]
+            keep.append(lo + int(np.nanargmin(seg)) if not np.all(np.isnan(seg)) else lo)
+            keep.append(lo + int(np.nanargmax(seg)) if not np.all(np.isnan(seg)) else hi - 1)
+    return np.unique(keep)
+
+
+def downsample(y: np.ndarray, max_points: int, method: str = "lttb") -> np.ndarray:
+    if method == "lttb":
+        return lttb(y, max_points)
+    if method == "minmax":
+        return minmax(y, max_points)
+    raise ValueError(f"Unknown downsampling method: {method}")
@@ -1,14 +1,85 @@
-from typing import List
+from datetime import date
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
 import pandas as pd
+from scipy import sparse
+from ..core.allocation import allocate
 from ..data.adapter import MarketDataProvider
-from ..data.yahoo_adapter import YahooFinanceProvider
-from .models import Holding, TrackingResult, PerformancePoint
+from ..data.defaults import get_default_provider, get_ticker_metadata
+from ..data.metadata import TickerMetadataService
+from ..data.panel import ReturnsPanel
+from ..instrumentation import stage
+from ..data.periods import PERIOD_DAYS, period_covering
+from .downsample import METHODS as DOWNSAMPLE_METHODS, downsample as downsample_positions
+from .models import Holding, PortfolioRequest, TrackingResult, PerformancePoint, ChartSeries, RebalanceOrder, RebalanceResult, BatchTrackingResult
+
+BENCHMARK_TICKER = "SPY"
+
+# Default minimum order size for rebalancing ($)
+MIN_TRADE_VALUE = 10.0
+
+# Accounts valued per sparse-dense product in analyze_many
+ACCOUNT_CHUNK = 256
+
+def value_holdings(latest: np.ndarray, shares: np.ndarray, avg_cost: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Per-holding price (cost when unpriced), market value, cost basis, gain/loss
+    and gain/loss % for latest prices (NaN = unpriced).
+    """
+    price = np.where(np.isnan(latest), avg_cost, latest)
+    market_value = np.round(price * shares, 2)
+    cost_basis = avg_cost * shares
+    gain_loss = np.round(market_value - cost_basis, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain_loss_pct = np.where(cost_basis > 0, np.round(gain_loss / cost_basis, 4), 0.0)
+    return price, market_value, cost_basis, gain_loss, gain_loss_pct
 
 class TrackingEngine:
-    def __init__(self, provider: MarketDataProvider = YahooFinanceProvider()):
-        self.provider = provider
+    def __init__(self, provider: MarketDataProvider = None, metadata: Optional[TickerMetadataService] = None):
+        self.provider = provider or get_default_provider()
+        self.metadata = metadata or (get_ticker_metadata() if provider is None else None)
+
+    def fetchable(self, tickers: List[str]) -> List[str]:
+        """
+        `tickers` without the ones known to be invalid or delisted. Those are
+        never fetched; they come back unpriced (valued at cost, unresolved
+        when rebalancing), as they would from the upstream.
+        """
+        if self.metadata is None or not tickers:
+            return list(tickers)
+        invalid = set(self.metadata.known_invalid(tickers))
+        return [t for t in tickers if t not in invalid]
+
+    @staticmethod
+    def chart_period(start: Optional[date] = None) -> str:
+        """
+        History to fetch for a chart starting at `start` (at least 1y, so
+        default requests share the cached 1y series).
+        """
+        if start is None:
+            return "1y"
+        period = period_covering((date.today() - start).days + 1)
+        return period if (PERIOD_DAYS[period] or float("inf")) > PERIOD_DAYS["1y"] else "1y"
+
+    def analyze_portfolio(self, holdings: List[Holding], hist_data: Optional[pd.DataFrame] = None,
+                          start: Optional[date] = None, end: Optional[date] = None, max_points: Optional[int] = None,
+                          downsample: str = "lttb", columnar: bool = False) -> TrackingResult:
+        """
+        hist_data: prices (DataFrame or ReturnsPanel) for the held tickers plus
+        SPY covering chart_period(start), if the caller already fetched it.
+        Fetched here otherwise.
+
+        The chart covers [start, end] (default: all of hist_data). With
+        max_points the daily series is downsampled shape-preservingly
+        (see downsample.py); otherwise it is sampled weekly.
+        """
+        if max_points is not None and max_points < 3:
+            raise ValueError("max_points must be at least 3")
+        if downsample not in DOWNSAMPLE_METHODS:
+            raise ValueError(f"Unknown downsampling method: {downsample}")
+        if start is not None and end is not None and start > end:
+            raise ValueError("start must not be after end")
 
-    def analyze_portfolio(self, holdings: List[Holding]) -> TrackingResult:
         if not holdings:
             return TrackingResult(
                 total_value=0, total_gain_loss=0, total_gain_loss_pct=0, 
@@ -16,134 +87,256 @@ class TrackingEngine:
             )
 
         tickers = [h.ticker for h in holdings]
-        # Get Current Data
-        # For efficiency, we really should have a multi-ticker fetcher.
-        # YahooAdapter's get_historical_prices works for this.
         
+        # We'll fetch the chart window (1y by default) to do both valuation and charting
+        if hist_data is None:
+            hist_data = self._fetch(self.fetchable(tickers + [BENCHMARK_TICKER]), self.chart_period(start))
+
+        # One aligned panel (dates x holdings, then SPY). Forward-fill so dates that
+        # only exist for some tickers (e.g. crypto weekends) don't break the sums.
+        panel = ReturnsPanel.coerce(hist_data).reindex(tickers + [BENCHMARK_TICKER]).ffill()
+        shares = np.array([h.shares for h in holdings], dtype=float)
+        avg_cost = np.array([h.avg_cost for h in holdings], dtype=float)
+
         # 1. Current Valuation
-        # We'll fetch last 1 year to do both valuation and charting
-        hist_data = self.provider.get_historical_prices(tickers + ['SPY'], period="1y")
-        latest_prices = hist_data.iloc[-1]
-        
-        total_value = 0.0
-        total_cost = 0.0
-        
+        price, market_value, cost_basis, gain_loss, gain_loss_pct = value_holdings(panel.latest().to_numpy()[:-1], shares, avg_cost)
+
         updated_holdings = []
-        
-        for h in holdings:
-            if h.ticker in latest_prices:
-                price = latest_prices[h.ticker]
-            else:
-                price = h.avg_cost # Fallback
-            
-            h.current_price = round(price, 2)
-            h.market_value = round(price * h.shares, 2)
-            cost_basis = h.avg_cost * h.shares
-            h.gain_loss = round(h.market_value - cost_basis, 2)
-            h.gain_loss_pct = round(h.gain_loss / cost_basis, 4) if cost_basis > 0 else 0
-            
-            total_value += h.market_value
-            total_cost += cost_basis
+        for i, h in enumerate(holdings):
+            h.current_price = round(float(price[i]), 2)
+            h.market_value = float(market_value[i])
+            h.gain_loss = float(gain_loss[i])
+            h.gain_loss_pct = float(gain_loss_pct[i])
             updated_holdings.append(h)
-            
+
+        total_value = float(market_value.sum())
+        total_cost = float(cost_basis.sum())
         total_gain = total_value - total_cost
         total_gain_pct = total_gain / total_cost if total_cost > 0 else 0
 
-        # 2. Charting (Backcast: "If I held this portfolio for the last year")
-        # Normalize: Start at 100
-        chart_data = []
-        
-        # Calculate daily portfolio value
-        # Portfolio series = sum(shares * price_series)
-        pf_series = pd.Series(0, index=hist_data.index)
-        
-        for h in holdings:
-            if h.ticker in hist_data.columns:
-                pf_series += hist_data[h.ticker] * h.shares
-        
-        # Benchmark (SPY) scaling
-        spy_series = hist_data['SPY']
-        
-        # Normalize both to start at the same value (e.g. initial portfolio value)
-        start_val = pf_series.iloc[0]
-        spy_start = spy_series.iloc[0]
-        
-        if start_val > 0:
-            scale_factor = start_val / spy_start
-            scaled_spy = spy_series * scale_factor
-        else:
-            scaled_spy = spy_series # Fallback
-            
-        # Downsample for chart (weekly)
-        resampled_pf = pf_series.resample('W').last()
-        resampled_spy = scaled_spy.resample('W').last()
-        
-        for date, val in resampled_pf.items():
-            spy_val = resampled_spy.loc[date] if date in resampled_spy.index else 0
-            chart_data.append(PerformancePoint(
-                date=date.strftime("%Y-%m-%d"),
-                portfolio_value=round(val, 2),
-                benchmark_value=round(spy_val, 2)
-            ))
+        # 2. Charting (Backcast: "If I held this portfolio over the window")
+        # Portfolio series = price panel x shares vector, over the chart window
+        window = panel.window(start, end)
+        pf_values = np.nan_to_num(window.prices[:, :-1]) @ shares
+        spy = window.prices[:, -1]
+        chart_data, chart = self._chart(window.index, pf_values, spy, max_points, downsample, columnar)
 
         return TrackingResult(
             total_value=round(total_value, 2),
             total_gain_loss=round(total_gain, 2),
             total_gain_loss_pct=round(total_gain_pct, 4),
             holdings=updated_holdings,
-            chart_data=chart_data
+            chart_data=chart_data,
+            chart=chart
         )
 
-    def generate_rebalancing_orders(self, holdings: List[Holding], target_weights: dict, investment_amount: float = 0.0) -> List[dict]:
+    @stage("tracking", "fetch")
+    def _fetch(self, tickers: List[str], period: str) -> pd.DataFrame:
+        return self.provider.get_historical_prices(tickers, period=period)
+
+    @staticmethod
+    def _weekly_positions(index: pd.DatetimeIndex) -> pd.Series:
+        # Position of the last bar of each week, labelled by week end (like resample('W').last())
+        if len(index) == 0:
+            return pd.Series(dtype=int)
+        return pd.Series(np.arange(len(index)), index=index).resample('W').last().dropna().astype(int)
+
+    @stage("tracking", "chart")
+    def _chart(self, index: pd.DatetimeIndex, pf_values: np.ndarray, spy: np.ndarray, max_points: Optional[int],
+               method: str, columnar: bool) -> Tuple[List[PerformancePoint], Optional[ChartSeries]]:
+        if len(pf_values) == 0:
+            return [], (ChartSeries(dates=[], portfolio=[], benchmark=[]) if columnar else None)
+
+        # Benchmark (SPY) scaling
+        # Normalize both to start at the same value (e.g. initial portfolio value)
+        start_val, spy_start = pf_values[0], spy[0]
+        if start_val > 0 and spy_start > 0:
+            scaled_spy = spy * (start_val / spy_start)
+        else:
+            scaled_spy = spy # Fallback
+
+        # Downsample for chart: shape-preserving when max_points is given, weekly otherwise
+        if max_points is not None:
+            pos = downsample_positions(pf_values, max_points, method)
+            labels = index[pos].strftime("%Y-%m-%d").tolist()
+        else:
+            weekly = self._weekly_positions(index)
+            pos = weekly.to_numpy()
+            labels = weekly.index.strftime("%Y-%m-%d").tolist()
+
+        portfolio = np.round(pf_values[pos], 2).tolist()
+        benchmark = np.round(np.nan_to_num(scaled_spy[pos]), 2).tolist()
+        if columnar:
+            return [], ChartSeries(dates=labels, portfolio=portfolio, benchmark=benchmark)
+        return [
+            PerformancePoint(date=d, portfolio_value=v, benchmark_value=b)
+            for d, v, b in zip(labels, portfolio, benchmark)
+        ], None
+
+    @staticmethod
+    def batch_universe(portfolios: List[PortfolioRequest]) -> List[str]:
+        """
+        Union of all held tickers (first-seen order) plus the benchmark.
+        """
+        tickers = dict.fromkeys(h.ticker for p in portfolios for h in p.holdings)
+        tickers[BENCHMARK_TICKER] = None
+        return list(tickers)
+
+    def analyze_many(self, portfolios: List[PortfolioRequest], hist_data: Optional[pd.DataFrame] = None, chunk_size: int = ACCOUNT_CHUNK) -> Iterator[BatchTrackingResult]:
+        """
+        Values many accounts against one shared price panel.
+
+        Holdings become a sparse accounts x tickers share matrix, so the
+        backcast series of a whole chunk of accounts is one sparse-dense
+        product with the (tickers x dates) panel. Results are yielded one
+        account at a time and only `chunk_size` accounts' series are held in
+        memory, so callers can stream them.
+        """
+        universe = self.batch_universe(portfolios)
+        if hist_data is None:
+            hist_data = self._fetch(self.fetchable(universe), "1y")
+
+        # 1. Shared panel and weekly sample points (same as the single-account chart)
+        col = {t: i for i, t in enumerate(universe)}
+        panel = ReturnsPanel.coerce(hist_data).reindex(universe).ffill()
+        index = panel.index
+        prices_t = np.nan_to_num(panel.prices).T # tickers x dates
+        latest = panel.latest().to_numpy()
+        spy = panel.column_values(BENCHMARK_TICKER)
+        weekly = self._weekly_positions(index)
+        week_pos = weekly.to_numpy()
+        week_labels = [d.strftime("%Y-%m-%d") for d in weekly.index]
+
+        for start in range(0, len(portfolios), chunk_size):
+            chunk = portfolios[start:start + chunk_size]
+            try:
+                yield from self._analyze_chunk(start, chunk, col, prices_t, latest, spy, week_pos, week_labels)
+            except Exception as e:
+                for i, p in enumerate(chunk):
+                    yield BatchTrackingResult(index=start + i, account_id=p.account_id, error=str(e))
+
+    def _analyze_chunk(self, offset: int, chunk: List[PortfolioRequest], col: dict, prices_t: np.ndarray, latest: np.ndarray,
+                       spy: np.ndarray, week_pos: np.ndarray, week_labels: List[str]) -> Iterator[BatchTrackingResult]:
+        # 1. Flatten holdings into COO triplets
+        rows = np.array([r for r, p in enumerate(chunk) for _ in p.holdings], dtype=int)
+        cols = np.array([col[h.ticker] for p in chunk for h in p.holdings], dtype=int)
+        shares = np.array([h.shares for p in chunk for h in p.holdings], dtype=float)
+        avg_cost = np.array([h.avg_cost for p in chunk for h in p.holdings], dtype=float)
+        n = len(chunk)
+
+        # 2. Per-holding valuation (fallback to cost when unpriced), totals per account
+        price, market_value, cost_basis, gain_loss, gain_loss_pct = value_holdings(latest[cols], shares, avg_cost)
+        total_value = np.bincount(rows, weights=market_value, minlength=n)
+        total_cost = np.bincount(rows, weights=cost_basis, minlength=n)
+
+        # 3. Backcast series for the whole chunk: (accounts x tickers) @ (tickers x dates)
+        holdings = sparse.csr_matrix((shares, (rows, cols)), shape=(n, prices_t.shape[0]))
+        values = np.asarray(holdings @ prices_t) # accounts x dates
+        pf_weekly = values[:, week_pos]
+        if len(spy) and spy[0] > 0:
+            start_val = values[:, 0]
+            scale = np.where(start_val > 0, start_val / spy[0], 1.0)
+            spy_weekly = np.nan_to_num(np.outer(scale, spy[week_pos]))
+        else:
+            spy_weekly = np.nan_to_num(np.broadcast_to(spy[week_pos], pf_weekly.shape))
+
+        k = 0
+        for r, p in enumerate(chunk):
+            updated = []
+            for h in p.holdings:
+                h.current_price = round(float(price[k]), 2)
+                h.market_value = float(market_value[k])
+                h.gain_loss = float(gain_loss[k])
+                h.gain_loss_pct = float(gain_loss_pct[k])
+                updated.append(h)
+                k += 1
+
+            if not updated:
+                result = TrackingResult(total_value=0, total_gain_loss=0, total_gain_loss_pct=0, holdings=[], chart_data=[])
+            else:
+                total = round(float(total_value[r]), 2)
+                gain = float(total_value[r] - total_cost[r])
+                result = TrackingResult(
+                    total_value=total,
+                    total_gain_loss=round(gain, 2),
+                    total_gain_loss_pct=round(gain / total_cost[r], 4) if total_cost[r] > 0 else 0,
+                    holdings=updated,
+                    chart_data=[
+                        PerformancePoint(date=d, portfolio_value=round(v, 2), benchmark_value=round(b, 2))
+                        for d, v, b in zip(week_labels, pf_weekly[r].tolist(), spy_weekly[r].tolist())
+                    ]
+                )
+            yield BatchTrackingResult(index=offset + r, account_id=p.account_id, result=result)
+
+    def generate_rebalancing_orders(self, holdings: List[Holding], target_weights: dict, investment_amount: float = 0.0, prices: Optional[pd.DataFrame] = None,
+                                    allocation_mode: str = "fast", fractional: bool = True, lot_sizes: Optional[dict] = None,
+                                    min_trade: float = MIN_TRADE_VALUE, cost_per_trade: float = 0.0, cost_rate: float = 0.0) -> RebalanceResult:
         """
         Generates buy/sell orders to match target weights.
         investment_amount: Extra cash to inject (DCA logic) - Optional, default 0.
+        prices: Optional prefetched recent prices for held + target tickers.
+
+        Latest prices for all held and target tickers come from one fetch and
+        share counts come from the shared discrete allocator (lot sizes,
+        fractional shares, minimum trade size and costs). Held tickers that
+        are not targets are sold. Target tickers without a usable price are
+        returned in `unresolved` (no order is made).
         """
-        # 1. Calculate Current Equity
-        current_data = self.analyze_portfolio(holdings)
-        total_equity = current_data.total_value + investment_amount
-        
+        lot_sizes = lot_sizes or {}
+        held = [h.ticker for h in holdings]
+        targets = list(target_weights)
+        tickers = list(dict.fromkeys(held + targets))
+        if not tickers:
+            return RebalanceResult(orders=[], unresolved=[])
+
+        # 1. Latest prices for the union, one fetch
+        if prices is None:
+            fetch = self.fetchable(tickers)
+            prices = self._fetch(fetch, "5d") if fetch else pd.DataFrame()
+        latest = ReturnsPanel.coerce(prices).reindex(tickers).ffill().latest().to_numpy()
+        resolved = np.isfinite(latest) & (latest > 0)
+
+        # 2. Current positions on the union axis (duplicate holdings are summed)
+        col = {t: i for i, t in enumerate(tickers)}
+        shares = np.zeros(len(tickers))
+        cost_value = np.zeros(len(tickers))
+        for h in holdings:
+            shares[col[h.ticker]] += h.shares
+            cost_value[col[h.ticker]] += h.shares * h.avg_cost
+
+        # Unpriced holdings count at cost towards equity (as in analyze_portfolio) but can't be traded
+        current_val = np.where(resolved, shares * np.where(resolved, latest, 0.0), cost_value)
+        total_equity = current_val.sum() + investment_amount
         if total_equity == 0:
-            return []
+            return RebalanceResult(orders=[], unresolved=[])
 
-        orders = []
-        
-        # 2. Iterate Targets
-        for ticker, target_pct in target_weights.items():
-            target_val = total_equity * target_pct
-            
-            # Find current val
-            current_val = 0
-            current_price = 0
-            
-            # Check existing holdings
-            existing = next((h for h in current_data.holdings if h.ticker == ticker), None)
-            if existing:
-                current_val = existing.market_value
-                current_price = existing.current_price
-            else:
-                # Fetch price if not held
-                # MVP: inefficient single fetch, optimizing later
-                try:
-                    price_frame = self.provider.get_historical_prices([ticker], period="1d")
-                    if not price_frame.empty:
-                        current_price = float(price_frame.iloc[-1][ticker])
-                except:
-                    current_price = 100.0 # fallback
-            
-            diff = target_val - current_val
-            
-            # Threshold to avoid trivial trades ($10)
-            if abs(diff) > 10 and current_price > 0:
-                action = "BUY" if diff > 0 else "SELL"
-                shares = round(abs(diff) / current_price, 2)
-                
-                orders.append({
-                    "ticker": ticker,
-                    "action": action,
-                    "shares": shares,
-                    "value": round(abs(diff), 2),
-                    "price": round(current_price, 2)
-                })
-        
-        return orders
+        # 3. Allocate the tradable budget across every priced ticker (non-targets get 0)
+        weights = np.array([target_weights.get(t, 0.0) for t in tickers], dtype=float)
+        idx = np.nonzero(resolved)[0]
+        with stage("tracking", "allocate"):
+            allocation = allocate(
+                total_equity * weights[idx],
+                latest[idx],
+                current_val[idx].sum() + investment_amount,
+                current=shares[idx],
+                lot_sizes=np.array([lot_sizes.get(tickers[i], 1.0) for i in idx]),
+                fractional=np.array([fractional and tickers[i] not in lot_sizes for i in idx], dtype=bool),
+                min_trade=min_trade,
+                cost_per_trade=cost_per_trade,
+                cost_rate=cost_rate,
+                mode=allocation_mode
+            )
+        trade = allocation.shares - shares[idx]
+
+        orders = [
+            RebalanceOrder(
+                ticker=tickers[i],
+                action="BUY" if t > 0 else "SELL",
+                shares=round(float(abs(t)), 4),
+                value=round(float(abs(t) * latest[i]), 2),
+                price=round(float(latest[i]), 2)
+            )
+            for i, t in zip(idx, trade) if abs(t) > 1e-9
+        ]
+        unresolved = [t for t in targets if not resolved[col[t]]]
+        return RebalanceResult(orders=orders, unresolved=unresolved, leftover_cash=allocation.leftover_cash, costs=allocation.costs)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import date
 
 class Holding(BaseModel):
@@ -13,20 +13,64 @@ class Holding(BaseModel):
 
 class PortfolioRequest(BaseModel):
     holdings: List[Holding]
+    account_id: Optional[str] = None # Echoed back by /tracking/analyze/batch
+    # Chart options (/tracking/analyze only; the batch endpoint always charts 1y weekly)
+    start: Optional[date] = None # Default: one year back
+    end: Optional[date] = None # Default: latest bar
+    max_points: Optional[int] = None # Downsample daily bars to at most this many points (default: weekly bars)
+    downsample: str = "lttb" # "lttb" or "minmax"
+    columnar: bool = False # Return `chart` (parallel arrays) instead of `chart_data`
+
+class BatchPortfolioRequest(BaseModel):
+    portfolios: List[PortfolioRequest]
 
 class RebalanceRequest(BaseModel):
     holdings: List[Holding]
     target_weights: dict # {"AAPL": 0.5, "BND": 0.5}
     investment_amount: Optional[float] = 0.0
+    # Discrete allocation settings (see app/core/allocation.py)
+    allocation_mode: str = "fast" # "fast" or "exact"
+    fractional: bool = True # Trade in 0.01 shares unless a lot size is given
+    lot_sizes: Dict[str, float] = {} # Ticker -> shares per lot (e.g. {"BND": 1} for whole shares)
+    min_trade: float = 10.0 # Skip trades smaller than this ($); $10 as before this field existed
+    cost_per_trade: float = 0.0 # Fixed cost per order ($)
+    cost_rate: float = 0.0 # Proportional cost (0.001 = 10 bps of traded value)
 
 class PerformancePoint(BaseModel):
     date: str # YYYY-MM-DD
     portfolio_value: float
     benchmark_value: float # Normalized to portfolio start value
 
+class ChartSeries(BaseModel):
+    # Columnar chart: parallel arrays, much smaller to build and serialize than points
+    dates: List[str]
+    portfolio: List[float]
+    benchmark: List[float]
+
 class TrackingResult(BaseModel):
     total_value: float
     total_gain_loss: float
     total_gain_loss_pct: float
     holdings: List[Holding]
     chart_data: List[PerformancePoint] = []
+    chart: Optional[ChartSeries] = None
+
+class RebalanceOrder(BaseModel):
+    ticker: str
+    action: str # "BUY", "SELL"
+    shares: float
+    value: float
+    price: float
+
+class RebalanceResult(BaseModel):
+    orders: List[RebalanceOrder]
+    unresolved: List[str] = [] # Target tickers with no usable price (no order generated)
+    leftover_cash: float = 0.0 # Cash left after all orders and costs
+    costs: float = 0.0 # Total trading costs
+
+class BatchTrackingResult(BaseModel):
+    # One NDJSON line of /tracking/analyze/batch
+    index: int # Position in the request
+    account_id: Optional[str] = None
+    result: Optional[TrackingResult] = None
+    error: Optional[str] = None
@@ -1,26 +1,129 @@
-from fastapi import APIRouter, HTTPException
-from .models import PortfolioRequest, TrackingResult, RebalanceRequest
+import asyncio
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from .models import PortfolioRequest, BatchPortfolioRequest, TrackingResult, RebalanceRequest, RebalanceResult
 from .engine import TrackingEngine
+from .stream import MAX_STREAM_HOLDINGS, StreamRequest, Subscription, get_tracking_stream
+from ..data.defaults import get_async_provider
 
 router = APIRouter(prefix="/tracking", tags=["tracking"])
 
 @router.post("/analyze", response_model=TrackingResult)
-def analyze_portfolio(request: PortfolioRequest):
+async def analyze_portfolio(request: PortfolioRequest):
     engine = TrackingEngine()
     try:
-        return engine.analyze_portfolio(request.holdings)
+        hist_data = None
+        if request.holdings:
+            tickers = await run_in_threadpool(engine.fetchable, [h.ticker for h in request.holdings] + ['SPY'])
+            hist_data = await get_async_provider().get_historical_prices(tickers, period=engine.chart_period(request.start))
+        return await run_in_threadpool(
+            engine.analyze_portfolio,
+            request.holdings,
+            hist_data,
+            request.start,
+            request.end,
+            request.max_points,
+            request.downsample,
+            request.columnar
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Market data request timed out")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/analyze/batch")
+async def analyze_portfolio_batch(request: BatchPortfolioRequest):
+    """
+    Values many accounts from one shared price fetch. Streams one
+    BatchTrackingResult per line (NDJSON), in request order.
+    """
+    engine = TrackingEngine()
+    try:
+        universe = await run_in_threadpool(engine.fetchable, engine.batch_universe(request.portfolios))
+        hist_data = await get_async_provider().get_historical_prices(universe, period="1y")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Market data request timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/rebalance")
-def rebalance_portfolio(request: RebalanceRequest):
+    # Sync generator: Starlette iterates it in the threadpool
+    lines = (item.model_dump_json() + "\n" for item in engine.analyze_many(request.portfolios, hist_data))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+@router.post("/rebalance", response_model=RebalanceResult)
+async def rebalance_portfolio(request: RebalanceRequest):
     engine = TrackingEngine()
     try:
-        orders = engine.generate_rebalancing_orders(
+        # One fetch of recent prices covering held and target tickers
+        tickers = await run_in_threadpool(engine.fetchable, list(dict.fromkeys([h.ticker for h in request.holdings] + list(request.target_weights))))
+        prices = await get_async_provider().get_historical_prices(tickers, period="5d") if tickers else None
+        return await run_in_threadpool(
+            engine.generate_rebalancing_orders,
             request.holdings,
             request.target_weights,
-            request.investment_amount
+            request.investment_amount,
+            prices,
+            allocation_mode=request.allocation_mode,
+            fractional=request.fractional,
+            lot_sizes=request.lot_sizes,
+            min_trade=request.min_trade,
+            cost_per_trade=request.cost_per_trade,
+            cost_rate=request.cost_rate
         )
-        return {"orders": orders}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Market data request timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.websocket("/stream")
+async def stream_valuations(websocket: WebSocket):
+    """
+    Live valuations. The client sends {"holdings": [...]} to subscribe (and
+    again to replace them); the server pushes a StreamUpdate snapshot, then
+    deltas with only the holdings whose price or market value changed.
+    Invalid messages get {"type": "error", "detail": ...} and are ignored.
+    """
+    await websocket.accept()
+    stream = get_tracking_stream()
+    subscription = None
+    sender = None
+    try:
+        while True:
+            try:
+                request = StreamRequest.model_validate(await websocket.receive_json())
+                if len(request.holdings) > MAX_STREAM_HOLDINGS:
+                    raise ValueError(f"At most {MAX_STREAM_HOLDINGS} holdings per stream")
+            except (ValidationError, ValueError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            if subscription is None:
+                subscription = stream.subscribe(request.holdings)
+                sender = asyncio.create_task(_send_updates(websocket, subscription))
+            else:
+                stream.replace(subscription, request.holdings)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if sender is not None:
+            sender.cancel()
+        if subscription is not None:
+            stream.unsubscribe(subscription)
+
+@router.get("/stream/stats")
+async def get_stream_stats():
+    return get_tracking_stream().stats()
+
+async def _send_updates(websocket: WebSocket, subscription: Subscription):
+    stream = get_tracking_stream()
+    while True:
+        await subscription.changed.wait()
+        subscription.changed.clear()
+        update = subscription.update(stream.prices, stream.as_of)
+        if update is not None:
+            await websocket.send_text(update.model_dump_json())
@@ -0,0 +1,235 @@
+"""
+Live valuations pushed to /tracking/stream subscribers.
+
+One poller refreshes the latest prices of the union of every subscriber's
+tickers with a single upstream call every `interval` seconds, then wakes
+only the subscribers holding a ticker whose price moved. Each subscriber
+gets a full snapshot first and afterwards only the holdings whose
+valuation changed since the last message it was sent, so upstream load
+grows with the number of distinct tickers, not with the number of
+connected clients. The poller only runs while someone is subscribed.
+A subscriber's first snapshot waits until a poll has covered all of its
+tickers (or they are known to be invalid), so it never values holdings
+at cost for want of a poll.
+"""
+import asyncio
+import logging
+import os
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from ..data.adapter import AsyncMarketDataProvider
+from ..data.async_adapter import ExecutorAsyncProvider
+from ..data.defaults import get_coalescing_provider, get_ticker_metadata
+from ..data.metadata import TickerMetadataService
+from ..data.panel import ReturnsPanel
+from .engine import value_holdings
+from .models import Holding
+
+logger = logging.getLogger(__name__)
+
+# Bars fetched per poll: enough for a last close over weekends and holidays
+POLL_PERIOD = "5d"
+
+# Holdings per subscription
+MAX_STREAM_HOLDINGS = 1000
+
+
+class StreamRequest(BaseModel):
+    # Sent by the client to subscribe, and again to replace its holdings
+    holdings: List[Holding]
+
+
+class StreamHolding(BaseModel):
+    index: int # Position in the subscribed holdings
+    ticker: str
+    current_price: Optional[float] = None # None until the ticker has been priced (valued at cost meanwhile)
+    market_value: float
+    gain_loss: float
+    gain_loss_pct: float
+
+
+class StreamUpdate(BaseModel):
+    type: str # "snapshot" (every holding) or "delta" (changed holdings only)
+    as_of: Optional[float] = None # Unix time of the poll the prices come from
+    holdings: List[StreamHolding]
+    total_value: float
+    total_gain_loss: float
+    total_gain_loss_pct: float
+
+
+class Subscription:
+    """
+    One client's holdings and what it was last sent. Updates coalesce: a
+    slow client skips intermediate polls instead of queueing them.
+    """
+
+    def __init__(self, holdings: List[Holding]):
+        self.changed = asyncio.Event()
+        self.replace(holdings)
+
+    def replace(self, holdings: List[Holding]):
+        self.holdings = holdings
+        self.tickers: Set[str] = {h.ticker for h in holdings}
+        self._shares = np.array([h.shares for h in holdings], dtype=float)
+        self._avg_cost = np.array([h.avg_cost for h in holdings], dtype=float)
+        self._sent: Optional[np.ndarray] = None # (holdings x [price, market value]) last pushed
+        self.changed.clear() # The stream wakes it once its tickers are polled
+
+    @property
+    def awaiting_snapshot(self) -> bool:
+        return self._sent is None
+
+    def update(self, prices: Dict[str, float], as_of: Optional[float]) -> Optional[StreamUpdate]:
+        """
+        The message to push for the current prices: a snapshot the first time
+        (and after replace), then the changed holdings, or None if nothing changed.
+        """
+        latest = np.array([prices.get(h.ticker, np.nan) for h in self.holdings], dtype=float)
+        price, market_value, cost_basis, gain_loss, gain_loss_pct = value_holdings(latest, self._shares, self._avg_cost)
+        state = np.column_stack([np.round(np.where(np.isnan(latest), -1.0, latest), 2), market_value])
+
+        if self._sent is None:
+            kind, rows = "snapshot", np.arange(len(self.holdings))
+        else:
+            kind, rows = "delta", np.flatnonzero((state != self._sent).any(axis=1))
+            if len(rows) == 0:
+                return None
+        self._sent = state
+
+        total_value = float(market_value.sum())
+        total_cost = float(cost_basis.sum())
+        return StreamUpdate(
+            type=kind,
+            as_of=as_of,
+            holdings=[
+                StreamHolding(
+                    index=int(i),
+                    ticker=self.holdings[i].ticker,
+                    current_price=None if np.isnan(latest[i]) else round(float(price[i]), 2),
+                    market_value=float(market_value[i]),
+                    gain_loss=float(gain_loss[i]),
+                    gain_loss_pct=float(gain_loss_pct[i])
+                )
+                for i in rows
+            ],
+            total_value=round(total_value, 2),
+            total_gain_loss=round(total_value - total_cost, 2),
+            total_gain_loss_pct=round((total_value - total_cost) / total_cost, 4) if total_cost > 0 else 0
+        )
+
+
+class TrackingStream:
+    """
+    The shared poller and its subscriptions (one per process).
+    """
+
+    def __init__(self, provider: Optional[AsyncMarketDataProvider] = None, interval: Optional[float] = None,
+                 metadata: Optional[TickerMetadataService] = None):
+        # Straight to the (coalesced) upstream: the price cache would serve bars up to its refresh interval old
+        self.provider = provider or ExecutorAsyncProvider(
+            get_coalescing_provider(), max_concurrency=1, timeout=float(os.environ.get("MARKET_DATA_TIMEOUT", 30)))
+        self.interval = interval if interval is not None else float(os.environ.get("TRACKING_STREAM_INTERVAL", 15))
+        self.metadata = metadata or (get_ticker_metadata() if provider is None else None)
+        self.prices: Dict[str, float] = {}
+        self.as_of: Optional[float] = None
+        # Tickers the last poll covered (priced or not) plus known invalid ones
+        self.checked: Set[str] = set()
+        self.polls = 0
+        self.last_error: Optional[str] = None
+        self._subscriptions: Set[Subscription] = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, holdings: List[Holding]) -> Subscription:
+        subscription = Subscription(holdings)
+        self._subscriptions.add(subscription)
+        self._ensure_polling(subscription)
+        return subscription
+
+    def replace(self, subscription: Subscription, holdings: List[Holding]):
+        subscription.replace(holdings)
+        self._ensure_polling(subscription)
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def tickers(self) -> List[str]:
+        """
+        Union of every subscriber's tickers (sorted, so polls batch the same way).
+        """
+        return sorted(set().union(*(s.tickers for s in self._subscriptions)))
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "tickers": len(self.tickers()),
+            "polls": self.polls,
+            "as_of": self.as_of,
+            "last_error": self.last_error
+        }
+
+    async def poll(self):
+        """
+        One refresh of the union's latest prices; wakes the subscribers whose tickers moved.
+        """
+        tickers = self.tickers()
+        invalid = set()
+        if self.metadata is not None:
+            invalid = set(await run_in_threadpool(self.metadata.known_invalid, tickers))
+            tickers = [t for t in tickers if t not in invalid]
+        moved = set()
+        if tickers:
+            frame = await self.provider.get_historical_prices(tickers, period=POLL_PERIOD)
+            latest = ReturnsPanel.coerce(frame).reindex(tickers).ffill().latest()
+            for ticker, price in latest.items():
+                if np.isfinite(price) and self.prices.get(ticker) != price:
+                    self.prices[ticker] = float(price)
+                    moved.add(ticker)
+            self.as_of = time.time()
+            self.polls += 1
+        self.checked = invalid | set(tickers)
+
+        for subscription in self._subscriptions:
+            if (subscription.awaiting_snapshot and subscription.tickers <= self.checked) or subscription.tickers & moved:
+                subscription.changed.set()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _ensure_polling(self, subscription: Subscription):
+        # Snapshot right away if the last poll covered the new holdings, otherwise poll now
+        if subscription.tickers <= self.checked:
+            subscription.changed.set()
+        else:
+            self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._subscriptions:
+            self._wake.clear()
+            try:
+                await self.poll()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Tracking stream poll failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+@lru_cache(maxsize=None)
+def get_tracking_stream() -> TrackingStream:
+    return TrackingStream()
@@ -0,0 +1,64 @@
+"""
+Compares the discrete allocation modes with the previous greedy loop
+(floor each target in weight order, leftover cash unused).
+
+Usage (from backend/):
+    python -m benchmarks.bench_allocation
+    python -m benchmarks.bench_allocation --sizes 20 1000 --repeat 5
+
+Reports time, residual cash and L1 deviation from the target dollar
+amounts. "exact" is bounded by --time-limit per solve.
+"""
+import argparse
+import time
+import numpy as np
+from app.core.allocation import ALLOCATION_MODES, allocate
+
+
+def random_problem(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    weights = rng.dirichlet(np.full(n, 0.5))
+    prices = rng.lognormal(4.5, 1.0, size=n) # Mostly $20-$500, some much higher
+    budget = 2000.0 * n
+    return weights, prices, budget
+
+
+def greedy(weights: np.ndarray, prices: np.ndarray, budget: float):
+    # The loop optimize_portfolio used before the allocation module
+    shares = np.zeros(len(weights))
+    cash = budget
+    for i in np.argsort(-weights, kind="stable"):
+        target_val = budget * weights[i]
+        if prices[i] > 0:
+            shares[i] = int(target_val // prices[i])
+            cash -= shares[i] * prices[i]
+    return shares, cash
+
+
+def run(sizes, repeat, time_limit):
+    print(f"{'n':>6} {'method':>8} {'ms':>10} {'cash':>12} {'L1 dev':>12}")
+    for n in sizes:
+        weights, prices, budget = random_problem(n)
+        target = weights * budget
+        methods = {"greedy": lambda: greedy(weights, prices, budget)}
+        for mode in ALLOCATION_MODES:
+            methods[mode] = lambda mode=mode: (lambda a: (a.shares, a.leftover_cash))(
+                allocate(target, prices, budget, mode=mode, time_limit=time_limit))
+
+        for name, fn in methods.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                shares, cash = fn()
+                timings.append(time.perf_counter() - start)
+            deviation = np.abs(shares * prices - target).sum() + cash
+            print(f"{n:>6} {name:>8} {min(timings) * 1000:>10.2f} {cash:>12.2f} {deviation:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--time-limit", type=float, default=1.0)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat, args.time_limit)
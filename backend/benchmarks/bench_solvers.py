@@ -0,0 +1,55 @@
+"""
+Compares the "qp" and "slsqp" solver backends on random long-only problems.
+
+Usage (from backend/):
+    python -m benchmarks.bench_solvers
+    python -m benchmarks.bench_solvers --sizes 50 500 --repeat 3
+
+SLSQP is O(n^3) per iteration, so at 2000 assets it takes many minutes.
+Pass --backends qp to skip it.
+"""
+import argparse
+import time
+import numpy as np
+from app.core import solvers
+
+
+def random_problem(n: int, seed: int = 0):
+    # Factor-structured covariance, similar in shape to 5y of daily equity returns
+    rng = np.random.default_rng(seed)
+    k = min(10, n)
+    B = rng.normal(0.0, 0.15, size=(n, k))
+    D = rng.uniform(0.01, 0.09, size=n)
+    S = B @ B.T / k + np.diag(D)
+    mu = rng.normal(0.08, 0.06, size=n)
+    return mu, S
+
+
+def run(sizes, repeat, backends, risk_free_rate=0.02):
+    print(f"{'n':>6} {'problem':>14} {'backend':>8} {'seconds':>10} {'iters':>7} {'objective':>12}")
+    for n in sizes:
+        mu, S = random_problem(n)
+        for problem in ("min_volatility", "max_sharpe"):
+            for backend in backends:
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    if problem == "min_volatility":
+                        result = solvers.min_volatility(S, backend=backend)
+                    else:
+                        result = solvers.max_sharpe(mu, S, risk_free_rate, backend=backend)
+                    timings.append(time.perf_counter() - start)
+
+                w = result.weights
+                vol = np.sqrt(w @ S @ w)
+                objective = vol if problem == "min_volatility" else (mu @ w - risk_free_rate) / vol
+                print(f"{n:>6} {problem:>14} {backend:>8} {min(timings):>10.4f} {result.iterations:>7} {objective:>12.6f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--backends", nargs="+", default=list(solvers.SOLVER_BACKENDS), choices=solvers.SOLVER_BACKENDS)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat, args.backends)
@@ -0,0 +1,240 @@
+"""
+Per-stage timings of the engines on synthetic prices (no network needed).
+
+Usage (from backend/):
+    python -m benchmarks.bench_stages
+    python -m benchmarks.bench_stages --sizes 10 100 --repeat 5 --output before.json
+    python -m benchmarks.bench_stages --sizes 10 100 --compare before.json
+
+Times every stage of PortfolioOptimizer.optimize_portfolio,
+TrackingEngine.analyze_portfolio and HypeMeterEngine.score_influencer at
+each universe size. Prices come from SyntheticMarketDataProvider behind a
+warm on-disk cache in a temporary directory, so "fetch" is the cache read
+the engines normally see. The optimizer universe has no late listings or
+delistings (they would shrink the common history to a few days).
+
+Results (best of --repeat, in ms) are written as JSON with the commit they
+were measured on, by default to benchmarks/results/stages-<commit>.json.
+--compare prints the ratios against an earlier file and exits with status 1
+when any stage got slower than --threshold times its baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from app.core.execution import SolveExecutor
+from app.core.optimization import OptimizationRequest, PortfolioOptimizer
+from app.data.adapter import MarketDataProvider
+from app.data.cache import CachedMarketDataProvider
+from app.data.synthetic_adapter import SyntheticMarketDataProvider
+from app.hypemeter.engine import BENCHMARK_TICKER, HypeMeterEngine
+from app.hypemeter.models import Influencer, Tip
+from app.tracking.engine import TrackingEngine
+from app.tracking.models import Holding
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+class Prefetched(MarketDataProvider):
+    """
+    Serves an already fetched panel, so engine stages can be timed without the fetch.
+    """
+
+    def __init__(self, prices: pd.DataFrame):
+        self.prices = prices
+
+    def get_historical_prices(self, tickers: list[str], period: str = "5y", start=None, end=None, interval: str = "1d") -> pd.DataFrame:
+        return self.prices
+
+    def get_ticker_info(self, ticker: str):
+        return {"symbol": ticker}
+
+
+class Stages:
+    """
+    Best time per stage over repeated runs.
+    """
+
+    def __init__(self):
+        self.best = {}
+
+    @contextmanager
+    def __call__(self, name: str):
+        start = time.perf_counter()
+        yield
+        elapsed = (time.perf_counter() - start) * 1000
+        self.best[name] = min(self.best.get(name, elapsed), elapsed)
+
+    def report(self):
+        return {**{k: round(v, 3) for k, v in self.best.items()}, "total": round(sum(self.best.values()), 3)}
+
+
+def universe(n: int):
+    return [f"S{i:04d}" for i in range(n)]
+
+
+def bench_optimizer(provider, n, repeat):
+    tickers = universe(n)
+    request = OptimizationRequest(tickers=tickers, risk_appetite=0.5, investment_amount=1000.0 * n, time_horizon_years=10)
+    # Solves inline: this times the stages themselves, not the process-pool round trip
+    optimizer = PortfolioOptimizer(provider=provider, executor=SolveExecutor(workers=0))
+    stage = Stages()
+    for _ in range(repeat):
+        # Same steps as optimize_portfolio
+        with stage("fetch"):
+            df = provider.get_historical_prices(tickers)
+        with stage("clean"):
+            panel = optimizer.clean_prices(df, tickers)
+        with stage("estimate"):
+            mu, S = optimizer.estimate(panel)
+        with stage("solve"):
+            weights = optimizer.solve(mu, S, request.risk_appetite)
+        with stage("allocate"):
+            result = optimizer.build_result(weights, mu, S, panel.latest(), request.investment_amount, request.allocation_mode)
+        with stage("project"):
+            result.projection = optimizer.project(request, weights, mu, S, panel)
+    return stage.report()
+
+
+def bench_tracking(provider, n, repeat):
+    rng = np.random.default_rng(n)
+    tickers = universe(n)
+    period = TrackingEngine.chart_period()
+    stage = Stages()
+    for _ in range(repeat):
+        holdings = [Holding(ticker=t, shares=float(rng.integers(1, 100)), avg_cost=float(rng.uniform(10, 300))) for t in tickers]
+        with stage("fetch"):
+            hist = provider.get_historical_prices(tickers + [BENCHMARK_TICKER], period=period)
+        engine = TrackingEngine(provider=Prefetched(hist))
+        with stage("analyze_weekly"):
+            engine.analyze_portfolio(holdings, hist_data=hist)
+        with stage("analyze_lttb"):
+            engine.analyze_portfolio(holdings, hist_data=hist, max_points=200, columnar=True)
+    return stage.report()
+
+
+def bench_hypemeter(provider, n, repeat):
+    rng = np.random.default_rng(n)
+    today = date.today()
+    stage = Stages()
+    for _ in range(repeat):
+        tips = []
+        for ticker in universe(n):
+            entry = today - timedelta(days=int(rng.integers(30, 3 * 365)))
+            tips.append(Tip(
+                ticker=ticker,
+                action="SELL" if rng.random() < 0.2 else "BUY",
+                entry_date=entry,
+                valid_until=entry + timedelta(days=180) if rng.random() < 0.5 else None
+            ))
+        influencer = Influencer(id="bench", name="Bench", platform="TV", tips=tips)
+        with stage("asof"):
+            queries = [(t.ticker, t.entry_date) for t in tips] + [(BENCHMARK_TICKER, t.entry_date) for t in tips]
+            provider.get_prices_asof(queries)
+        with stage("score"):
+            # Batched as-of lookup from the warm cache plus scoring
+            HypeMeterEngine(provider=provider).score_influencer(influencer)
+    return stage.report()
+
+
+BENCHES = {
+    "optimize_portfolio": bench_optimizer,
+    "analyze_portfolio": bench_tracking,
+    "score_influencer": bench_hypemeter,
+}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def run(sizes, repeat, seed, targets):
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        sources = {
+            "optimize_portfolio": SyntheticMarketDataProvider(seed=seed, late_listing_rate=0.0, delisting_rate=0.0),
+            "analyze_portfolio": SyntheticMarketDataProvider(seed=seed),
+            "score_influencer": SyntheticMarketDataProvider(seed=seed),
+        }
+        for target in targets:
+            provider = CachedMarketDataProvider(sources[target], cache_dir=os.path.join(cache_dir, target), refresh_interval=float("inf"))
+            report["results"][target] = {}
+            for n in sizes:
+                # Warm the cache (and imports) outside the timings
+                provider.get_historical_prices(universe(n) + [BENCHMARK_TICKER], period="max")
+                stages = BENCHES[target](provider, n, repeat)
+                report["results"][target][str(n)] = stages
+                print(f"{target:>20} {n:>6} " + " ".join(f"{k}={v:.1f}" for k, v in stages.items()), flush=True)
+    return report
+
+
+def compare(report, baseline, threshold):
+    """
+    Prints new vs baseline per stage; returns True if any stage regressed.
+    """
+    regressed = False
+    print(f"\nvs {baseline.get('commit')} ({baseline.get('timestamp')})")
+    print(f"{'target':>20} {'n':>6} {'stage':>16} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    for target, by_size in report["results"].items():
+        for n, stages in by_size.items():
+            base = baseline.get("results", {}).get(target, {}).get(n)
+            if not base:
+                continue
+            for name, ms in stages.items():
+                if name not in base:
+                    continue
+                ratio = ms / base[name] if base[name] > 0 else float("inf")
+                flag = " <-" if ratio > threshold and name != "total" else ""
+                regressed |= bool(flag)
+                print(f"{target:>20} {n:>6} {name:>16} {base[name]:>10.2f} {ms:>10.2f} {ratio:>7.2f}{flag}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--targets", nargs="+", choices=list(BENCHES), default=list(BENCHES))
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/stages-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.repeat, args.seed, args.targets)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"stages-{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        if compare(report, json.loads(Path(args.compare).read_text()), args.threshold):
+            sys.exit(1)